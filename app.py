@@ -1,14 +1,44 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import pickle
 import pydeck as pdk
 import matplotlib.pyplot as plt
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
 import time
+import os
+
+SCRIPT_START = time.perf_counter()
+
+from profiling import finish as finish_profile, profiled, profiling_requested, start as start_profile
+
+def profiling_enabled():
+    # AGRIPREDICT_PROFILE=1 for every session, ?profile=1 for this one
+    return profiling_requested(st.query_params)
+
+script_profiler = start_profile("script", profiling_enabled(), replace=True)
+
+from feature_encoding import UnknownCategoryError, build_input_frame, complete_input_frame, normalize_category
+from history_store import DEFAULT_HISTORY_PATH, PredictionHistory
+from model_registry import ModelRegistry
+from sharded_models import ShardedModel
+from prediction_cube import CubePredictor, PredictionCube
+from metrics import observe_stage, record_cache, record_degraded, record_model, record_predictions
+from metrics import serve as serve_metrics, start_file_writer as start_metrics_file
+from training_support import TrainingSupport, flagged_features
+from inference_executor import DeadlineExceeded, InferenceExecutor, Overloaded, limit_model_threads
+from trend_forecast import forecast_all
+from state_boundaries import BoundaryLayer
+from backtest import load_metrics
+from risk_simulation import simulate_revenue, state_rainfall_history
+from dashboard import (geographic_figure, partial_dependence_figure, radar_figure, recommendation_html,
+                       recommendations, risk_caption, risk_figure, surface_figure, trend_figure, yield_category)
+from pdp_atlas import PD_PAIRS, PartialDependenceAtlas
+from bulk_scoring import BulkScorer, category_vocabularies
+from farm_reports import FARM_COLUMNS
+from crop_ranking import known_crops, rank_crops
+from crop_data import crop_prices, yield_units, weather_data
 
 #  Page Configuration 
 st.set_page_config(
@@ -18,75 +48,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# ---------------- Realistic Data Dictionaries -------------------
-# Average yields in quintals/ha based on Indian agricultural data
-avg_yields = {
-    'Rice': 24.0,
-    'Maize': 28.5, 
-    'Moong(Green Gram)': 8.5,
-    'Urad': 6.2,
-    'Groundnut': 15.8
-}
-
-# Current market prices in ₹/quintal (updated 2024)
-crop_prices = {
-    'Rice': 2100,     
-    'Maize': 2300,     
-    'Moong(Green Gram)': 7500,  
-    'Urad': 8200,      
-    'Groundnut': 5800   
-}
-
-# Yield ranges for categorization (quintals/ha)
-yield_ranges = {
-    'Rice': {
-        'poor': (0, 16), 
-        'below_avg': (16, 22), 
-        'average': (22, 32), 
-        'good': (32, 42), 
-        'excellent': (42, 55)
-    },
-    'Maize': {
-        'poor': (0, 18), 
-        'below_avg': (18, 24), 
-        'average': (24, 32), 
-        'good': (32, 42), 
-        'excellent': (42, 60)
-    },
-    'Moong(Green Gram)': {
-        'poor': (0, 3), 
-        'below_avg': (3, 5), 
-        'average': (5, 8), 
-        'good': (8, 12), 
-        'excellent': (12, 18)
-    },
-    'Urad': {
-        'poor': (0, 2.5), 
-        'below_avg': (2.5, 4), 
-        'average': (4, 7), 
-        'good': (7, 11), 
-        'excellent': (11, 16)
-    },
-    'Groundnut': {
-        'poor': (0, 12), 
-        'below_avg': (12, 16), 
-        'average': (16, 22), 
-        'good': (22, 28), 
-        'excellent': (28, 40)
-    }
-}
-
-
-# State coordinates for India map
-state_coordinates = {
-    "Karnataka": {"lat": 15.3173, "lon": 75.7139, "zoom": 7},
-    "Andhra Pradesh": {"lat": 15.9129, "lon": 79.7400, "zoom": 7},
-    "West Bengal": {"lat": 22.9868, "lon": 87.8550, "zoom": 7},
-    "Chhattisgarh": {"lat": 21.2787, "lon": 81.8661, "zoom": 7},
-    "Bihar": {"lat": 25.0961, "lon": 85.3131, "zoom": 7}
-}
-
 # ---------------- Advanced CSS Styling with Animations -------------------
+stage_start = time.perf_counter()
 st.markdown("""
     <style>
     /* Import Google Fonts */
@@ -571,31 +534,183 @@ st.markdown("""
     }
     </style>
 """, unsafe_allow_html=True)
+observe_stage("css_injection", stage_start)
 
 # ---------------- Load Model with Animation -------------------
+MODEL_PATH = os.environ.get("AGRIPREDICT_MODEL_PATH", 'crop_yield_pipeline.pkl')
+
 @st.cache_resource
+def load_registry():
+    # Shared across sessions; new artifacts are loaded, vetted and swapped in
+    # by the registry's background watcher without a restart
+    registry = ModelRegistry(MODEL_PATH)
+    registry.load_initial()
+    registry.start_watcher()
+    return registry
+
 def load_model():
+    """Active model version for this rerun (None if nothing loadable yet)"""
+    active = registry.current
+    if active is None:
+        if isinstance(registry.last_error, FileNotFoundError) or registry.last_error is None:
+            st.error("⚠️ Model file not found. Please check the file path.")
+        else:
+            st.error(f"⚠️ Model could not be loaded: {registry.last_error}")
+    return active
+
+@st.cache_resource
+def load_sharded_model(shard_dir):
+    # Per-crop shards are loaded lazily on first use (see sharded_models.py)
+    return ShardedModel(shard_dir)
+
+@st.cache_resource
+def load_cube_predictor(version, _predictor):
+    # Opt-in interpolated serving from the offline cube (see prediction_cube.py);
+    # only used when the cube was built from the active model version
+    if os.environ.get("AGRIPREDICT_USE_CUBE") != "1":
+        return None
     try:
-        with open('crop_yield_pipeline.pkl', 'rb') as file:
-            model = pickle.load(file)
-        return model
-    except:
-        st.error("⚠️ Model file not found. Please check the file path.")
+        cube = PredictionCube()
+    except (OSError, ValueError, KeyError):
+        return None
+    if cube.model_version != version:
         return None
+    return CubePredictor(cube, _predictor)
+
+@st.cache_resource
+def start_metrics_exporter():
+    # OpenMetrics for this replica on a local port and/or a textfile; no collector needed
+    port = int(os.environ.get("AGRIPREDICT_METRICS_PORT", "9464"))
+    path = os.environ.get("AGRIPREDICT_METRICS_FILE")
+    server = None
+    if port:
+        try:
+            server = serve_metrics(port)
+        except OSError:
+            # Port taken by another replica on this host: fall back to a per-process file
+            path = path or f"agripredict_metrics_{os.getpid()}.prom"
+    if path:
+        start_metrics_file(path)
+    return server
+
+@st.cache_resource
+def load_training_support():
+    # Precomputed histograms (artifacts/training_support.json), built from the CSV if absent
+    return TrainingSupport.load_or_build()
+
+@st.cache_data
+def load_yield_trends(through_year):
+    # Robust trends for all ~1,700 State x Crop x Season series in one batched fit
+    return forecast_all(through_year=through_year)
+
+@st.cache_data
+def load_state_rainfall():
+    # Annual rainfall per state-year, the sampling pool for the risk simulation
+    return state_rainfall_history()
+
+@st.cache_resource
+def load_state_boundaries():
+    # Offline state outlines (state_boundaries.py build); None keeps the tile map
+    try:
+        return BoundaryLayer.load(os.environ.get("AGRIPREDICT_MAP_LEVEL", "medium"))
+    except FileNotFoundError:
+        return None
+
+@st.cache_data(ttl=300)
+def load_backtest_metrics():
+    # Summary written by backtest.py; re-read every few minutes so a new run shows up
+    return load_metrics()
+
+@st.cache_resource(ttl=300)
+def load_pdp_atlas():
+    # Precomputed response curves (pdp_atlas.py build); None hides the section
+    try:
+        return PartialDependenceAtlas.load()
+    except FileNotFoundError:
+        return None
+
+@st.cache_resource
+def load_inference_executor():
+    # One bounded worker pool per process; every session's predictions go through it
+    return InferenceExecutor(
+        workers=int(os.environ.get("AGRIPREDICT_INFERENCE_WORKERS", min(4, os.cpu_count() or 1))),
+        max_queue=int(os.environ.get("AGRIPREDICT_INFERENCE_QUEUE", 32)),
+        timeout=float(os.environ.get("AGRIPREDICT_INFERENCE_TIMEOUT", 10.0)),
+    )
+
+@st.cache_resource
+def load_bulk_scorer():
+    # Uploaded files are scored on a background thread and spooled to disk, not session state
+    return BulkScorer(chunk_size=int(os.environ.get("AGRIPREDICT_BULK_CHUNK", 2000)))
+
+@st.cache_resource
+def load_history():
+    # One write-behind SQLite writer shared by every session
+    return PredictionHistory(os.environ.get("AGRIPREDICT_HISTORY_PATH", DEFAULT_HISTORY_PATH))
 
 # Show loading animation while loading model
+SHARD_DIR = os.environ.get("AGRIPREDICT_SHARD_DIR")
+
+stage_start = time.perf_counter()
 with st.spinner('🚀 Initializing AI Model...'):
-    model = load_model()
-    time.sleep(1)  # Brief pause for effect
-
-# ---------------- Static Weather Data -------------------
-weather_data = {
-    "Karnataka": {"tavg": 26.3, "prcp": 950, "lat": 15.3, "lon": 75.7},
-    "Andhra Pradesh": {"tavg": 29.1, "prcp": 1050, "lat": 15.9, "lon": 79.7},
-    "West Bengal": {"tavg": 27.4, "prcp": 1200, "lat": 22.9, "lon": 87.8},
-    "Chhattisgarh": {"tavg": 28.2, "prcp": 1300, "lat": 21.2, "lon": 81.8},
-    "Bihar": {"tavg": 26.7, "prcp": 1100, "lat": 25.0, "lon": 85.3}
-}
+    if SHARD_DIR:
+        registry = None
+        active_model = load_sharded_model(SHARD_DIR)
+    else:
+        registry = load_registry()
+        active_model = load_model()  # snapshot: a concurrent swap never changes it mid-rerun
+    model = active_model.model if active_model is not None else None
+    fast_predictor = active_model.predictor if active_model is not None else None
+    model_version = active_model.version if active_model is not None else None
+    cube_predictor = load_cube_predictor(model_version, fast_predictor) if model is not None else None
+    inference_executor = load_inference_executor()
+    if fast_predictor is not None:
+        limit_model_threads(fast_predictor)  # the executor's workers are the parallelism
+    history = load_history()
+    bulk_scorer = load_bulk_scorer()
+    training_support = load_training_support()
+    state_rainfall = load_state_rainfall()
+    backtest = load_backtest_metrics()
+    start_metrics_exporter()
+    if active_model is not None:
+        record_model(model_version, active_model.load_seconds)
+        if registry is None:
+            active_model.cache_listener = record_cache  # crop-shard LRU hits/misses
+        if cube_predictor is not None:
+            cube_predictor.cache_listener = record_cache
+    if "model_initialized" not in st.session_state:
+        time.sleep(1)  # Brief pause for effect, on a session's first load only
+        st.session_state["model_initialized"] = True
+observe_stage("model_load", stage_start)
+
+def predict_yields(input_df, source="form"):
+    """Predict one yield per row in a single batched model call, via the shared executor"""
+    stage_start = time.perf_counter()
+    predictor = cube_predictor if cube_predictor is not None else fast_predictor
+    predictions, status = inference_executor.predict_with_status(predictor.predict, input_df, namespace=model_version)
+    if status == "cached":
+        record_degraded(source)
+        st.toast("⏳ Server busy: showing the last result computed for these inputs.")
+    observe_stage("predict", stage_start)
+    record_predictions(input_df, source)
+    return predictions
+
+def predict_and_record(input_df, source):
+    """``predict_yields`` plus one history row per input, queued as a single batch"""
+    predict_start = time.perf_counter()
+    predictions = predict_yields(input_df, source=source)
+    history.record_frame(input_df, predictions, model_version, (time.perf_counter() - predict_start) * 1000)
+    return predictions
+
+def metric_card(title, value, subtitle, color="#2E7D32"):
+    """Animated metric card used by the results and scenario dashboards"""
+    st.markdown(f"""
+    <div class="metric-card metric-value">
+        <h4>{title}</h4>
+        <h2 style="color: {color}; margin: 0.5rem 0;">{value}</h2>
+        <p style="margin: 0; color: #666;">{subtitle}</p>
+    </div>
+    """, unsafe_allow_html=True)
 
 # ---------------- Animated Header Section -------------------
 st.markdown("""
@@ -609,19 +724,40 @@ st.markdown("""
 with st.sidebar:
     st.markdown("### 🎯 AI Model Intelligence")
     
-    # Animated model stats
-    st.markdown("""
-    <div class="info-card floating-element">
-        <h4>🧠 Deep Learning Insights</h4>
-        <div class="progress-bar">
-            <div class="progress-fill" style="--progress-width: 94%;"></div>
+    # Model stats from the last rolling-origin backtest (backtest.py)
+    if backtest is not None:
+        overall = backtest["overall"]
+        first_year, last_year = backtest["test_years"]
+        source_version = backtest.get("source_model_version", backtest.get("model_version"))
+        configuration = backtest.get("configuration", {})
+        trees = f", {configuration['n_estimators']} trees" if configuration.get("n_estimators") else ""
+        stale = model_version is not None and source_version != model_version
+        st.markdown(f"""
+        <div class="info-card floating-element">
+            <h4>🧠 Deep Learning Insights</h4>
+            <div class="progress-bar">
+                <div class="progress-fill" style="--progress-width: {max(0.0, overall['r2']) * 100:.0f}%;"></div>
+            </div>
+            <p><strong>Backtest R²:</strong> {overall['r2']:.1%}</p>
+            <p><strong>Mean Abs. Error:</strong> {overall['mae']:.2f} per ha</p>
+            <p><strong>Algorithm:</strong> {backtest['algorithm']}</p>
+            <p><strong>Training Samples:</strong> {backtest['training_rows']:,}</p>
+            <p><strong>Features Analyzed:</strong> {backtest['features']}</p>
+            <p style="font-size: 0.8rem; opacity: 0.8;">{backtest['folds']} yearly folds, tested on {first_year}–{last_year}</p>
+            <p style="font-size: 0.8rem; opacity: 0.8;">Backtest configuration: {backtest['algorithm']}{trees} with the
+            hyperparameters of model {source_version}, refit per fold with Production zeroed</p>
         </div>
-        <p><strong>Model Accuracy:</strong> 94.2%</p>
-        <p><strong>Algorithm:</strong> Random Forest</p>
-        <p><strong>Training Samples:</strong> 50,000+</p>
-        <p><strong>Features Analyzed:</strong> 12</p>
-    </div>
-    """, unsafe_allow_html=True)
+        """, unsafe_allow_html=True)
+        if stale:
+            st.caption(f"⚠️ Figures use the hyperparameters of model {source_version}; rerun backtest.py for the active model.")
+    else:
+        st.markdown("""
+        <div class="info-card floating-element">
+            <h4>🧠 Deep Learning Insights</h4>
+            <p><strong>Model Accuracy:</strong> not yet backtested</p>
+            <p style="font-size: 0.8rem; opacity: 0.8;">Run <code>python backtest.py</code> to measure it.</p>
+        </div>
+        """, unsafe_allow_html=True)
     
     st.markdown("""
     <div class="metric-card glow-effect">
@@ -647,509 +783,757 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
 
+    # Model registry: active version, hot-swap status and rollback
+    with st.expander("🗂️ Model Registry"):
+        if active_model is not None:
+            st.markdown(f"**Active version:** `{active_model.version}`")
+            st.caption(f"Loaded from {active_model.path} in {active_model.load_seconds:.2f}s")
+        if registry is None:
+            st.caption(f"Resident crop shards: {', '.join(active_model.loaded_shards()) or 'none yet'}")
+        else:
+            if registry.last_error is not None and active_model is not None:
+                st.warning(f"Last candidate rejected: {registry.last_error}")
+            loaded_versions = [v["version"] for v in registry.versions() if not v["active"]]
+            if loaded_versions:
+                rollback_to = st.selectbox("Roll back to", loaded_versions[::-1], key="rollback_version")
+                if st.button("↩️ Roll back", key="rollback_button"):
+                    registry.rollback(rollback_to)
+                    st.rerun()
+
 # ---------------- Main Content with Enhanced Layout -------------------
-col1, col2 = st.columns([3, 2])
+# Each tab is a fragment: interacting inside one reruns only that section, not
+# the CSS, sidebar and other tabs. Results live in session state so they
+# survive reruns triggered elsewhere.
+def render_prediction_results(result):
+    """Results dashboard for a stored prediction (re-rendered on every rerun)"""
+    state, crop, season = result["state"], result["crop"], result["season"]
+    area, rainfall = result["area"], result["rainfall"]
+    fertilizer, pesticide = result["fertilizer"], result["pesticide"]
+    tavg, lat, lon = result["tavg"], result["lat"], result["lon"]
+    prediction, model_version = result["prediction"], result["model_version"]
+    support_score, feature_support = result["support_score"], result["feature_support"]
+
+    # Display results with animations
+    st.markdown('<div class="success-animation">', unsafe_allow_html=True)
+    st.markdown('<h2 class="section-header">🎯 AI Prediction Results</h2>', unsafe_allow_html=True)
+
+    # Main prediction card with enhanced styling
+    st.markdown(f"""
+    <div class="prediction-card success-animation">
+        <h2>🌾 Predicted Crop Yield</h2>
+        <h1 style="font-size: 4rem; margin: 1.5rem 0; font-weight: 800;">{prediction:.2f}</h1>
+        <h3 style="font-size: 1.5rem; margin-bottom: 1rem;">quintals per hectare</h3>
+        <p style="font-size: 1.1rem; opacity: 0.9;">for {crop} cultivation in {state} during {season} season</p>
+        <p style="font-size: 0.85rem; opacity: 0.7;">Model version {model_version}</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Within-training-support indicator: out of range and sparse tails get separate messages
+    outside = result.get("out_of_range", [])
+    sparse = [f for f in flagged_features(feature_support) if f not in outside]
+    if outside or sparse:
+        notes = []
+        if outside:
+            notes.append(f"{', '.join(outside)} {'is' if len(outside) == 1 else 'are'} outside the range "
+                         f"the model was trained on for {crop}")
+        if sparse:
+            notes.append(f"the model saw few similar training rows for {', '.join(sparse)}")
+        st.warning(
+            f"🧭 **Training support: {support_score:.0%}** — "
+            f"{'; '.join(notes)}. Treat this prediction with caution."
+        )
+    else:
+        st.info(f"🧭 **Training support: {support_score:.0%}** — all inputs lie within the training data for {crop}.")
+
+    # Enhanced metrics with animations (3 columns)
+    col_m1, col_m2, col_m3 = st.columns(3)
+
+    with col_m1:
+        total_production = prediction * area
+        metric_card("📦 Total Production", f"{total_production:.1f}", "quintals")
+
+    with col_m2:
+        category, color = yield_category(prediction)
+        metric_card("📊 Yield Category", category, f"{prediction:.1f} q/ha", color)
+
+    with col_m3:
+        # Calculate revenue using crop-specific prices
+        price_per_quintal = crop_prices[crop]
+        revenue_estimate = total_production * price_per_quintal
+
+        metric_card("💰 Revenue Estimate", f"₹{revenue_estimate:,.0f}", f"@ ₹{price_per_quintal}/quintal", "#4CAF50")
+
+    # Charts
+    stage_start = time.perf_counter()
+    st.markdown('<h2 class="section-header">📊 Advanced Analytics Dashboard</h2>', unsafe_allow_html=True)
+
+    viz_col1, viz_col2, viz_col3 = st.columns([1, 1, 1])
+
+    with viz_col1:
+        st.markdown("### 🗺️ **Geographic Intelligence**")
+        boundaries = load_state_boundaries()
+        trend_history = load_yield_trends(datetime.datetime.now().year)["history"] if boundaries is not None else None
+        fig = geographic_figure(crop, state, prediction, lat, lon, boundaries, trend_history)
+        st.plotly_chart(fig, use_container_width=True)
+
+    with viz_col2:
+        st.markdown("### 🔬 **Environmental Factor Impact**")
+        fig_radar = radar_figure(rainfall, tavg, fertilizer, area, pesticide)
+        st.plotly_chart(fig_radar, use_container_width=True)
+
+    with viz_col3:
+        st.markdown("### ⚠️ **Risk Assessment Analysis**")
+        # Monte Carlo revenue distribution (rainfall from state history, price around market)
+        risk = result["risk"]
+        point_revenue = prediction * area * crop_prices[crop]
+        fig_risk = risk_figure(risk)
+        st.plotly_chart(fig_risk, use_container_width=True)
+        st.caption(risk_caption(risk, point_revenue))
+
+    # Historical trend and multi-year forecast for this State x Crop x Season
+    st.markdown("### 📈 **Historical Yield Trend & Forecast**")
+    trends = load_yield_trends(datetime.datetime.now().year)
+    fig_trend = trend_figure(trends, state, crop, season)
+    if fig_trend is None:
+        st.info(f"Not enough historical data to forecast {crop} in {state} during {season}.")
+    else:
+        st.plotly_chart(fig_trend, use_container_width=True)
+
+    # Precomputed partial dependence: how yield responds to each input for this crop
+    atlas = load_pdp_atlas()
+    pd_curves, pd_entry = atlas.curves(crop, state) if atlas is not None else (None, None)
+    if pd_curves is not None:
+        with st.expander("📉 **How yield responds to each input**"):
+            scope = f"{crop} in {state}" if pd_entry["state"] is not None else f"{crop} across all states"
+            st.caption(
+                f"Average predicted yield for {scope} as one input varies and the others keep their "
+                f"historical values ({pd_entry['background_rows']} sampled records). "
+                f"The band spans 10–90% of those fields; the dashed line is your input."
+            )
+            curves_version = pd_entry.get("model_version", atlas.model_version)
+            if curves_version != model_version:
+                st.caption(f"⚠️ Curves were computed for model {curves_version}; rebuild with `pdp_atlas.py build`.")
+            current = {"Area": area, "Annual_Rainfall": rainfall, "Fertilizer": fertilizer, "Pesticide": pesticide}
+            st.plotly_chart(partial_dependence_figure(pd_curves, current), use_container_width=True)
+            pair = st.selectbox(
+                "Interaction between two inputs", PD_PAIRS,
+                format_func=lambda p: f"{p[0].replace('_', ' ')} × {p[1].replace('_', ' ')}"
+            )
+            x, y, z = atlas.surface(crop, pair[0], pair[1], state)
+            st.plotly_chart(surface_figure(x, y, z, pair[0], pair[1], (current[pair[0]], current[pair[1]])),
+                            use_container_width=True)
+
+    observe_stage("charts", stage_start)
+
+    # AI Recommendations with enhanced styling
+    stage_start = time.perf_counter()
+    st.markdown('<h2 class="section-header">🤖 AI-Powered Recommendations</h2>', unsafe_allow_html=True)
+
+    # Display recommendations with priority color coding
+    for i, rec in enumerate(recommendations(crop, season, rainfall, fertilizer, pesticide, prediction)):
+        st.markdown(recommendation_html(rec, i), unsafe_allow_html=True)
 
-with col1:
-    st.markdown('<h2 class="section-header">🚀 Intelligent Crop Analysis</h2>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+    observe_stage("recommendations", stage_start)
+
+def render_crop_ranking(ranking_result):
+    """Best-crop table and chart for a stored ranking"""
+    state, season, area = ranking_result["state"], ranking_result["season"], ranking_result["area"]
+    ranking = ranking_result["table"]
+    st.markdown('<h2 class="section-header">🏆 Best Crops for Your Field</h2>', unsafe_allow_html=True)
+    st.caption(
+        f"{len(ranking)} crops scored in one batch for {state}, {season} season, {area} ha "
+        f"({ranking_result['latency_ms']:.0f} ms). Ranked by expected revenue at current market prices."
+    )
+    grown_only = st.checkbox(
+        "Only crops recorded in this state and season", value=True,
+        help="Crops never grown here are extrapolations and are ranked with low confidence"
+    )
+    shown = ranking[ranking["Records"] > 0] if grown_only else ranking
+    if shown.empty:
+        st.info(f"No crops on record for {state} in the {season} season; showing all crops.")
+        shown = ranking
+
+    top = shown.head(10)
+    fig_rank = go.Figure(go.Bar(
+        x=top["Revenue"][::-1], y=top["Crop"][::-1], orientation='h',
+        marker_color='#4CAF50', text=[f"₹{v:,.0f}" for v in top["Revenue"][::-1]], textposition='auto'
+    ))
+    fig_rank.update_layout(
+        height=400, xaxis_title="Expected Revenue (₹)", margin={"l": 0, "r": 0, "t": 10, "b": 0},
+        plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)'
+    )
+    st.plotly_chart(fig_rank, use_container_width=True)
+    st.dataframe(
+        shown, hide_index=True, use_container_width=True,
+        column_config={
+            "Yield": st.column_config.NumberColumn("Yield (per ha)", format="%.2f"),
+            "Production": st.column_config.NumberColumn(format="%.1f"),
+            "Price": st.column_config.NumberColumn("Price (₹/unit)", format="%d"),
+            "Revenue": st.column_config.NumberColumn("Revenue (₹)", format="%.0f"),
+            "Records": st.column_config.NumberColumn("Historical records"),
+        }
+    )
+
+SEASONS = ['Kharif', 'Rabi', 'Whole Year', 'Summer', 'Autumn', 'Winter']
+
+@st.fragment
+@profiled("fragment_prediction", profiling_enabled)
+def prediction_section():
+    fragment_start = time.perf_counter()
+    col1, col2 = st.columns([3, 2])
+
+    with col1:
+        st.markdown('<h2 class="section-header">🚀 Intelligent Crop Analysis</h2>', unsafe_allow_html=True)
     
-    # Enhanced Input Form with Animations
-    with st.container():
-        st.markdown("### 📝 Farm Intelligence Input")
+        # Enhanced Input Form with Animations
+        with st.container():
+            st.markdown("### 📝 Farm Intelligence Input")
         
-        with st.form("prediction_form", clear_on_submit=False):
-            # Location Section
-            st.markdown("#### 🗺️ **Geographic Information**")
-            col1_1, col1_2 = st.columns(2)
-            with col1_1:
-                state = st.selectbox(
-                    "📍 **Select State**", 
-                    list(weather_data.keys()),
-                    help="Choose your farm's geographic location for precise weather data integration"
-                )
-            with col1_2:
-                crop = st.selectbox(
-                    "🌿 **Select Crop Type**", 
-                    ['Rice', 'Maize', 'Moong(Green Gram)', 'Urad', 'Groundnut'],
-                    help="Select the primary crop for yield prediction analysis"
-                )
+            with st.form("prediction_form", clear_on_submit=False):
+                # Location Section
+                st.markdown("#### 🗺️ **Geographic Information**")
+                col1_1, col1_2 = st.columns(2)
+                with col1_1:
+                    state = st.selectbox(
+                        "📍 **Select State**", 
+                        list(weather_data.keys()),
+                        help="Choose your farm's geographic location for precise weather data integration"
+                    )
+                with col1_2:
+                    crop = st.selectbox(
+                        "🌿 **Select Crop Type**", 
+                        ['Rice', 'Maize', 'Moong(Green Gram)', 'Urad', 'Groundnut'],
+                        help="Select the primary crop for yield prediction analysis"
+                    )
             
-            st.markdown("---")
+                st.markdown("---")
             
-            # Temporal & Spatial Section
-            st.markdown("#### ⏰ **Temporal & Spatial Parameters**")
-            col2_1, col2_2 = st.columns(2)
-            with col2_1:
-                season = st.selectbox(
-                    "🌅 **Growing Season**", 
-                    ['Kharif', 'Rabi', 'Whole Year', 'Summer', 'Autumn'],
-                    help="Select the agricultural season for optimal prediction accuracy"
-                )
-            with col2_2:
-                area = st.number_input(
-                    "📏 **Cultivation Area (hectares)**", 
-                    min_value=0.1, 
-                    value=2.5, 
-                    step=0.1,
-                    help="Enter the total area under cultivation in hectares"
-                )
+                # Temporal & Spatial Section
+                st.markdown("#### ⏰ **Temporal & Spatial Parameters**")
+                col2_1, col2_2 = st.columns(2)
+                with col2_1:
+                    season = st.selectbox(
+                        "🌅 **Growing Season**", 
+                        SEASONS,
+                        help="Select the agricultural season for optimal prediction accuracy"
+                    )
+                with col2_2:
+                    area = st.number_input(
+                        "📏 **Cultivation Area (hectares)**", 
+                        min_value=0.1, 
+                        value=2.5, 
+                        step=0.1,
+                        help="Enter the total area under cultivation in hectares"
+                    )
             
-            st.markdown("---")
+                st.markdown("---")
             
-            # Environmental Section
-            st.markdown("#### 🌍 **Environmental Conditions**")
-            col3_1, col3_2 = st.columns(2)
-            with col3_1:
-                rainfall = st.number_input(
-                    "🌧️ **Annual Rainfall (mm)**", 
-                    min_value=0.0, 
-                    value=1000.0, 
-                    step=25.0,
-                    help="Expected or historical annual rainfall in millimeters"
-                )
-            with col3_2:
-                fertilizer = st.number_input(
-                    "🧪 **Fertilizer Application (kg/ha)**", 
+                # Environmental Section
+                st.markdown("#### 🌍 **Environmental Conditions**")
+                col3_1, col3_2 = st.columns(2)
+                with col3_1:
+                    rainfall = st.number_input(
+                        "🌧️ **Annual Rainfall (mm)**", 
+                        min_value=0.0, 
+                        value=1000.0, 
+                        step=25.0,
+                        help="Expected or historical annual rainfall in millimeters"
+                    )
+                with col3_2:
+                    fertilizer = st.number_input(
+                        "🧪 **Fertilizer Application (kg/ha)**", 
+                        min_value=0.0, 
+                        value=75.0, 
+                        step=5.0,
+                        help="Total fertilizer usage per hectare for optimal nutrition"
+                    )
+            
+                # Pest Management
+                st.markdown("#### 🛡️ **Crop Protection**")
+                pesticide = st.number_input(
+                    "🧫 **Pesticide Usage (kg/ha)**", 
                     min_value=0.0, 
-                    value=75.0, 
-                    step=5.0,
-                    help="Total fertilizer usage per hectare for optimal nutrition"
+                    value=12.0, 
+                    step=1.0,
+                    help="Pesticide application rate for crop protection and health"
                 )
             
-            # Pest Management
-            st.markdown("#### 🛡️ **Crop Protection**")
-            pesticide = st.number_input(
-                "🧫 **Pesticide Usage (kg/ha)**", 
-                min_value=0.0, 
-                value=12.0, 
-                step=1.0,
-                help="Pesticide application rate for crop protection and health"
-            )
-            
-            # Enhanced Submit Button
-            st.markdown("<br>", unsafe_allow_html=True)
-            submitted = st.form_submit_button("🔮 **Generate AI Prediction**", use_container_width=True)
-
-with col2:
-    st.markdown('<h2 class="section-header">📊 Live Input Monitor</h2>', unsafe_allow_html=True)
-    
-    # Real-time input display with animations
-    if 'state' in locals():
-        st.markdown(f"""
-        <div class="metric-card floating-element">
-            <h4>🎯 Current Configuration</h4>
-            <div style="display: grid; gap: 0.5rem;">
-                <p><strong>🗺️ Location:</strong> {state}</p>
-                <p><strong>🌿 Crop:</strong> {crop}</p>
-                <p><strong>🌅 Season:</strong> {season}</p>
-                <p><strong>📏 Area:</strong> {area} ha</p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Environmental preview
-        st.markdown(f"""
-        <div class="info-card">
-            <h4>🌍 Environmental Preview</h4>
-            <div style="display: grid; gap: 0.5rem;">
-                <p><strong>🌧️ Rainfall:</strong> {rainfall} mm</p>
-                <p><strong>🧪 Fertilizer:</strong> {fertilizer} kg/ha</p>
-                <p><strong>🧫 Pesticide:</strong> {pesticide} kg/ha</p>
-                <p><strong>🌡️ Avg Temp:</strong> {weather_data[state]['tavg']}°C</p>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Quick stats
-        total_inputs = fertilizer + pesticide
-
-    # Utility function for rainfall risk
-    def calculate_rainfall_risk(rainfall):
-        """Calculate risk level based on rainfall - accounts for both drought and flooding"""
-        if rainfall < 600:
-            return "🔴 High Risk - Drought Conditions", "#FF5722"
-        elif 600 <= rainfall <= 1200:
-            return "🟢 Low Risk - Optimal Rainfall", "#4CAF50"
-        elif 1201 <= rainfall <= 1800:
-            return "🟡 Moderate Risk - Excess Rainfall", "#FFC107"
-        else:  # rainfall > 1800
-            return "🔴 High Risk - Flooding/Waterlogging", "#E64A19"
-
-    risk_status, risk_color = calculate_rainfall_risk(rainfall)
-    st.markdown(f"""
-        <div class="metric-card glow-effect">
-    <h4>⚡ Quick Analytics</h4>
-    <p><strong>Total Inputs (Fertilizer + Pesticide):</strong> {total_inputs:.1f} kg/ha</p>
-    <p><strong>Rainfall Risk:</strong> <span style="color: {risk_color}; font-weight: 600;">{risk_status}</span></p>
-</div>
-        """, unsafe_allow_html=True)
+                # Enhanced Submit Button
+                st.markdown("<br>", unsafe_allow_html=True)
+                submitted = st.form_submit_button("🔮 **Generate AI Prediction**", use_container_width=True)
+                rank_submitted = st.form_submit_button(
+                    "🏆 **Rank Best Crops for This Field**", use_container_width=True,
+                    help="Ignore the crop above and score every crop the model knows for these conditions"
+                )
 
-# ---------------- Enhanced Prediction Results with Animations -------------------
-if submitted and model is not None:
-    # Get weather data
-    tavg = weather_data[state]["tavg"]
-    prcp = weather_data[state]["prcp"]
-    lat = weather_data[state]["lat"]
-    lon = weather_data[state]["lon"]
-    crop_year = datetime.datetime.now().year
-    
-    # Prepare input for model
-    input_df = pd.DataFrame([{
-        "State": state,
-        "Season": season,
-        "Crop": crop,
-        "Area": area,
-        "Annual_Rainfall": rainfall,
-        "Fertilizer": fertilizer,
-        "Pesticide": pesticide,
-        "Crop_Year": crop_year,
-        "tavg": tavg,
-        "prcp": prcp,
-        "Production": 0  # Dummy value
-    }])
+    with col2:
+        st.markdown('<h2 class="section-header">📊 Live Input Monitor</h2>', unsafe_allow_html=True)
     
-    try:
-        # Animated loading sequence
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        # Simulate AI processing with progress updates
-        for i in range(100):
-            progress_bar.progress(i + 1)
-            if i < 30:
-                status_text.text('🔍 Analyzing geographic data...')
-            elif i < 60:
-                status_text.text('🌦️ Processing weather patterns...')
-            elif i < 90:
-                status_text.text('🧠 Running ML algorithms...')
-            else:
-                status_text.text('✨ Generating predictions...')
-            time.sleep(0.02)
-        
-        # Make prediction
-        prediction = model.predict(input_df)[0]
-        
-        # Clear progress indicators
-        progress_bar.empty()
-        status_text.empty()
-        
-        # Display results with animations
-        st.markdown('<div class="success-animation">', unsafe_allow_html=True)
-        st.markdown('<h2 class="section-header">🎯 AI Prediction Results</h2>', unsafe_allow_html=True)
-        
-        # Main prediction card with enhanced styling
-        st.markdown(f"""
-        <div class="prediction-card success-animation">
-            <h2>🌾 Predicted Crop Yield</h2>
-            <h1 style="font-size: 4rem; margin: 1.5rem 0; font-weight: 800;">{prediction:.2f}</h1>
-            <h3 style="font-size: 1.5rem; margin-bottom: 1rem;">quintals per hectare</h3>
-            <p style="font-size: 1.1rem; opacity: 0.9;">for {crop} cultivation in {state} during {season} season</p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Enhanced metrics with animations (3 columns)
-        col_m1, col_m2, col_m3 = st.columns(3)
-        
-        with col_m1:
-            total_production = prediction * area
+        # Real-time input display with animations
+        if 'state' in locals():
             st.markdown(f"""
-            <div class="metric-card metric-value">
-                <h4>📦 Total Production</h4>
-                <h2 style="color: #2E7D32; margin: 0.5rem 0;">{total_production:.1f}</h2>
-                <p style="margin: 0; color: #666;">quintals</p>
+            <div class="metric-card floating-element">
+                <h4>🎯 Current Configuration</h4>
+                <div style="display: grid; gap: 0.5rem;">
+                    <p><strong>🗺️ Location:</strong> {state}</p>
+                    <p><strong>🌿 Crop:</strong> {crop}</p>
+                    <p><strong>🌅 Season:</strong> {season}</p>
+                    <p><strong>📏 Area:</strong> {area} ha</p>
+                </div>
             </div>
             """, unsafe_allow_html=True)
         
-        with col_m2:
-            if prediction < 0:
-                category = "Poor"
-                color = "#FF5722"
-            elif 0 <= prediction < 0.5:
-                category = "Below Average"
-                color = "#FF9800"
-            elif 0.5 <= prediction < 1:
-                category = "Average"
-                color = "#FFC107"
-            elif 1 <= prediction < 1.5:
-                category = "Good"
-                color = "#4CAF50"
-            else:
-                category = "Excellent"
-                color = "#2E7D32"
-
+            # Environmental preview
             st.markdown(f"""
-            <div class="metric-card metric-value">
-                <h4>📊 Yield Category</h4>
-                <h2 style="color: {color}; margin: 0.5rem 0;">{category}</h2>
-                <p style="margin: 0; color: #666;">{prediction:.1f} q/ha</p>
+            <div class="info-card">
+                <h4>🌍 Environmental Preview</h4>
+                <div style="display: grid; gap: 0.5rem;">
+                    <p><strong>🌧️ Rainfall:</strong> {rainfall} mm</p>
+                    <p><strong>🧪 Fertilizer:</strong> {fertilizer} kg/ha</p>
+                    <p><strong>🧫 Pesticide:</strong> {pesticide} kg/ha</p>
+                    <p><strong>🌡️ Avg Temp:</strong> {weather_data[state]['tavg']}°C</p>
+                </div>
             </div>
             """, unsafe_allow_html=True)
+        
+            # Quick stats
+            total_inputs = fertilizer + pesticide
 
-        with col_m3:
-            # Calculate revenue using crop-specific prices
-            price_per_quintal = crop_prices[crop]
-            revenue_estimate = total_production * price_per_quintal
+        # Utility function for rainfall risk
+        def calculate_rainfall_risk(rainfall):
+            """Calculate risk level based on rainfall - accounts for both drought and flooding"""
+            if rainfall < 600:
+                return "🔴 High Risk - Drought Conditions", "#FF5722"
+            elif 600 <= rainfall <= 1200:
+                return "🟢 Low Risk - Optimal Rainfall", "#4CAF50"
+            elif 1201 <= rainfall <= 1800:
+                return "🟡 Moderate Risk - Excess Rainfall", "#FFC107"
+            else:  # rainfall > 1800
+                return "🔴 High Risk - Flooding/Waterlogging", "#E64A19"
 
-            st.markdown(f"""
-            <div class="metric-card metric-value">
-                <h4>💰 Revenue Estimate</h4>
-                <h2 style="color: #4CAF50; margin: 0.5rem 0;">₹{revenue_estimate:,.0f}</h2>
-                <p style="margin: 0; color: #666;">@ ₹{price_per_quintal}/quintal</p>
-            </div>
+        risk_status, risk_color = calculate_rainfall_risk(rainfall)
+        st.markdown(f"""
+            <div class="metric-card glow-effect">
+        <h4>⚡ Quick Analytics</h4>
+        <p><strong>Total Inputs (Fertilizer + Pesticide):</strong> {total_inputs:.1f} kg/ha</p>
+        <p><strong>Rainfall Risk:</strong> <span style="color: {risk_color}; font-weight: 600;">{risk_status}</span></p>
+    </div>
             """, unsafe_allow_html=True)
 
-        # Charts
-        st.markdown('<h2 class="section-header">📊 Advanced Analytics Dashboard</h2>', unsafe_allow_html=True)
-
-        viz_col1, viz_col2, viz_col3 = st.columns([1, 1, 1])
-
-        with viz_col1:
-            st.markdown("### 🗺️ **Geographic Intelligence**")
-            df_map = pd.DataFrame({
-                'lat': [lat],
-                'lon': [lon],
-                'crop': [crop],
-                'yield': [prediction]
-            })
-
-            fig = px.scatter_mapbox(
-                df_map,
-                lat="lat",
-                lon="lon",
-                color="crop",
-                size="yield",
-                hover_name="crop",
-                hover_data={"yield": True, "lat": False, "lon": False},
-                zoom=4.2,  # Zoomed out to show all of India
-                center={"lat": 22.5, "lon": 80.9},  # Center of India
-                height=400
-            )
-            fig.update_layout(
-                mapbox_style="carto-positron",
-                margin={"r":0,"t":0,"l":0,"b":0}
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-        with viz_col2:
-            st.markdown("### 🔬 **Environmental Factor Impact**")
-            # Environmental factors radar chart
-            factors = ['Rainfall', 'Temperature', 'Fertilizer', 'Area', 'Pesticide']
-            values = [
-                min(100, rainfall / 15),  # Normalize to 100
-                min(100, tavg * 3),
-                min(100, fertilizer * 1.5),
-                min(100, area * 20),
-                min(100, pesticide * 8)
-            ]
+    # ---------------- Enhanced Prediction Results with Animations -------------------
+    if submitted and model is not None:
+        # Get weather data
+        tavg = weather_data[state]["tavg"]
+        prcp = weather_data[state]["prcp"]
+        lat = weather_data[state]["lat"]
+        lon = weather_data[state]["lon"]
+        crop_year = datetime.datetime.now().year
+    
+        # Prepare input for model
+        stage_start = time.perf_counter()
+        input_df = build_input_frame(
+            state, season, crop, area, rainfall, fertilizer, pesticide,
+            crop_year, tavg, prcp
+        )
+        observe_stage("input_build", stage_start)
+    
+        # Progress follows the real stages; nothing waits just to animate the bar
+        progress_bar = st.progress(0, text='🧠 Running ML algorithms...')
+        try:
+            # Make prediction (validated, pre-encoded fast path when available)
+            predict_start = time.perf_counter()
+            prediction = predict_yields(input_df)[0]
+            latency_ms = (time.perf_counter() - predict_start) * 1000
             
-            fig_radar = go.Figure()
-            fig_radar.add_trace(go.Scatterpolar(
-                r=values,
-                theta=factors,
-                fill='toself',
-                name='Current Parameters',
-                line_color='#4CAF50',
-                fillcolor='rgba(76, 175, 80, 0.3)'
-            ))
+            # Log to history (queued; written by the background writer)
+            history.record(
+                state, crop, season,
+                input_df.iloc[0].drop(["State", "Crop", "Season"]).to_dict(),
+                prediction, model_version, latency_ms
+            )
             
-            fig_radar.update_layout(
-                polar=dict(
-                    radialaxis=dict(
-                        visible=True,
-                        range=[0, 100]
-                    )),
-                showlegend=False,
-                title="Environmental Factors Impact",
-                height=400
+            # Revenue risk: one batched predict over simulated rainfall and price draws
+            progress_bar.progress(50, text='🌦️ Simulating rainfall and price risk...')
+            stage_start = time.perf_counter()
+            risk = simulate_revenue(
+                lambda frame: predict_yields(frame, source="risk_simulation"),
+                input_df, area, crop_prices[crop], state_rainfall.get(state)
             )
-            st.plotly_chart(fig_radar, use_container_width=True)
-
-        with viz_col3:
-            st.markdown("### ⚠️ **Risk Assessment Analysis**")
-            # Risk assessment
-            risk_factors = pd.DataFrame({
-                'Risk_Factor': ['Weather', 'Pest/Disease', 'Market Price', 'Input Cost', 'Soil Health'],
-                'Risk_Level': [
-                    30 if rainfall > 1000 else 70,  # Weather risk
-                    20 if pesticide > 10 else 60,   # Pest risk
-                    40,  # Market risk (moderate)
-                    50 if fertilizer < 100 else 30,  # Input cost risk
-                    35   # Soil health risk (moderate)
-                ]
-            })
+            observe_stage("risk_simulation", stage_start)
+            
+            # How well the inputs are covered by the training data
+            progress_bar.progress(90, text='✨ Generating predictions...')
+            support_inputs = dict(Area=area, Annual_Rainfall=rainfall, Fertilizer=fertilizer, Pesticide=pesticide)
+            support_score, feature_support = training_support.score_row(crop, **support_inputs)
+            out_of_range = training_support.out_of_range(crop, **support_inputs)
             
-            fig_risk = px.bar(
-                risk_factors,
-                x='Risk_Factor',
-                y='Risk_Level',
-                color='Risk_Level',
-                color_continuous_scale=['green', 'yellow', 'red'],
-                title="Risk Assessment Analysis"
+            # Keep the result for later reruns (tab switches, other fragments)
+            st.session_state["prediction_result"] = {
+                "support_score": support_score, "feature_support": feature_support,
+                "out_of_range": out_of_range, "risk": risk,
+                "state": state, "crop": crop, "season": season, "area": area,
+                "rainfall": rainfall, "fertilizer": fertilizer, "pesticide": pesticide,
+                "tavg": tavg, "lat": lat, "lon": lon,
+                "prediction": float(prediction), "model_version": model_version,
+            }
+        
+        except UnknownCategoryError as e:
+            st.session_state.pop("prediction_result", None)  # don't show the last inputs' result under this error
+            st.error(f"❌ Invalid input: {str(e)}")
+        except (Overloaded, DeadlineExceeded) as e:
+            st.session_state.pop("prediction_result", None)
+            st.warning(f"⏳ The server is busy right now ({str(e)}). Please try again in a moment.")
+        except Exception as e:
+            st.session_state.pop("prediction_result", None)
+            st.error(f"❌ Prediction failed: {str(e)}")
+            st.info("Please check your model file path and ensure all dependencies are installed.")
+        finally:
+            progress_bar.empty()
+
+    # ---------------- Best-crop ranking (one batched prediction) -------------------
+    if rank_submitted and model is not None:
+        try:
+            stage_start = time.perf_counter()
+            base_frame = build_input_frame(
+                state, season, crop, area, rainfall, fertilizer, pesticide,
+                datetime.datetime.now().year, weather_data[state]["tavg"], weather_data[state]["prcp"]
             )
-            fig_risk.update_layout(
-                height=400,
-                xaxis_title="Risk Factors",
-                yaxis_title="Risk Level (%)",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                showlegend=False
+            trend_history = load_yield_trends(datetime.datetime.now().year)["history"]
+            local = trend_history[(trend_history["State"] == state) & (trend_history["Season"] == season)]
+            observed = local.groupby(local["Crop"].map(normalize_category)).size().to_dict()
+            crops = known_crops(fast_predictor, fallback=trend_history["Crop"].unique())
+            ranking = rank_crops(
+                lambda frame: predict_and_record(frame, source="crop_ranking"),
+                base_frame, crops, crop_prices, area, yield_units, observed
             )
-            st.plotly_chart(fig_risk, use_container_width=True)
-        
-        # AI Recommendations with enhanced styling
-        st.markdown('<h2 class="section-header">🤖 AI-Powered Recommendations</h2>', unsafe_allow_html=True)
-        
-        recommendations = []
-        
-        # Weather-based recommendations
-        if rainfall < 600:
-            recommendations.append({
-                'icon': '💧',
-                'title': 'Critical Water Management',
-                'desc': f'With only {rainfall}mm rainfall, install drip irrigation system and consider drought-resistant varieties. Expected water deficit: {800-rainfall}mm',
-                'priority': 'High'
-            })
-        elif rainfall > 1500:
-            recommendations.append({
-                'icon': '🌊',
-                'title': 'Excess Water Management',
-                'desc': f'High rainfall ({rainfall}mm) may cause waterlogging. Ensure proper drainage and consider fungicide application',
-                'priority': 'Medium'
-            })
-        
-        # Fertilizer optimization
-        optimal_fertilizer = avg_yields[crop] * 3  # Rule of thumb: 3kg fertilizer per quintal expected yield
-        if fertilizer < optimal_fertilizer * 0.7:
-            recommendations.append({
-                'icon': '🧪',
-                'title': 'Increase Fertilizer Application',
-                'desc': f'Current: {fertilizer}kg/ha, Recommended: {optimal_fertilizer:.0f}kg/ha. Increase by {optimal_fertilizer-fertilizer:.0f}kg/ha for optimal yield',
-                'priority': 'High'
-            })
-        elif fertilizer > optimal_fertilizer * 1.3:
-            recommendations.append({
-                'icon': '⚖️',
-                'title': 'Reduce Fertilizer Usage',
-                'desc': f'Over-fertilization detected ({fertilizer}kg/ha). Reduce to {optimal_fertilizer:.0f}kg/ha to improve cost effectiveness',
-                'priority': 'Medium'
-            })
-        
-        
-        
-        # Pesticide recommendations
-        if pesticide > 20:
-            recommendations.append({
-                'icon': '🌱',
-                'title': 'Reduce Chemical Pesticide',
-                'desc': f'High pesticide usage ({pesticide}kg/ha). Implement IPM practices to reduce to 10-15kg/ha and improve sustainability',
-                'priority': 'Medium'
-            })
-        elif pesticide < 5:
-            recommendations.append({
-                'icon': '🛡️',
-                'title': 'Pest Management Alert',
-                'desc': f'Low pesticide usage ({pesticide}kg/ha) may increase pest risk. Monitor crop health closely and be ready for targeted application',
-                'priority': 'Medium'
-            })
-        
-        # Season-specific recommendations
-        if season == 'Summer':
-            recommendations.append({
-                'icon': '☀️',
-                'title': 'Summer Season Management',
-                'desc': 'Use mulching to conserve soil moisture, provide shade nets if possible, and monitor for heat stress symptoms',
-                'priority': 'High'
-            })
-        elif season == 'Kharif':
-            recommendations.append({
-                'icon': '🌧️',
-                'title': 'Monsoon Preparedness',
-                'desc': 'Ensure proper drainage, apply pre-emergence herbicides, and monitor for fungal diseases during monsoon',
-                'priority': 'Medium'
-            })
-        
-        
-        
-        # Crop-specific recommendations
-        if crop == 'Rice' and rainfall < 1000:
-            recommendations.append({
-                'icon': '🌾',
-                'title': 'Rice Water Management',
-                'desc': 'Rice requires 1000-1200mm water. Consider System of Rice Intensification (SRI) method to reduce water usage by 30-40%',
-                'priority': 'High'
-            })
-        elif crop == 'Groundnut' and fertilizer > 60:
-            recommendations.append({
-                'icon': '🥜',
-                'title': 'Groundnut Nutrition',
-                'desc': 'Groundnut fixes nitrogen naturally. Reduce nitrogen fertilizer and focus on phosphorus and potassium for better pod development',
-                'priority': 'Medium'
-            })
-        
-        # Default recommendations if none generated
-        if not recommendations:
-            recommendations = [
-                {
-                    'icon': '✅',
-                    'title': 'Well-Balanced Approach',
-                    'desc': f'Your farming parameters are well-optimized for {crop} cultivation. Expected yield of {prediction:.1f} q/ha is within good range',
-                    'priority': 'Info'
-                },
-                {
-                    'icon': '📊',
-                    'title': 'Market Intelligence',
-                    'desc': f'Current market price: ₹{crop_prices[crop]}/quintal. Monitor price trends and consider contract farming for price stability',
-                    'priority': 'Medium'
-                },
-                {
-                    'icon': '🌿',
-                    'title': 'Sustainable Practices',
-                    'desc': 'Implement crop rotation, use organic matter, and maintain soil health for long-term productivity and environmental benefits',
-                    'priority': 'Low'
-                },
-                {
-                    'icon': '📱',
-                    'title': 'Technology Adoption',
-                    'desc': 'Consider using weather-based agro-advisories, soil health cards, and precision farming techniques for better results',
-                    'priority': 'Low'
-                }
-            ]
-        
-        # Display recommendations with priority color coding
-        for i, rec in enumerate(recommendations):
-            priority_colors = {
-                'High': '#FF5722',
-                'Medium': '#FF9800', 
-                'Low': '#4CAF50',
-                'Info': '#2196F3'
+            observe_stage("crop_ranking", stage_start)
+            st.session_state["crop_ranking"] = {
+                "state": state, "season": season, "area": area, "table": ranking,
+                "latency_ms": (time.perf_counter() - stage_start) * 1000,
             }
-            color = priority_colors.get(rec['priority'], '#4CAF50')
-            
-            st.markdown(f"""
-            <div class="recommendation-card" style="border-left-color: {color}; animation-delay: {i * 0.2}s;">
-                <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
-                    <span style="font-size: 1.5rem; margin-right: 1rem;">{rec['icon']}</span>
-                    <h4 style="margin: 0; color: #2E7D32;">{rec['title']}</h4>
-                    <span style="margin-left: auto; padding: 0.2rem 0.8rem; background: {color}; color: white; border-radius: 15px; font-size: 0.8rem; font-weight: 600;">{rec['priority']}</span>
-                </div>
-                <p style="margin: 0; color: #555; line-height: 1.5;">{rec['desc']}</p>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-    except Exception as e:
-        st.error(f"❌ Prediction failed: {str(e)}")
-        st.info("Please check your model file path and ensure all dependencies are installed.")
+            st.session_state.pop("prediction_result", None)
+        except UnknownCategoryError as e:
+            st.error(f"❌ Invalid input: {str(e)}")
+        except (Overloaded, DeadlineExceeded) as e:
+            st.warning(f"⏳ The server is busy right now ({str(e)}). Please try again in a moment.")
+        except Exception as e:
+            st.error(f"❌ Ranking failed: {str(e)}")
+    elif submitted:
+        st.session_state.pop("crop_ranking", None)
+
+    ranking_result = st.session_state.get("crop_ranking")
+    if ranking_result is not None:
+        render_crop_ranking(ranking_result)
+
+    result = st.session_state.get("prediction_result")
+    if result is not None:
+        try:
+            render_prediction_results(result)
+        except Exception as e:
+            st.error(f"❌ Could not render results: {str(e)}")
+    observe_stage("fragment_prediction", fragment_start)
+
+# ---------------- Multi-Scenario Comparison -------------------
+SCENARIO_COLUMNS = ["Scenario", "State", "Season", "Crop", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+
+def default_scenarios():
+    # Three fertilizer plans under two rainfall assumptions
+    rows = []
+    for rain_label, rain in [("Normal rain", 1000.0), ("Dry year", 600.0)]:
+        for plan_label, fert in [("Low fert", 50.0), ("Standard fert", 75.0), ("High fert", 110.0)]:
+            rows.append({
+                "Scenario": f"{plan_label} / {rain_label}",
+                "State": "Karnataka", "Season": "Kharif", "Crop": "Rice",
+                "Area": 2.5, "Annual_Rainfall": rain, "Fertilizer": fert, "Pesticide": 12.0
+            })
+    return pd.DataFrame(rows, columns=SCENARIO_COLUMNS)
+
+@st.fragment
+@profiled("fragment_scenario", profiling_enabled)
+def scenario_section():
+    fragment_start = time.perf_counter()
+    st.markdown('<h2 class="section-header">🧪 Side-by-Side Scenario Comparison</h2>', unsafe_allow_html=True)
+    st.markdown("Edit the table or upload a CSV with the same columns; all scenarios are scored in one batched prediction.")
+    
+    uploaded_scenarios = st.file_uploader("📤 Upload scenarios (CSV)", type="csv", key="scenario_upload")
+    scenario_seed = None
+    if uploaded_scenarios is not None:
+        try:
+            scenario_seed = pd.read_csv(uploaded_scenarios)
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+            st.error(f"❌ Could not read {uploaded_scenarios.name}: {str(e)}")
+        else:
+            if "Scenario" not in scenario_seed:
+                scenario_seed.insert(0, "Scenario", [f"Scenario {i + 1}" for i in range(len(scenario_seed))])
+    if scenario_seed is None:
+        scenario_seed = default_scenarios()
+    
+    scenarios = st.data_editor(
+        scenario_seed,
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        key="scenario_editor",
+        column_config={
+            "State": st.column_config.SelectboxColumn("📍 State", options=list(weather_data.keys()), required=True),
+            "Season": st.column_config.SelectboxColumn("🌅 Season", options=SEASONS, required=True),
+            "Crop": st.column_config.SelectboxColumn("🌿 Crop", options=list(crop_prices.keys()), required=True),
+            "Area": st.column_config.NumberColumn("📏 Area (ha)", min_value=0.1, step=0.1),
+            "Annual_Rainfall": st.column_config.NumberColumn("🌧️ Rainfall (mm)", min_value=0.0, step=25.0),
+            "Fertilizer": st.column_config.NumberColumn("🧪 Fertilizer (kg/ha)", min_value=0.0, step=5.0),
+            "Pesticide": st.column_config.NumberColumn("🧫 Pesticide (kg/ha)", min_value=0.0, step=1.0),
+        }
+    )
+    
+    if st.button("⚖️ Compare Scenarios", use_container_width=True, disabled=model is None, key="scenario_compare"):
+        missing_columns = [c for c in SCENARIO_COLUMNS[1:] if c not in scenarios]
+        if missing_columns:
+            st.error(f"❌ Invalid scenario input: missing column(s) {', '.join(missing_columns)}")
+        else:
+            scenarios = scenarios.dropna(subset=SCENARIO_COLUMNS[1:]).reset_index(drop=True)
+            if scenarios.empty:
+                st.warning("Add at least one complete scenario row.")
+            else:
+                try:
+                    scenario_inputs = complete_input_frame(scenarios, weather_data, datetime.datetime.now().year)
+                    scenarios["Predicted_Yield"] = predict_and_record(scenario_inputs, source="scenarios")
+                    scenarios["Production"] = scenarios["Predicted_Yield"] * scenarios["Area"]
+                    scenarios["Price"] = scenarios["Crop"].map(crop_prices)
+                    scenarios["Revenue"] = scenarios["Production"] * scenarios["Price"]
+                    scenarios["Model_Version"] = model_version
+                    scenarios["Training_Support"] = training_support.score_frame(scenario_inputs)["support_score"].to_numpy()
+                    st.session_state["scenario_result"] = scenarios
+                except (UnknownCategoryError, KeyError, ValueError) as e:
+                    st.error(f"❌ Invalid scenario input: {str(e)}")
+                except (Overloaded, DeadlineExceeded) as e:
+                    st.warning(f"⏳ The server is busy right now ({str(e)}). Please try again in a moment.")
+    
+    # Last comparison persists until the next one
+    scenarios = st.session_state.get("scenario_result")
+    if scenarios is not None:
+        best = scenarios.loc[scenarios["Revenue"].fillna(-np.inf).idxmax()]
+        col_s1, col_s2, col_s3 = st.columns(3)
+        with col_s1:
+            metric_card("🏆 Best Scenario", best["Scenario"], f"{best['Predicted_Yield']:.2f} q/ha")
+        with col_s2:
+            metric_card("📦 Production Range", f"{scenarios['Production'].min():.1f} – {scenarios['Production'].max():.1f}", "quintals")
+        with col_s3:
+            metric_card("💰 Revenue Spread", f"₹{scenarios['Revenue'].max() - scenarios['Revenue'].min():,.0f}", "best vs. worst scenario", "#4CAF50")
+
+        fig_scenarios = make_subplots(rows=1, cols=2, subplot_titles=("Total Production (quintals)", "Revenue Estimate (₹)"))
+        fig_scenarios.add_trace(go.Bar(x=scenarios["Scenario"], y=scenarios["Production"], marker_color="#2E7D32", name="Production"), row=1, col=1)
+        fig_scenarios.add_trace(go.Bar(x=scenarios["Scenario"], y=scenarios["Revenue"], marker_color="#4CAF50", name="Revenue"), row=1, col=2)
+        fig_scenarios.update_layout(
+            height=450,
+            showlegend=False,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)'
+        )
+        st.plotly_chart(fig_scenarios, use_container_width=True)
+
+        st.dataframe(
+            scenarios.round({"Predicted_Yield": 2, "Production": 1, "Revenue": 0, "Training_Support": 2}),
+            use_container_width=True,
+            hide_index=True
+        )
+
+    observe_stage("fragment_scenario", fragment_start)
+
+# ---------------- Prediction History -------------------
+@st.fragment
+@profiled("fragment_history", profiling_enabled)
+def history_section():
+    fragment_start = time.perf_counter()
+    st.markdown('<h2 class="section-header">📜 Prediction History</h2>', unsafe_allow_html=True)
+    
+    hist_col1, hist_col2, hist_col3, hist_col4 = st.columns(4)
+    with hist_col1:
+        hist_state = st.selectbox("📍 State", ["All"] + history.distinct("state"), key="hist_state")
+    with hist_col2:
+        hist_crop = st.selectbox("🌿 Crop", ["All"] + history.distinct("crop"), key="hist_crop")
+    with hist_col3:
+        hist_season = st.selectbox("🌅 Season", ["All"] + history.distinct("season"), key="hist_season")
+    with hist_col4:
+        page_size = st.selectbox("Rows per page", [25, 50, 100], index=1, key="hist_page_size")
+    
+    history_filters = {
+        "state": None if hist_state == "All" else hist_state,
+        "crop": None if hist_crop == "All" else hist_crop,
+        "season": None if hist_season == "All" else hist_season,
+    }
+    # Keyset cursors of the pages visited so far; reset whenever the query changes
+    query_key = (tuple(history_filters.values()), page_size)
+    if st.session_state.get("hist_query") != query_key:
+        st.session_state["hist_query"] = query_key
+        st.session_state["hist_cursors"] = [None]
+    cursors = st.session_state["hist_cursors"]
+    
+    rows, next_cursor = history.page(limit=page_size, cursor=cursors[-1], **history_filters)
+    if rows:
+        history_df = pd.DataFrame([{
+            "Time": datetime.datetime.fromtimestamp(row["created_at"]).strftime("%Y-%m-%d %H:%M:%S"),
+            "State": row["state"],
+            "Crop": row["crop"],
+            "Season": row["season"],
+            "Area (ha)": row["inputs"].get("Area"),
+            "Rainfall (mm)": row["inputs"].get("Annual_Rainfall"),
+            "Fertilizer": row["inputs"].get("Fertilizer"),
+            "Pesticide": row["inputs"].get("Pesticide"),
+            "Prediction (q/ha)": round(row["prediction"], 2),
+            "Model": row["model_version"],
+            "Latency (ms)": round(row["latency_ms"], 1) if row["latency_ms"] is not None else None,
+        } for row in rows])
+        st.dataframe(history_df, use_container_width=True, hide_index=True)
+    else:
+        st.info("No predictions recorded yet for this selection.")
+    
+    nav_col1, nav_col2, nav_col3 = st.columns([1, 2, 1])
+    with nav_col1:
+        if st.button("⬅️ Newer", disabled=len(cursors) == 1, key="hist_prev"):
+            cursors.pop()
+            st.rerun(scope="fragment")
+    with nav_col2:
+        st.markdown(f"<p style='text-align: center;'>Page {len(cursors)}</p>", unsafe_allow_html=True)
+    with nav_col3:
+        if st.button("Older ➡️", disabled=next_cursor is None, key="hist_next"):
+            cursors.append(next_cursor)
+            st.rerun(scope="fragment")
+
+    observe_stage("fragment_history", fragment_start)
+
+# ---------------- Bulk Upload -------------------
+BULK_POLL_SECONDS = 1.0
+# st.download_button copies the file into Streamlit's in-memory media store for as long as the
+# button is on screen, so larger results are only offered as a path on the server
+BULK_DOWNLOAD_MAX_BYTES = int(float(os.environ.get("AGRIPREDICT_BULK_DOWNLOAD_MB", 50)) * 1024 * 1024)
+
+def bulk_chunk_predictor(predictor, version):
+    """Chunk scorer for the bulk worker thread: shared executor, metrics and history, no Streamlit calls"""
+    def predict(frame):
+        predict_start = time.perf_counter()
+        predictions = inference_executor.predict(predictor.predict, frame, namespace=version)
+        record_predictions(frame, "bulk")
+        # Off the request path, so wait for writer room instead of dropping rows
+        history.record_frame(frame, predictions, version, (time.perf_counter() - predict_start) * 1000, timeout=5)
+        return predictions
+    return predict
+
+def bulk_job_active():
+    job = bulk_scorer.get(st.session_state.get("bulk_job"))
+    return job is not None and job.active
+
+@profiled("fragment_bulk", profiling_enabled)
+def bulk_section(polling):
+    fragment_start = time.perf_counter()
+    st.markdown('<h2 class="section-header">📤 Bulk Farm Scoring</h2>', unsafe_allow_html=True)
+    st.markdown(
+        f"Upload a CSV with the columns {', '.join(f'`{c}`' for c in FARM_COLUMNS)} (any extra columns such as "
+        "`Farm_ID` are kept). The file is scored in the background; you can keep using the other tabs meanwhile."
+    )
+
+    uploaded_farms = st.file_uploader("📤 Upload farms (CSV)", type="csv", key="bulk_upload")
+    if st.button("🚀 Score File", use_container_width=True, key="bulk_submit",
+                 disabled=uploaded_farms is None or model is None or bulk_job_active()):
+        predictor = cube_predictor if cube_predictor is not None else fast_predictor
+        try:
+            job = bulk_scorer.submit(uploaded_farms.getvalue(), uploaded_farms.name,
+                                     bulk_chunk_predictor(predictor, model_version), model_version,
+                                     vocabularies=category_vocabularies(fast_predictor), support=training_support)
+            st.session_state["bulk_job"] = job.id
+            st.rerun()  # full rerun, so this section starts polling for progress
+        except (KeyError, ValueError) as e:
+            st.error(f"❌ Invalid upload: {str(e)}")
+
+    job = bulk_scorer.get(st.session_state.get("bulk_job"))
+    if job is None:
+        observe_stage("fragment_bulk", fragment_start)
+        return
+    if polling and not job.active:
+        st.rerun()  # finished: redraw once without the polling timer
+
+    progress = job.snapshot()
+    done_fraction = progress["processed"] / progress["total"] if progress["total"] else 1.0
+    if job.active:
+        st.progress(min(done_fraction, 1.0), text=(
+            f"Scoring **{job.name}**: {progress['processed']:,} / {progress['total']:,} rows "
+            f"({progress['rows_per_second']:,.0f} rows/s)"
+        ))
+        if st.button("⏹️ Cancel", key="bulk_cancel"):
+            job.cancel()
+    elif progress["status"] == "done":
+        st.success(f"✅ Scored {progress['processed']:,} rows of **{job.name}** "
+                   f"({progress['rows_per_second']:,.0f} rows/s, model {job.model_version}).")
+    elif progress["status"] == "cancelled":
+        st.warning(f"⏹️ Scoring of **{job.name}** was cancelled after {progress['processed']:,} rows.")
+    else:
+        st.error(f"❌ Scoring of **{job.name}** failed: {progress['error']}")
+
+    col_b1, col_b2, col_b3 = st.columns(3)
+    with col_b1:
+        metric_card("📄 Rows Scored", f"{progress['processed'] - progress['failed']:,}", f"of {progress['total']:,}")
+    with col_b2:
+        metric_card("⚠️ Rows With Errors", f"{progress['failed']:,}", "kept in the file with an Error", "#FF9800")
+    with col_b3:
+        summary = progress["summary"]
+        metric_card("🌿 Crops", f"{len(summary)}", "in the rows scored so far", "#4CAF50")
+
+    if not summary.empty:
+        st.markdown("#### Average predicted yield by crop (so far)")
+        st.dataframe(summary, hide_index=True, use_container_width=True, column_config={
+            "Mean_Yield": st.column_config.NumberColumn("Mean yield (per ha)", format="%.2f"),
+        })
+    if progress["preview"] is not None:
+        st.markdown(f"#### First {len(progress['preview'])} scored rows")
+        st.dataframe(progress["preview"], hide_index=True, use_container_width=True)
+
+    if progress["status"] == "done":
+        # Only the chosen format is read, and only below BULK_DOWNLOAD_MAX_BYTES
+        download_format = st.radio("Download format", ["CSV", "Parquet"], horizontal=True, key="bulk_format")
+        path, mime = ((job.csv_path, "text/csv") if download_format == "CSV"
+                      else (job.parquet_path, "application/vnd.apache.parquet"))
+        size = os.path.getsize(path)
+        if size > BULK_DOWNLOAD_MAX_BYTES:
+            st.info(
+                f"ℹ️ The scored file is {size / 1024 ** 2:,.0f} MB, above the "
+                f"{BULK_DOWNLOAD_MAX_BYTES / 1024 ** 2:,.0f} MB in-browser download limit"
+                f"{' (try Parquet, which is smaller)' if download_format == 'CSV' else ''}. "
+                f"It is kept on the server at `{os.path.abspath(path)}`."
+            )
+        else:
+            with open(path, "rb") as file:
+                st.download_button(
+                    f"⬇️ Download scored file ({download_format})", file,
+                    file_name=f"{os.path.splitext(job.name)[0]}_scored{os.path.splitext(path)[1]}",
+                    mime=mime, use_container_width=True, key="bulk_download"
+                )
+
+    observe_stage("fragment_bulk", fragment_start)
+
+predict_tab, scenario_tab, history_tab, bulk_tab = st.tabs(
+    ["🔮 AI Prediction", "🧪 Scenario Comparison", "📜 Prediction History", "📤 Bulk Upload"]
+)
+
+with predict_tab:
+    prediction_section()
+with scenario_tab:
+    scenario_section()
+with history_tab:
+    history_section()
+with bulk_tab:
+    # Polls for progress only while this session's job runs; otherwise an ordinary fragment
+    bulk_polling = bulk_job_active()
+    st.fragment(bulk_section, run_every=BULK_POLL_SECONDS if bulk_polling else None)(bulk_polling)
 
 # ---------------- Footer -------------------
 st.markdown("---")
-st.markdown("""
+accuracy_badge = f"🎯 {backtest['overall']['r2']:.1%} Backtest R²" if backtest is not None else "🎯 Backtested Accuracy"
+st.markdown(f"""
 <div style="text-align: center; padding: 3rem; background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%); border-radius: 20px; margin-top: 2rem;">
     <h3 style="color: #2E7D32; margin-bottom: 1rem;">🌾 AgriPredict AI</h3>
     <p style="color: #666; font-size: 1.1rem; margin-bottom: 1rem;">Revolutionizing Agriculture with Artificial Intelligence</p>
     <div style="display: flex; justify-content: center; gap: 2rem; flex-wrap: wrap; margin-bottom: 1rem;">
-        <span style="color: #4CAF50; font-weight: 600;">🎯 98.7% Accuracy</span>
+        <span style="color: #4CAF50; font-weight: 600;">{accuracy_badge}</span>
         <span style="color: #4CAF50; font-weight: 600;">🚀 Real-time Analysis</span>
         <span style="color: #4CAF50; font-weight: 600;">🌍 Multi-state Coverage</span>
         <span style="color: #4CAF50; font-weight: 600;">📊 Advanced ML</span>
@@ -1157,3 +1541,8 @@ st.markdown("""
     <p style="color: #888; font-size: 0.9rem; margin: 0;">Built with ❤️ from Mayank | Powered by Random Forest Machine Learning</p>
 </div>
 """, unsafe_allow_html=True)
+
+observe_stage("script", SCRIPT_START)
+profile_summary = finish_profile(script_profiler)
+if profile_summary is not None:
+    st.caption(f"🔬 Rerun profile saved to {profile_summary}")
@@ -0,0 +1,66 @@
+"""
+Per-row overhead of the pickled pipeline vs. the precomputed FastEncoder path.
+
+    python benchmarks/bench_encoding.py --model crop_yield_pipeline.pkl
+"""
+import argparse
+import pickle
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from feature_encoding import FEATURE_COLUMNS, FastEncoder  # noqa: E402
+
+
+def sample_rows(data_path, n_rows, seed=0):
+    data = pd.read_csv(data_path)
+    rows = data.sample(n=n_rows, replace=len(data) < n_rows, random_state=seed)
+    rows = rows.reindex(columns=FEATURE_COLUMNS)
+    rows["Production"] = 0
+    return rows.reset_index(drop=True)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="crop_yield_pipeline.pkl")
+    parser.add_argument("--data", default="merged_data.csv")
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as file:
+        model = pickle.load(file)
+    fast = FastEncoder.from_pipeline(model)
+    preprocessor = model[:-1]
+
+    batch = sample_rows(args.data, args.batch)
+    single = batch.iloc[:1]
+
+    print(f"{'case':<44}{'pipeline':>14}{'fast':>14}{'speedup':>10}")
+    for label, frame in (("single row", single), (f"batch of {len(batch)}", batch)):
+        n = len(frame)
+        cases = [
+            ("encode only / row", lambda: preprocessor.transform(frame), lambda: fast.transform(frame)),
+            ("encode + predict / row", lambda: model.predict(frame), lambda: fast.predict(frame)),
+        ]
+        for name, slow_call, fast_call in cases:
+            slow = best_of(slow_call, args.repeat) / n
+            quick = best_of(fast_call, args.repeat) / n
+            print(f"{label + ', ' + name:<44}{slow * 1e6:>12.1f}us{quick * 1e6:>12.1f}us{slow / quick:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
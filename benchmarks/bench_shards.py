@@ -0,0 +1,90 @@
+"""
+Monolithic pipeline vs. lazily loaded per-crop shards.
+
+Each approach is measured in a fresh process: resident memory after the first
+request and first-request latency (load + predict for one crop). Accuracy is
+compared on the holdout rows written by ``sharded_models.py train``; note the
+monolithic model may have seen those rows during its own training.
+
+    python benchmarks/bench_shards.py --model crop_yield_pipeline.pkl
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from feature_encoding import build_fast_predictor  # noqa: E402
+from sharded_models import DEFAULT_SHARD_DIR, ShardedModel  # noqa: E402
+
+
+def _rss_mb():
+    with open("/proc/self/statm") as file:
+        pages = int(file.read().split()[1])
+    return pages * resource.getpagesize() / 1e6
+
+
+def _first_request(kind, model_path, shard_dir, request, results):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    if kind == "monolithic":
+        with open(model_path, "rb") as file:
+            pipeline = pickle.load(file)
+        predictor = build_fast_predictor(pipeline) or pipeline
+    else:
+        predictor = ShardedModel(shard_dir)
+    predictor.predict(request)
+    latency = time.perf_counter() - start
+    results.put({"kind": kind, "first_request_s": latency, "resident_mb": _rss_mb() - baseline})
+
+
+def _scores(predictor, holdout):
+    predictions = predictor.predict(holdout.drop(columns=["Yield"]))
+    error = predictions - holdout["Yield"].to_numpy()
+    total = ((holdout["Yield"] - holdout["Yield"].mean()) ** 2).sum()
+    return {"mae": float(np.abs(error).mean()), "r2": float(1 - (error ** 2).sum() / total)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="crop_yield_pipeline.pkl")
+    parser.add_argument("--shards", default=DEFAULT_SHARD_DIR)
+    parser.add_argument("--crop", default="Rice")
+    args = parser.parse_args()
+
+    holdout = pd.read_csv(os.path.join(args.shards, "holdout.csv"))
+    request = holdout[holdout["Crop"].str.strip() == args.crop].drop(columns=["Yield"]).head(1)
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    rows = {}
+    for kind in ("monolithic", "sharded"):
+        process = context.Process(
+            target=_first_request, args=(kind, args.model, args.shards, request, results)
+        )
+        process.start()
+        rows[kind] = results.get()
+        process.join()
+
+    with open(args.model, "rb") as file:
+        pipeline = pickle.load(file)
+    rows["monolithic"].update(_scores(build_fast_predictor(pipeline) or pipeline, holdout))
+    rows["sharded"].update(_scores(ShardedModel(args.shards), holdout))
+
+    print(f"{'model':<12}{'resident MB':>14}{'first req s':>14}{'MAE':>10}{'R2':>8}")
+    for kind, row in rows.items():
+        print(f"{kind:<12}{row['resident_mb']:>14.1f}{row['first_request_s']:>14.3f}"
+              f"{row['mae']:>10.3f}{row['r2']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
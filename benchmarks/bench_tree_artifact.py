@@ -0,0 +1,114 @@
+"""
+Pickled pipeline vs. memory-mapped tree artifact across 1, 4 and 8 processes.
+
+For each format and process count, N fresh (spawned) workers load the model
+at the same time, answer one request and then hold the model while every
+worker reports its load time, RSS and PSS (proportional set size, which
+splits shared pages between the processes mapping them). The PSS total is
+the host memory the replicas really cost; RSS double-counts shared pages.
+
+    python tree_artifact.py export --model crop_yield_pipeline.pkl --out models/tree_model
+    python benchmarks/bench_tree_artifact.py --model crop_yield_pipeline.pkl --artifact models/tree_model
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from model_registry import smoke_frame  # noqa: E402
+
+
+def _memory_mb():
+    """``(rss, pss)`` of this process in MB."""
+    with open("/proc/self/statm") as file:
+        rss = int(file.read().split()[1]) * resource.getpagesize() / 1e6
+    pss = float("nan")
+    try:
+        with open("/proc/self/smaps_rollup") as file:
+            for line in file:
+                if line.startswith("Pss:"):
+                    pss = int(line.split()[1]) / 1e3
+                    break
+    except OSError:
+        pass
+    return rss, pss
+
+
+def _worker(kind, model_path, artifact, request, ready, release, results):
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from feature_encoding import build_fast_predictor
+    import tree_artifact
+
+    rss_before, pss_before = _memory_mb()
+    start = time.perf_counter()
+    if kind == "pickle":
+        with open(model_path, "rb") as file:
+            pipeline = pickle.load(file)
+        predictor = build_fast_predictor(pipeline) or pipeline
+    else:
+        predictor, _ = tree_artifact.load(artifact)
+    load_seconds = time.perf_counter() - start
+    predictor.predict(request)
+    first_request = time.perf_counter() - start
+    ready.wait()  # every worker holds its model before anyone measures
+    rss, pss = _memory_mb()
+    results.put({
+        "load_s": load_seconds, "first_request_s": first_request,
+        "rss_mb": rss - rss_before, "pss_mb": pss - pss_before,
+    })
+    release.wait()
+
+
+def measure(kind, processes, model_path, artifact, request):
+    context = multiprocessing.get_context("spawn")
+    ready, release = context.Barrier(processes), context.Event()
+    results = context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(kind, model_path, artifact, request, ready, release, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    rows = [results.get() for _ in workers]
+    release.set()
+    for worker in workers:
+        worker.join()
+    return {
+        "load_s": statistics.mean(r["load_s"] for r in rows),
+        "first_request_s": statistics.mean(r["first_request_s"] for r in rows),
+        "rss_total_mb": sum(r["rss_mb"] for r in rows),
+        "pss_total_mb": sum(r["pss_mb"] for r in rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default="crop_yield_pipeline.pkl")
+    parser.add_argument("--artifact", default=os.path.join("models", "tree_model"))
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    request = smoke_frame(n_rows=1)
+    # Warm the page cache so both formats read from memory, not disk
+    for path in [args.model] + [os.path.join(args.artifact, f) for f in os.listdir(args.artifact)]:
+        with open(path, "rb") as file:
+            while file.read(1 << 24):
+                pass
+
+    print(f"{'format':<8}{'procs':>6}{'load s':>10}{'1st req s':>11}{'RSS total MB':>14}{'PSS total MB':>14}")
+    for processes in args.processes:
+        for kind in ("pickle", "mmap"):
+            row = measure(kind, processes, args.model, args.artifact, request)
+            print(f"{kind:<8}{processes:>6}{row['load_s']:>10.3f}{row['first_request_s']:>11.3f}"
+                  f"{row['rss_total_mb']:>14.1f}{row['pss_total_mb']:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+Concurrent-session load test for one Streamlit server process.
+
+Starts a single ``streamlit run app.py`` and drives it with N headless
+clients, each speaking the same websocket protocol as a browser tab: it asks
+for a script run, reads the element deltas to find the form widgets by label
+and submits ``prediction_form`` the way the frontend does (widget states plus
+the form's fragment id). All sessions therefore share the server's
+``st.cache_resource`` objects, model, inference executor and history writer,
+which is what one replica serving N users looks like.
+
+One session connects first and pays the cold start; the others then connect
+together, wait at a barrier and submit inputs drawn from the training data
+repeatedly, all at the same time. The harness reports per-submit latency
+percentiles (request sent to script finished), throughput, the server's
+resident memory per extra session, and the server's own per-stage time,
+inference queue wait and shed requests for the submit phase, scraped from
+its ``/metrics`` endpoint. Run it on two revisions to compare. ``--stub``
+(or a missing pickle) swaps in ``StubYieldModel``.
+
+    python benchmarks/load_test.py --sessions 8 --submits 5
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from crop_data import weather_data  # noqa: E402
+from stub_model import StubYieldModel  # noqa: E402
+
+FORM_CROPS = ['Rice', 'Maize', 'Moong(Green Gram)', 'Urad', 'Groundnut']
+FORM_SEASONS = ['Kharif', 'Rabi', 'Whole Year', 'Summer', 'Autumn', 'Winter']
+FORM_SELECTBOXES = [("Select State", "state"), ("Select Crop Type", "crop"), ("Growing Season", "season")]
+FORM_NUMBERS = [("Cultivation Area", "area"), ("Annual Rainfall", "rainfall"),
+                ("Fertilizer Application", "fertilizer"), ("Pesticide Usage", "pesticide")]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_mb(pid):
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1e3
+    return float("nan")
+
+
+class InputSampler:
+    """Form inputs drawn from merged_data.csv, converted to per-hectare values."""
+
+    def __init__(self, data_path, seed):
+        data = pd.read_csv(data_path)
+        data["Crop"] = data["Crop"].str.strip()
+        data["Season"] = data["Season"].str.strip()
+        data = data[data["State"].isin(weather_data) & data["Crop"].isin(FORM_CROPS)]
+        data = data[data["Area"] > 0]
+        self.rows = data.assign(
+            fert_per_ha=data["Fertilizer"] / data["Area"],
+            pest_per_ha=data["Pesticide"] / data["Area"],
+        ).reset_index(drop=True)
+        self.rng = np.random.default_rng(seed)
+
+    def sample(self):
+        row = self.rows.iloc[self.rng.integers(len(self.rows))]
+        season = row["Season"] if row["Season"] in FORM_SEASONS else "Kharif"
+        return {
+            "state": row["State"],
+            "crop": row["Crop"],
+            "season": season,
+            "area": round(float(np.clip(self.rng.lognormal(1.0, 0.8), 0.1, 200.0)), 1),
+            "rainfall": float(round(row["Annual_Rainfall"], 0)),
+            "fertilizer": float(round(np.clip(row["fert_per_ha"], 0, 500), 1)),
+            "pesticide": float(round(np.clip(row["pest_per_ha"], 0, 100), 1)),
+        }
+
+
+class BrowserSession:
+    """One headless browser tab: a websocket to the server and the elements it was last sent."""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.elements = {}  # delta path -> (element proto, fragment id)
+        self.exceptions = []
+        self.connection = None
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self.connection = await websocket_connect(self.url, subprotocols=["streamlit"])
+        return await self.rerun()
+
+    async def rerun(self, widgets=(), fragment_id=""):
+        """Sends one rerun request and reads deltas until that run (not an early restart) finishes."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ClientState_pb2 import ClientState
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetStates
+
+        state = ClientState(widget_states=WidgetStates(widgets=list(widgets)), fragment_id=fragment_id)
+        await self.connection.write_message(BackMsg(rerun_script=state).SerializeToString(), binary=True)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            payload = await asyncio.wait_for(self.connection.read_message(), deadline - time.monotonic())
+            if payload is None:
+                raise ConnectionError("server closed the websocket")
+            msg = ForwardMsg.FromString(payload)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session" and not msg.new_session.fragment_ids_this_run:
+                self.elements.clear()  # a full run redraws the page
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                self.elements[tuple(msg.metadata.delta_path)] = (element, msg.delta.fragment_id)
+                if element.WhichOneof("type") == "exception":
+                    self.exceptions.append(element.exception.message)
+            elif kind == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return msg.script_finished
+
+    def widget(self, kind, label_fragment):
+        """``(proto, fragment id)`` of the first ``kind`` widget whose label contains ``label_fragment``."""
+        for element, fragment_id in self.elements.values():
+            if element.WhichOneof("type") == kind and label_fragment in getattr(element, kind).label:
+                return getattr(element, kind), fragment_id
+        raise LookupError(f"No {kind} labelled '{label_fragment}'")
+
+    async def submit_form(self, inputs):
+        """Fills ``prediction_form`` and clicks its submit button, as the frontend would."""
+        from streamlit.proto.NumberInput_pb2 import NumberInput
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        states = []
+        for label, key in FORM_SELECTBOXES:
+            proto, _ = self.widget("selectbox", label)
+            states.append(WidgetState(id=proto.id, string_value=str(inputs[key])))
+        for label, key in FORM_NUMBERS:
+            proto, _ = self.widget("number_input", label)
+            if proto.data_type == NumberInput.INT:
+                states.append(WidgetState(id=proto.id, int_value=int(inputs[key])))
+            else:
+                states.append(WidgetState(id=proto.id, double_value=float(inputs[key])))
+        button, fragment_id = self.widget("button", "Generate AI Prediction")
+        states.append(WidgetState(id=button.id, trigger_value=True))
+        return await self.rerun(states, fragment_id)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+# ---------------- Server -------------------
+def start_server(port, env, timeout):
+    """``streamlit run app.py`` on ``port``; returns the process once it answers its health check."""
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", str(ROOT / "app.py"),
+         "--server.headless=true", f"--server.port={port}", "--server.address=127.0.0.1",
+         "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit exited with {server.returncode}: {server.stderr.read()[-2000:]}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise TimeoutError(f"streamlit did not become healthy within {timeout:.0f}s")
+
+
+_SAMPLE = re.compile(r'^(\w+)(?:\{(.*)\})? (\S+)$')
+
+
+def server_metrics(port):
+    """``{(metric, labels): value}`` from the app's OpenMetrics endpoint."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        text = response.read().decode()
+    samples = {}
+    for line in text.splitlines():
+        match = _SAMPLE.match(line)
+        if match:
+            samples[(match.group(1), match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def print_stage_summary(before, after):
+    """Server-side time per full script run and per fragment during the submit phase."""
+    def delta(name, labels=""):
+        return after.get((name, labels), 0.0) - before.get((name, labels), 0.0)
+
+    stages = sorted(labels for name, labels in after if name == "agripredict_stage_seconds_count")
+    if stages:
+        print("  server time by stage:")
+    for labels in stages:
+        count = delta("agripredict_stage_seconds_count", labels)
+        if count:
+            stage = labels.split('"')[1]
+            total = delta("agripredict_stage_seconds_sum", labels)
+            print(f"    {stage:<22} n={count:<6.0f} mean={total / count * 1000:.1f}ms")
+    count = delta("agripredict_inference_wait_seconds_count")
+    if count:
+        wait = delta("agripredict_inference_wait_seconds_sum") / count
+        print(f"  inference queue wait: n={count:.0f} mean={wait * 1000:.1f}ms")
+    shed = {reason: delta("agripredict_inference_rejected_total", f'reason="{reason}"')
+            for reason in ("queue_full", "deadline")}
+    print(f"  shed requests: {shed['queue_full']:.0f} queue full, {shed['deadline']:.0f} past deadline")
+
+
+# ---------------- Sessions -------------------
+async def open_session(session_id, url, timeout, report):
+    """Connects one client and waits for its first page; ``None`` if it failed to load."""
+    session = BrowserSession(url, timeout)
+    start = time.perf_counter()
+    try:
+        await session.connect()
+        if session.exceptions:
+            raise RuntimeError(session.exceptions[0])
+    except Exception as exc:
+        report["errors"].append(f"session {session_id}: initial run: {exc!r}")
+        session.close()
+        return None
+    report["timings"].append(("initial", time.perf_counter() - start))
+    return session
+
+
+async def submit_repeatedly(session_id, session, sampler, submits, report):
+    for _ in range(submits):
+        seen = len(session.exceptions)
+        start = time.perf_counter()
+        try:
+            await session.submit_form(sampler.sample())
+        except Exception as exc:  # keep the other sessions running
+            report["errors"].append(f"session {session_id}: {exc!r}")
+            continue
+        report["timings"].append(("submit", time.perf_counter() - start))
+        report["errors"] += [f"session {session_id}: {message}" for message in session.exceptions[seen:]]
+
+
+async def drive(args, url, server, metrics_port):
+    """Cold start with one session, then all sessions load together and submit together."""
+    report = {"timings": [], "errors": []}
+    rss_idle = _rss_mb(server.pid)
+    first = await open_session(0, url, args.timeout, {"timings": [], "errors": report["errors"]})
+    if first is None:
+        print(f"The first session failed to load: {report['errors'][0]}")
+        return report, 0.0, {}
+    first.close()
+    memory = {"idle": rss_idle, "warm": _rss_mb(server.pid)}
+
+    sessions = await asyncio.gather(*(open_session(i, url, args.timeout, report) for i in range(args.sessions)))
+    memory["loaded"] = _rss_mb(server.pid)
+    before = server_metrics(metrics_port)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        submit_repeatedly(i, session, InputSampler(args.data, seed=args.seed + i), args.submits, report)
+        for i, session in enumerate(sessions) if session is not None
+    ))
+    elapsed = time.perf_counter() - start
+    memory["after"] = _rss_mb(server.pid)
+    print_report(args, report, elapsed, memory)
+    print_stage_summary(before, server_metrics(metrics_port))
+    for session in sessions:
+        if session is not None:
+            session.close()
+    return report, elapsed, memory
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def print_report(args, report, elapsed, memory):
+    timings = report["timings"]
+    print(f"\n{args.sessions} sessions x {args.submits} submits against one server in {elapsed:.1f}s")
+    for kind in ("initial", "submit"):
+        values = [t for k, t in timings if k == kind]
+        if not values:
+            continue
+        print(
+            f"  {kind:<8} n={len(values):<5} mean={statistics.mean(values):.3f}s "
+            f"p50={percentile(values, 50):.3f}s p95={percentile(values, 95):.3f}s "
+            f"p99={percentile(values, 99):.3f}s"
+        )
+    submits = sum(1 for k, _ in timings if k == "submit")
+    print(f"  throughput: {submits / elapsed:.2f} submits/s over {elapsed:.1f}s of concurrent submits")
+    print(
+        f"  server RSS: {memory['idle']:.0f} MB idle, {memory['warm']:.0f} MB after the first session, "
+        f"{memory['loaded']:.0f} MB with {args.sessions} sessions "
+        f"({(memory['loaded'] - memory['warm']) / args.sessions:.1f} MB each), "
+        f"{memory['after']:.0f} MB after the submits"
+    )
+    errors = report["errors"]
+    if errors:
+        print(f"  {len(errors)} errors, first: {errors[0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--submits", type=int, default=5, help="form submissions per session")
+    parser.add_argument("--data", default=str(ROOT / "merged_data.csv"))
+    parser.add_argument("--model", default=str(ROOT / "crop_yield_pipeline.pkl"))
+    parser.add_argument("--stub", action="store_true", help="use StubYieldModel even if the pickle exists")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="agripredict-load-")
+    port, metrics_port = _free_port(), _free_port()
+    env = {
+        **os.environ,
+        "AGRIPREDICT_HISTORY_PATH": os.path.join(workdir, "history.db"),
+        "AGRIPREDICT_METRICS_PORT": str(metrics_port),
+        # the server unpickles StubYieldModel, so it must be able to import stub_model
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(Path(__file__).resolve().parent),
+                                                    os.environ.get("PYTHONPATH")])),
+    }
+    if args.stub or not os.path.exists(args.model):
+        stub_path = os.path.join(workdir, "stub_model.pkl")
+        with open(stub_path, "wb") as file:
+            pickle.dump(StubYieldModel(), file)
+        env["AGRIPREDICT_MODEL_PATH"] = stub_path
+        print(f"Using StubYieldModel ({stub_path})")
+    else:
+        env["AGRIPREDICT_MODEL_PATH"] = args.model
+
+    server = start_server(port, env, args.timeout)
+    try:
+        asyncio.run(drive(args, f"ws://127.0.0.1:{port}/_stcore/stream", server, metrics_port))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
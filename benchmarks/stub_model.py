@@ -0,0 +1,26 @@
+"""
+Deterministic stand-in for the yield pipeline, for load tests without the real pickle.
+"""
+import time
+
+import numpy as np
+
+
+class StubYieldModel:
+    """Cheap, smooth function of the inputs with a configurable per-call cost."""
+
+    def __init__(self, call_seconds=0.01, row_seconds=0.00005):
+        self.call_seconds = call_seconds
+        self.row_seconds = row_seconds
+
+    def predict(self, frame):
+        time.sleep(self.call_seconds + self.row_seconds * len(frame))
+        rainfall = frame["Annual_Rainfall"].to_numpy(dtype=float)
+        fertilizer = frame["Fertilizer"].to_numpy(dtype=float)
+        pesticide = frame["Pesticide"].to_numpy(dtype=float)
+        return (
+            0.8
+            + 0.6 * np.exp(-((rainfall - 1100.0) / 700.0) ** 2)
+            + 0.004 * np.minimum(fertilizer, 150.0)
+            + 0.01 * np.minimum(pesticide, 20.0)
+        )
@@ -0,0 +1,295 @@
+"""
+Background scoring of uploaded farm spreadsheets.
+
+``BulkScorer.submit`` spools the uploaded CSV to ``artifacts/bulk_jobs/<id>/``
+and returns at once; a small thread pool then reads the file in chunks,
+scores each chunk with one batched ``predict`` and appends the result to a
+CSV and a Parquet file on disk. Sessions keep only the job id: progress, a
+bounded preview of the first scored rows and a running per-crop summary are
+read from the ``BulkJob`` while it runs, and the finished files are
+offered for download from disk. Categories are checked against the
+encoder vocabularies before predicting, so rows with missing inputs or
+unknown categories are kept in the output with an ``Error`` without failing
+(or bisecting) the chunk, and every scored row gets the same
+``Training_Support`` score as the single prediction form.
+"""
+import datetime
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from crop_data import weather_data
+from farm_reports import FARM_COLUMNS
+from feature_encoding import UnknownCategoryError, complete_input_frame, normalize_category
+from inference_executor import DeadlineExceeded, Overloaded
+
+DEFAULT_BULK_DIR = os.path.join("artifacts", "bulk_jobs")
+CATEGORY_COLUMNS = ["State", "Crop", "Season"]
+NUMERIC_COLUMNS = ["Area", "Annual_Rainfall", "Fertilizer", "Pesticide", "tavg", "prcp"]
+RESULT_COLUMNS = ["Predicted_Yield", "Production", "Training_Support", "Model_Version", "Error"]
+PREVIEW_ROWS = 200
+
+
+def _output_schema(columns):
+    """Fixed Parquet schema, so every chunk appends to the same file."""
+    fields = []
+    for column in columns:
+        if column in RESULT_COLUMNS:
+            continue  # replaced by the scored value
+        if column in NUMERIC_COLUMNS:
+            fields.append(pa.field(column, pa.float64()))
+        elif column == "Crop_Year":
+            fields.append(pa.field(column, pa.int64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    fields += [pa.field("Predicted_Yield", pa.float64()), pa.field("Production", pa.float64()),
+               pa.field("Training_Support", pa.float64()),
+               pa.field("Model_Version", pa.string()), pa.field("Error", pa.string())]
+    return pa.schema(fields)
+
+
+def category_vocabularies(predictor):
+    """Known labels per categorical column (``FastEncoder`` vocabularies or a shard's crops)."""
+    vocabularies = getattr(predictor, "vocabularies", None)
+    if vocabularies:
+        return vocabularies
+    crops = getattr(predictor, "crops", None)
+    return {"Crop": list(crops)} if crops else None
+
+
+def _unknown_categories(inputs, vocabularies):
+    """Error message per row with a category the encoders never saw, ``None`` elsewhere."""
+    messages = np.full(len(inputs), None, dtype=object)
+    for column, known in (vocabularies or {}).items():
+        if column not in inputs:
+            continue
+        lookup = {normalize_category(label) for label in known}
+        values = inputs[column].to_numpy()
+        unknown = ~inputs[column].map(normalize_category).isin(lookup).to_numpy()
+        for value in pd.unique(values[unknown]):  # one message (and difflib search) per bad value
+            rows = unknown & (values == value) & pd.isna(messages)
+            messages[rows] = str(UnknownCategoryError(column, value, known))
+    return messages
+
+
+def _predict_isolating(predict, inputs, yields, errors, positions):
+    """Batched predict; a bad row the vocabulary check missed is found by bisection."""
+    try:
+        yields[positions] = predict(inputs)
+    except (UnknownCategoryError, KeyError, ValueError) as exc:
+        if len(inputs) == 1:
+            errors[positions[0]] = str(exc)
+            return
+        half = len(inputs) // 2
+        _predict_isolating(predict, inputs.iloc[:half], yields, errors, positions[:half])
+        _predict_isolating(predict, inputs.iloc[half:], yields, errors, positions[half:])
+
+
+def score_chunk(chunk, predict, crop_year, model_version=None, vocabularies=None, support=None):
+    """Uploaded rows (read as text) plus ``RESULT_COLUMNS``."""
+    chunk = chunk.reset_index(drop=True)
+    for column in CATEGORY_COLUMNS:
+        chunk[column] = chunk[column].fillna("").str.strip()
+    for column in NUMERIC_COLUMNS:
+        if column in chunk:
+            chunk[column] = pd.to_numeric(chunk[column], errors="coerce")
+    if "Crop_Year" in chunk:
+        chunk["Crop_Year"] = pd.to_numeric(chunk["Crop_Year"], errors="coerce").fillna(crop_year).astype(np.int64)
+
+    errors = np.full(len(chunk), None, dtype=object)
+    incomplete = (chunk[FARM_COLUMNS].isna() | (chunk[FARM_COLUMNS] == "")).any(axis=1).to_numpy()
+    errors[incomplete] = "Missing or non-numeric input"
+    yields = np.full(len(chunk), np.nan)
+    supports = np.full(len(chunk), np.nan)
+    positions = np.flatnonzero(~incomplete)
+    if len(positions):
+        inputs = complete_input_frame(chunk.iloc[positions], weather_data, crop_year)
+        unknown = _unknown_categories(inputs, vocabularies)
+        rejected = ~pd.isna(unknown)
+        errors[positions[rejected]] = unknown[rejected]
+        positions, inputs = positions[~rejected], inputs[~rejected]
+    if len(positions):
+        _predict_isolating(predict, inputs, yields, errors, positions)
+        if support is not None:
+            supports[positions] = support.score_frame(inputs)["support_score"].to_numpy()
+        supports[np.isnan(yields)] = np.nan  # only rows that got a prediction
+
+    chunk["Predicted_Yield"] = yields
+    chunk["Production"] = yields * chunk["Area"]
+    chunk["Training_Support"] = supports
+    chunk["Model_Version"] = model_version
+    chunk["Error"] = errors
+    return chunk
+
+
+class BulkJob:
+    """One uploaded file being scored; every attribute read by the UI is guarded by ``lock``."""
+
+    def __init__(self, job_id, name, job_dir, total_rows, columns, model_version):
+        self.id = job_id
+        self.name = name
+        self.dir = job_dir
+        self.input_path = os.path.join(job_dir, "input.csv")
+        self.csv_path = os.path.join(job_dir, "scored.csv")
+        self.parquet_path = os.path.join(job_dir, "scored.parquet")
+        self.total_rows = total_rows
+        self.columns = columns
+        self.model_version = model_version
+        self.status = "queued"
+        self.error = None
+        self.processed = 0
+        self.failed = 0
+        self.created_at = time.time()
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self._preview = []
+        self._summary = {}  # crop -> [rows, yield sum]
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _record(self, scored):
+        ok = scored[scored["Error"].isna()]
+        with self.lock:
+            self.processed += len(scored)
+            self.failed += len(scored) - len(ok)
+            shown = sum(len(part) for part in self._preview)
+            if shown < PREVIEW_ROWS:
+                self._preview.append(scored.head(PREVIEW_ROWS - shown))
+            for crop, group in ok.groupby("Crop")["Predicted_Yield"]:
+                totals = self._summary.setdefault(crop, [0, 0.0])
+                totals[0] += len(group)
+                totals[1] += float(group.sum())
+
+    def snapshot(self):
+        """Consistent copy of progress, preview and per-crop summary for rendering."""
+        with self.lock:
+            elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+            return {
+                "status": self.status,
+                "error": self.error,
+                "processed": self.processed,
+                "failed": self.failed,
+                "total": max(self.total_rows, self.processed),
+                "rows_per_second": self.processed / elapsed if elapsed > 0 else 0.0,
+                "preview": pd.concat(self._preview, ignore_index=True) if self._preview else None,
+                "summary": pd.DataFrame(
+                    [{"Crop": crop, "Rows": rows, "Mean_Yield": total / rows}
+                     for crop, (rows, total) in self._summary.items()],
+                    columns=["Crop", "Rows", "Mean_Yield"],
+                ).sort_values("Rows", ascending=False),
+            }
+
+
+class BulkScorer:
+    def __init__(self, out_dir=DEFAULT_BULK_DIR, workers=1, chunk_size=2000, keep=20, retries=5):
+        self.out_dir = out_dir
+        self.chunk_size = chunk_size
+        self.keep = keep
+        self.retries = retries
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk-scoring")
+
+    def submit(self, data, name, predict, model_version=None, crop_year=None, vocabularies=None, support=None):
+        """Spools ``data`` (CSV bytes) and queues it; raises ``KeyError`` for missing columns.
+
+        ``vocabularies`` (see ``category_vocabularies``) rejects unknown categories up front and
+        ``support`` (a ``TrainingSupport``) fills the ``Training_Support`` column.
+        """
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = os.path.join(self.out_dir, job_id)
+        os.makedirs(job_dir)
+        input_path = os.path.join(job_dir, "input.csv")
+        with open(input_path, "wb") as file:
+            file.write(data)
+        try:
+            columns = [c.strip() for c in pd.read_csv(input_path, nrows=0).columns]
+        except (ValueError, UnicodeDecodeError) as exc:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise ValueError(f"{name} is not a readable CSV file: {exc}") from exc
+        missing = [c for c in FARM_COLUMNS if c not in columns]
+        if missing:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise KeyError(f"Missing column(s): {', '.join(missing)}")
+
+        total_rows = max(data.count(b"\n") - 1 + (not data.endswith(b"\n")), 0)  # for the progress bar
+        job = BulkJob(job_id, name, job_dir, total_rows, columns, model_version)
+        with self._lock:
+            self.jobs[job_id] = job
+            self._prune()
+        self._pool.submit(self._run, job, predict, crop_year or datetime.datetime.now().year,
+                          vocabularies, support)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id) if job_id is not None else None
+
+    def _prune(self):
+        """Drops the oldest finished jobs (and their files) beyond ``keep``."""
+        finished = sorted((j for j in self.jobs.values() if not j.active), key=lambda j: j.created_at)
+        for job in finished[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[job.id]
+            shutil.rmtree(job.dir, ignore_errors=True)
+
+    def _predict_with_retry(self, predict, frame):
+        """Backs off while the shared inference executor is saturated by interactive traffic."""
+        for attempt in range(self.retries):
+            try:
+                return predict(frame)
+            except (Overloaded, DeadlineExceeded):
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def _run(self, job, predict, crop_year, vocabularies, support):
+        with job.lock:
+            job.status, job.started = "running", time.time()
+        csv_tmp, parquet_tmp = f"{job.csv_path}.partial", f"{job.parquet_path}.partial"
+        schema = _output_schema(job.columns)
+        try:
+            reader = pd.read_csv(job.input_path, dtype=str, chunksize=self.chunk_size, skipinitialspace=True)
+            with open(csv_tmp, "w", newline="", encoding="utf-8") as csv_file, \
+                    pq.ParquetWriter(parquet_tmp, schema) as parquet_writer:
+                for i, chunk in enumerate(reader):
+                    if job.cancelled.is_set():
+                        break
+                    chunk.columns = [c.strip() for c in chunk.columns]
+                    scored = score_chunk(chunk, lambda frame: self._predict_with_retry(predict, frame),
+                                         crop_year, job.model_version, vocabularies, support)
+                    scored.to_csv(csv_file, header=i == 0, index=False)
+                    parquet_writer.write_table(pa.Table.from_pandas(scored, schema=schema, preserve_index=False))
+                    job._record(scored)
+            if job.cancelled.is_set():
+                status = "cancelled"
+            else:
+                os.replace(csv_tmp, job.csv_path)
+                os.replace(parquet_tmp, job.parquet_path)
+                status = "done"
+            error = None
+        except Exception as exc:  # surfaced in the UI; the worker thread must survive
+            status, error = "failed", f"{type(exc).__name__}: {exc}"
+        for path in (csv_tmp, parquet_tmp, job.input_path):
+            if os.path.exists(path):
+                os.remove(path)
+        with job.lock:
+            job.status, job.error, job.finished = status, error, time.time()
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.cancel()
+        self._pool.shutdown(wait=True)
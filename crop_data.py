@@ -0,0 +1,140 @@
+"""
+Static agronomic reference data shared by the app and the offline jobs.
+"""
+
+# ---------------- Realistic Data Dictionaries -------------------
+# Average yields in quintals/ha based on Indian agricultural data
+avg_yields = {
+    'Rice': 24.0,
+    'Maize': 28.5, 
+    'Moong(Green Gram)': 8.5,
+    'Urad': 6.2,
+    'Groundnut': 15.8
+}
+
+# Current market prices in ₹/quintal (updated 2024)
+crop_prices = {
+    'Rice': 2100,     
+    'Maize': 2300,     
+    'Moong(Green Gram)': 7500,  
+    'Urad': 8200,      
+    'Groundnut': 5800,
+    # Remaining crops in merged_data.csv: 2024-25 MSP where one exists, else typical mandi prices
+    'Arecanut': 45000,
+    'Arhar/Tur': 7550,
+    'Bajra': 2625,
+    'Banana': 1500,
+    'Barley': 1980,
+    'Black pepper': 60000,
+    'Cardamom': 220000,
+    'Cashewnut': 11000,
+    'Castor seed': 6200,
+    'Coconut': 15,            # per nut
+    'Coriander': 7000,
+    'Cotton(lint)': 25500,    # per 170 kg bale
+    'Cowpea(Lobia)': 6500,
+    'Dry chillies': 18000,
+    'Garlic': 12000,
+    'Ginger': 6000,
+    'Gram': 5650,
+    'Guar seed': 5500,
+    'Horse-gram': 5000,
+    'Jowar': 3371,
+    'Jute': 9600,             # per 180 kg bale
+    'Khesari': 5000,
+    'Linseed': 6000,
+    'Masoor': 6700,
+    'Mesta': 9000,            # per 180 kg bale
+    'Moth': 6000,
+    'Niger seed': 8717,
+    'Oilseeds total': 5500,
+    'Onion': 2500,
+    'Other Rabi pulses': 6000,
+    'Other Cereals': 2200,
+    'Other Kharif pulses': 6500,
+    'Other Summer Pulses': 6500,
+    'Peas & beans (Pulses)': 5000,
+    'Potato': 1500,
+    'Ragi': 4290,
+    'Rapeseed &Mustard': 5950,
+    'Safflower': 5940,
+    'Sannhamp': 9000,         # per 180 kg bale
+    'Sesamum': 9267,
+    'Small millets': 3500,
+    'Soyabean': 4892,
+    'Sugarcane': 340,
+    'Sunflower': 7280,
+    'Sweet potato': 2000,
+    'Tapioca': 1200,
+    'Tobacco': 18000,
+    'Turmeric': 12000,
+    'Wheat': 2425,
+    'other oilseeds': 5500
+}
+
+# Crops whose dataset yield is not in quintals/ha (crop_prices is per that unit)
+yield_units = {
+    'Coconut': 'nuts',
+    'Cotton(lint)': 'bales',
+    'Jute': 'bales',
+    'Mesta': 'bales',
+    'Sannhamp': 'bales'
+}
+
+# Yield ranges for categorization (quintals/ha)
+yield_ranges = {
+    'Rice': {
+        'poor': (0, 16), 
+        'below_avg': (16, 22), 
+        'average': (22, 32), 
+        'good': (32, 42), 
+        'excellent': (42, 55)
+    },
+    'Maize': {
+        'poor': (0, 18), 
+        'below_avg': (18, 24), 
+        'average': (24, 32), 
+        'good': (32, 42), 
+        'excellent': (42, 60)
+    },
+    'Moong(Green Gram)': {
+        'poor': (0, 3), 
+        'below_avg': (3, 5), 
+        'average': (5, 8), 
+        'good': (8, 12), 
+        'excellent': (12, 18)
+    },
+    'Urad': {
+        'poor': (0, 2.5), 
+        'below_avg': (2.5, 4), 
+        'average': (4, 7), 
+        'good': (7, 11), 
+        'excellent': (11, 16)
+    },
+    'Groundnut': {
+        'poor': (0, 12), 
+        'below_avg': (12, 16), 
+        'average': (16, 22), 
+        'good': (22, 28), 
+        'excellent': (28, 40)
+    }
+}
+
+
+# State coordinates for India map
+state_coordinates = {
+    "Karnataka": {"lat": 15.3173, "lon": 75.7139, "zoom": 7},
+    "Andhra Pradesh": {"lat": 15.9129, "lon": 79.7400, "zoom": 7},
+    "West Bengal": {"lat": 22.9868, "lon": 87.8550, "zoom": 7},
+    "Chhattisgarh": {"lat": 21.2787, "lon": 81.8661, "zoom": 7},
+    "Bihar": {"lat": 25.0961, "lon": 85.3131, "zoom": 7}
+}
+
+# ---------------- Static Weather Data -------------------
+weather_data = {
+    "Karnataka": {"tavg": 26.3, "prcp": 950, "lat": 15.3, "lon": 75.7},
+    "Andhra Pradesh": {"tavg": 29.1, "prcp": 1050, "lat": 15.9, "lon": 79.7},
+    "West Bengal": {"tavg": 27.4, "prcp": 1200, "lat": 22.9, "lon": 87.8},
+    "Chhattisgarh": {"tavg": 28.2, "prcp": 1300, "lat": 21.2, "lon": 81.8},
+    "Bihar": {"tavg": 26.7, "prcp": 1100, "lat": 25.0, "lon": 85.3}
+}
@@ -0,0 +1,48 @@
+"""
+"Which crop should I grow?" — rank every crop the model knows for one field.
+
+The chosen state, season and inputs are repeated once per crop and scored
+in a single batched ``predict`` call, so ranking ~55 crops costs about the
+same as one prediction. Crops are ordered by expected revenue
+(yield x area x ``crop_prices``).
+"""
+import numpy as np
+import pandas as pd
+
+from feature_encoding import normalize_category
+
+
+def known_crops(predictor, fallback=()):
+    """Crop labels the predictor can score: encoder vocabulary, shard manifest, else ``fallback``."""
+    vocabulary = getattr(predictor, "vocabularies", {}).get("Crop")  # FastEncoder
+    if vocabulary is None:
+        vocabulary = getattr(predictor, "crops", None)  # ShardedModel
+    return sorted({" ".join(str(c).split()) for c in (vocabulary or fallback)})
+
+
+def rank_crops(predict, base_frame, crops, prices, area, units=None, observed=None):
+    """Ranking table for the single-row ``base_frame`` across ``crops``.
+
+    ``observed`` optionally maps normalized crop -> number of historical
+    records for this state/season, so crops never grown there can be flagged.
+    """
+    frame = base_frame.loc[base_frame.index.repeat(len(crops))].reset_index(drop=True)
+    frame["Crop"] = crops
+    yields = np.asarray(predict(frame), dtype=float)
+
+    price_lookup = {normalize_category(c): p for c, p in prices.items()}
+    unit_lookup = {normalize_category(c): u for c, u in (units or {}).items()}
+    keys = [normalize_category(c) for c in crops]
+    ranking = pd.DataFrame({
+        "Crop": crops,
+        "Yield": yields,
+        "Unit": [unit_lookup.get(k, "quintals") for k in keys],
+        "Production": yields * area,
+        "Price": [price_lookup.get(k, np.nan) for k in keys],
+    })
+    ranking["Revenue"] = ranking["Production"] * ranking["Price"]
+    if observed is not None:
+        ranking["Records"] = [int(observed.get(k, 0)) for k in keys]
+    ranking = ranking.sort_values("Revenue", ascending=False, na_position="last").reset_index(drop=True)
+    ranking.insert(0, "Rank", np.arange(1, len(ranking) + 1))
+    return ranking
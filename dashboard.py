@@ -0,0 +1,371 @@
+"""
+Figure builders and recommendation rules for the results dashboard.
+
+Pure functions of a prediction and its inputs, shared by the Streamlit app
+(``render_prediction_results``) and the offline per-farm report generator
+(``farm_reports.py``) so both show the same charts and advice.
+"""
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from crop_data import avg_yields, crop_prices
+from risk_simulation import probability_below
+from state_boundaries import choropleth_figure
+
+PRIORITY_COLORS = {
+    'High': '#FF5722',
+    'Medium': '#FF9800',
+    'Low': '#4CAF50',
+    'Info': '#2196F3'
+}
+
+
+def yield_category(prediction):
+    """``(category, colour)`` for the Yield Category card."""
+    if prediction < 0:
+        return "Poor", "#FF5722"
+    if prediction < 0.5:
+        return "Below Average", "#FF9800"
+    if prediction < 1:
+        return "Average", "#FFC107"
+    if prediction < 1.5:
+        return "Good", "#4CAF50"
+    return "Excellent", "#2E7D32"
+
+
+# ---------------- Figures -------------------
+def geographic_figure(crop, state, prediction, lat, lon, boundaries=None, trend_history=None):
+    """State choropleth from the bundled outlines, else a single point on the tile map."""
+    if boundaries is not None and trend_history is not None:
+        # Historical mean yield per state, this prediction for the selected state
+        crop_history = trend_history[trend_history["Crop"] == crop]
+        recent = crop_history[crop_history["Crop_Year"] >= crop_history["Crop_Year"].max() - 4]
+        state_yields = recent.groupby("State")["Yield"].mean().to_dict()
+        state_yields[state] = prediction
+        return choropleth_figure(
+            boundaries, state_yields, highlight=state, value_label="Yield",
+            hover_suffix={s: " (predicted)" if s == state else " (recent average)" for s in state_yields},
+        )
+
+    fig = px.scatter_mapbox(
+        {'lat': [lat], 'lon': [lon], 'crop': [crop], 'yield': [prediction]},
+        lat="lat",
+        lon="lon",
+        color="crop",
+        size="yield",
+        hover_name="crop",
+        hover_data={"yield": True, "lat": False, "lon": False},
+        zoom=4.2,  # Zoomed out to show all of India
+        center={"lat": 22.5, "lon": 80.9},  # Center of India
+        height=400
+    )
+    fig.update_layout(
+        mapbox_style="carto-positron",
+        margin={"r":0,"t":0,"l":0,"b":0}
+    )
+    return fig
+
+
+def radar_figure(rainfall, tavg, fertilizer, area, pesticide):
+    """Environmental factors radar chart, each factor normalized to 0-100."""
+    factors = ['Rainfall', 'Temperature', 'Fertilizer', 'Area', 'Pesticide']
+    values = [
+        min(100, rainfall / 15),
+        min(100, tavg * 3),
+        min(100, fertilizer * 1.5),
+        min(100, area * 20),
+        min(100, pesticide * 8)
+    ]
+
+    fig_radar = go.Figure()
+    fig_radar.add_trace(go.Scatterpolar(
+        r=values,
+        theta=factors,
+        fill='toself',
+        name='Current Parameters',
+        line_color='#4CAF50',
+        fillcolor='rgba(76, 175, 80, 0.3)'
+    ))
+    fig_radar.update_layout(
+        polar=dict(
+            radialaxis=dict(
+                visible=True,
+                range=[0, 100]
+            )),
+        showlegend=False,
+        title="Environmental Factors Impact",
+        height=400
+    )
+    return fig_radar
+
+
+def risk_figure(risk):
+    """Monte Carlo revenue histogram with P5 / median / P95 markers."""
+    fig_risk = go.Figure()
+    fig_risk.add_trace(go.Histogram(
+        x=risk["revenue"],
+        nbinsx=40,
+        marker_color='#4CAF50',
+        opacity=0.75,
+        name='Simulated revenue'
+    ))
+    for label, value, line_color in [
+        ("P5", risk["percentiles"]["p5"], "#FF5722"),
+        ("Median", risk["percentiles"]["p50"], "#2E7D32"),
+        ("P95", risk["percentiles"]["p95"], "#2196F3"),
+    ]:
+        fig_risk.add_vline(x=value, line_dash="dash", line_color=line_color,
+                           annotation_text=label, annotation_position="top")
+    fig_risk.update_layout(
+        height=400,
+        title="Revenue Distribution (Monte Carlo)",
+        xaxis_title="Revenue (₹)",
+        yaxis_title="Simulations",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=False
+    )
+    return fig_risk
+
+
+def risk_caption(risk, point_revenue):
+    return (
+        f"{risk['n_samples']:,} simulations (seed {risk['seed']}) · "
+        f"5% downside: ₹{risk['percentiles']['p5']:,.0f} · "
+        f"Value at risk (95%): ₹{risk['value_at_risk_95']:,.0f} · "
+        f"P(revenue < 80% of estimate): {probability_below(risk, 0.8 * point_revenue):.0%}"
+    )
+
+
+def trend_figure(trends, state, crop, season):
+    """History plus trend forecast for one State x Crop x Season, or None without enough data."""
+    group_filter = lambda df: df[(df["State"] == state) & (df["Crop"] == crop) & (df["Season"] == season)]
+    group_history = group_filter(trends["history"])
+    group_forecast = group_filter(trends["forecast"])
+    if group_history.empty or group_forecast.empty:
+        return None
+
+    fig_trend = go.Figure()
+    fig_trend.add_trace(go.Scatter(
+        x=group_forecast["Crop_Year"].tolist() + group_forecast["Crop_Year"].tolist()[::-1],
+        y=group_forecast["Upper"].tolist() + group_forecast["Lower"].tolist()[::-1],
+        fill='toself', fillcolor='rgba(76, 175, 80, 0.2)', line=dict(width=0),
+        name='90% interval', hoverinfo='skip'
+    ))
+    fig_trend.add_trace(go.Scatter(
+        x=group_history["Crop_Year"], y=group_history["Yield"],
+        mode='lines+markers', name='Historical yield', line_color='#1e3c72'
+    ))
+    fig_trend.add_trace(go.Scatter(
+        x=group_forecast["Crop_Year"], y=group_forecast["Forecast"],
+        mode='lines+markers', name='Trend forecast', line=dict(color='#4CAF50', dash='dash')
+    ))
+    fig_trend.update_layout(
+        height=400,
+        xaxis_title="Crop Year",
+        yaxis_title="Yield",
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)'
+    )
+    return fig_trend
+
+
+PD_LABELS = {
+    "Area": "Area (ha)",
+    "Annual_Rainfall": "Annual Rainfall (mm)",
+    "Fertilizer": "Fertilizer",
+    "Pesticide": "Pesticide",
+}
+PD_LOG_AXES = ("Area", "Fertilizer", "Pesticide")  # heavily skewed in the training data
+
+
+def partial_dependence_figure(curves, current=None):
+    """2x2 grid of precomputed one-way partial-dependence curves (``pdp_atlas``).
+
+    ``current`` optionally maps feature -> this field's value, marked on each panel.
+    """
+    features = list(curves)
+    fig_pd = make_subplots(rows=2, cols=2, subplot_titles=[PD_LABELS.get(f, f) for f in features])
+    for i, feature in enumerate(features):
+        row, col = i // 2 + 1, i % 2 + 1
+        curve = curves[feature]
+        fig_pd.add_trace(go.Scatter(
+            x=curve["Value"].tolist() + curve["Value"].tolist()[::-1],
+            y=curve["P90"].tolist() + curve["P10"].tolist()[::-1],
+            fill='toself', fillcolor='rgba(76, 175, 80, 0.2)', line=dict(width=0),
+            name='10–90% of fields', hoverinfo='skip', showlegend=i == 0
+        ), row=row, col=col)
+        fig_pd.add_trace(go.Scatter(
+            x=curve["Value"], y=curve["Mean"], mode='lines', line_color='#2E7D32',
+            name='Average yield', showlegend=i == 0
+        ), row=row, col=col)
+        if current is not None and current.get(feature) is not None:
+            fig_pd.add_vline(x=current[feature], line_dash="dash", line_color="#FF5722", row=row, col=col)
+        if feature in PD_LOG_AXES and (curve["Value"] > 0).all():
+            fig_pd.update_xaxes(type="log", row=row, col=col)
+    fig_pd.update_yaxes(title_text="Yield")
+    fig_pd.update_layout(
+        height=550,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        legend=dict(orientation="h", y=-0.1)
+    )
+    return fig_pd
+
+
+def surface_figure(x, y, z, first, second, current=None):
+    """Heatmap of a two-way partial-dependence surface; ``current`` is an optional (x, y) marker."""
+    fig_surface = go.Figure(go.Heatmap(
+        x=x, y=y, z=z.T, colorscale='Greens', colorbar=dict(title="Yield"),
+        hovertemplate=f"{PD_LABELS.get(first, first)}: %{{x:.3g}}<br>"
+                      f"{PD_LABELS.get(second, second)}: %{{y:.3g}}<br>Yield: %{{z:.2f}}<extra></extra>"
+    ))
+    if current is not None:
+        fig_surface.add_trace(go.Scatter(
+            x=[current[0]], y=[current[1]], mode='markers', name='Your field',
+            marker=dict(color='#FF5722', size=12, symbol='x')
+        ))
+    fig_surface.update_layout(
+        height=450,
+        xaxis_title=PD_LABELS.get(first, first),
+        yaxis_title=PD_LABELS.get(second, second),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        showlegend=False
+    )
+    return fig_surface
+
+
+# ---------------- Recommendations -------------------
+def recommendations(crop, season, rainfall, fertilizer, pesticide, prediction):
+    """Agronomic advice as ``{'icon', 'title', 'desc', 'priority'}`` dicts."""
+    recs = []
+
+    # Weather-based recommendations
+    if rainfall < 600:
+        recs.append({
+            'icon': '💧',
+            'title': 'Critical Water Management',
+            'desc': f'With only {rainfall}mm rainfall, install drip irrigation system and consider drought-resistant varieties. Expected water deficit: {800-rainfall}mm',
+            'priority': 'High'
+        })
+    elif rainfall > 1500:
+        recs.append({
+            'icon': '🌊',
+            'title': 'Excess Water Management',
+            'desc': f'High rainfall ({rainfall}mm) may cause waterlogging. Ensure proper drainage and consider fungicide application',
+            'priority': 'Medium'
+        })
+
+    # Fertilizer optimization, for crops with a reference yield
+    reference_yield = avg_yields.get(crop)
+    if reference_yield is not None:
+        optimal_fertilizer = reference_yield * 3  # Rule of thumb: 3kg fertilizer per quintal expected yield
+        if fertilizer < optimal_fertilizer * 0.7:
+            recs.append({
+                'icon': '🧪',
+                'title': 'Increase Fertilizer Application',
+                'desc': f'Current: {fertilizer}kg/ha, Recommended: {optimal_fertilizer:.0f}kg/ha. Increase by {optimal_fertilizer-fertilizer:.0f}kg/ha for optimal yield',
+                'priority': 'High'
+            })
+        elif fertilizer > optimal_fertilizer * 1.3:
+            recs.append({
+                'icon': '⚖️',
+                'title': 'Reduce Fertilizer Usage',
+                'desc': f'Over-fertilization detected ({fertilizer}kg/ha). Reduce to {optimal_fertilizer:.0f}kg/ha to improve cost effectiveness',
+                'priority': 'Medium'
+            })
+
+    # Pesticide recommendations
+    if pesticide > 20:
+        recs.append({
+            'icon': '🌱',
+            'title': 'Reduce Chemical Pesticide',
+            'desc': f'High pesticide usage ({pesticide}kg/ha). Implement IPM practices to reduce to 10-15kg/ha and improve sustainability',
+            'priority': 'Medium'
+        })
+    elif pesticide < 5:
+        recs.append({
+            'icon': '🛡️',
+            'title': 'Pest Management Alert',
+            'desc': f'Low pesticide usage ({pesticide}kg/ha) may increase pest risk. Monitor crop health closely and be ready for targeted application',
+            'priority': 'Medium'
+        })
+
+    # Season-specific recommendations
+    if season == 'Summer':
+        recs.append({
+            'icon': '☀️',
+            'title': 'Summer Season Management',
+            'desc': 'Use mulching to conserve soil moisture, provide shade nets if possible, and monitor for heat stress symptoms',
+            'priority': 'High'
+        })
+    elif season == 'Kharif':
+        recs.append({
+            'icon': '🌧️',
+            'title': 'Monsoon Preparedness',
+            'desc': 'Ensure proper drainage, apply pre-emergence herbicides, and monitor for fungal diseases during monsoon',
+            'priority': 'Medium'
+        })
+
+    # Crop-specific recommendations
+    if crop == 'Rice' and rainfall < 1000:
+        recs.append({
+            'icon': '🌾',
+            'title': 'Rice Water Management',
+            'desc': 'Rice requires 1000-1200mm water. Consider System of Rice Intensification (SRI) method to reduce water usage by 30-40%',
+            'priority': 'High'
+        })
+    elif crop == 'Groundnut' and fertilizer > 60:
+        recs.append({
+            'icon': '🥜',
+            'title': 'Groundnut Nutrition',
+            'desc': 'Groundnut fixes nitrogen naturally. Reduce nitrogen fertilizer and focus on phosphorus and potassium for better pod development',
+            'priority': 'Medium'
+        })
+
+    # Default recommendations if none generated
+    if not recs:
+        recs = [
+            {
+                'icon': '✅',
+                'title': 'Well-Balanced Approach',
+                'desc': f'Your farming parameters are well-optimized for {crop} cultivation. Expected yield of {prediction:.1f} q/ha is within good range',
+                'priority': 'Info'
+            },
+            {
+                'icon': '📊',
+                'title': 'Market Intelligence',
+                'desc': f'Current market price: ₹{crop_prices[crop]}/quintal. Monitor price trends and consider contract farming for price stability',
+                'priority': 'Medium'
+            },
+            {
+                'icon': '🌿',
+                'title': 'Sustainable Practices',
+                'desc': 'Implement crop rotation, use organic matter, and maintain soil health for long-term productivity and environmental benefits',
+                'priority': 'Low'
+            },
+            {
+                'icon': '📱',
+                'title': 'Technology Adoption',
+                'desc': 'Consider using weather-based agro-advisories, soil health cards, and precision farming techniques for better results',
+                'priority': 'Low'
+            }
+        ]
+    return recs
+
+
+def recommendation_html(rec, index=0):
+    """Recommendation card markup with priority colour coding."""
+    color = PRIORITY_COLORS.get(rec['priority'], '#4CAF50')
+    return f"""
+        <div class="recommendation-card" style="border-left-color: {color}; animation-delay: {index * 0.2}s;">
+            <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
+                <span style="font-size: 1.5rem; margin-right: 1rem;">{rec['icon']}</span>
+                <h4 style="margin: 0; color: #2E7D32;">{rec['title']}</h4>
+                <span style="margin-left: auto; padding: 0.2rem 0.8rem; background: {color}; color: white; border-radius: 15px; font-size: 0.8rem; font-weight: 600;">{rec['priority']}</span>
+            </div>
+            <p style="margin: 0; color: #555; line-height: 1.5;">{rec['desc']}</p>
+        </div>
+        """
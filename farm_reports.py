@@ -0,0 +1,296 @@
+"""
+Offline per-farm HTML reports: prediction, charts and recommendations.
+
+Takes a farm CSV (State, Crop, Season, Area, Annual_Rainfall, Fertilizer,
+Pesticide; optional Farm_ID and Crop_Year) and writes ``<Farm_ID>.html`` per
+farm (repeated IDs get a ``_2``, ``_3``... suffix rather than overwriting
+each other) with the same figure builders and recommendation rules as the app
+(``dashboard.py``). Farms are scored in chunks across a process pool; each
+worker loads the model, trend forecasts and page template once in its
+initializer and predicts a whole chunk in one batched call. Reports are
+written atomically, so an interrupted run resumes where it stopped (existing
+reports are skipped unless ``--force``).
+
+    python farm_reports.py farms.csv --out reports --workers 4
+"""
+import argparse
+import datetime
+import html
+import os
+import string
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from crop_data import crop_prices, weather_data
+from dashboard import (geographic_figure, radar_figure, recommendation_html, recommendations, risk_caption,
+                       risk_figure, trend_figure, yield_category)
+from feature_encoding import complete_input_frame
+from model_registry import DEFAULT_MODEL_PATH, ModelRegistry
+from risk_simulation import simulate_revenue, state_rainfall_history
+from state_boundaries import BoundaryLayer
+from training_support import TrainingSupport, flagged_features
+from trend_forecast import forecast_all
+
+DEFAULT_REPORT_DIR = "reports"
+FARM_COLUMNS = ["State", "Crop", "Season", "Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+FIGURE_CONFIG = {"displaylogo": False, "responsive": True}
+INLINE_PLOTLYJS_MAX = 10  # embedded plotly.js is ~4 MB per report; larger runs share one copy
+
+PAGE_TEMPLATE = string.Template("""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>AgriPredict report: $farm_id</title>
+$plotlyjs
+<style>
+body { font-family: 'Poppins', 'Segoe UI', sans-serif; max-width: 1200px; margin: 0 auto; padding: 2rem; color: #333; }
+.prediction-card { background: linear-gradient(135deg, #2E7D32 0%, #4CAF50 50%, #66BB6A 100%); padding: 2rem;
+  border-radius: 20px; color: white; text-align: center; margin: 1rem 0; }
+.metrics { display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; }
+.metric-card { background: #f8f9fa; padding: 1.5rem; border-radius: 15px; border-left: 6px solid #4CAF50; }
+.support { padding: 1rem; border-radius: 10px; margin: 1rem 0; }
+.charts { display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; }
+.recommendation-card { background: linear-gradient(135deg, #FFF3E0 0%, #FFE0B2 100%); padding: 1.5rem;
+  border-radius: 15px; margin: 1rem 0; border-left: 5px solid #FF9800; }
+footer { color: #888; font-size: 0.85rem; margin-top: 2rem; }
+</style>
+</head>
+<body>
+<h1>🌾 AgriPredict AI — Farm $farm_id</h1>
+<div class="prediction-card">
+  <h2>Predicted Crop Yield</h2>
+  <h1 style="font-size: 3.5rem; margin: 1rem 0;">$prediction</h1>
+  <h3>quintals per hectare</h3>
+  <p>for $crop cultivation in $state during $season season</p>
+</div>
+<div class="support" style="background: $support_background;">$support_text</div>
+<div class="metrics">
+  <div class="metric-card"><h4>📦 Total Production</h4><h2>$production</h2><p>quintals</p></div>
+  <div class="metric-card" style="border-left-color: $category_color;"><h4>📊 Yield Category</h4><h2>$category</h2><p>$prediction q/ha</p></div>
+  <div class="metric-card"><h4>💰 Revenue Estimate</h4><h2>$revenue</h2><p>@ ₹$price/quintal</p></div>
+</div>
+<h2>📊 Analytics</h2>
+<div class="charts">
+  <div><h3>🗺️ Geographic Intelligence</h3>$map_figure</div>
+  <div><h3>🔬 Environmental Factor Impact</h3>$radar_figure</div>
+  <div><h3>⚠️ Risk Assessment Analysis</h3>$risk_figure<p>$risk_caption</p></div>
+</div>
+<h3>📈 Historical Yield Trend &amp; Forecast</h3>
+$trend_figure
+<h2>🤖 Recommendations</h2>
+$recommendations
+<footer>Model version $model_version · generated $generated_at</footer>
+</body>
+</html>
+""")
+
+# Per-process state, filled in once by ``_init_worker``
+_worker = {}
+
+
+def _init_worker(model_path, plotlyjs):
+    model = ModelRegistry(model_path).load(model_path)
+    try:
+        boundaries = BoundaryLayer.load()
+    except FileNotFoundError:
+        boundaries = None
+    _worker.update(
+        model=model,
+        trends=forecast_all(through_year=datetime.datetime.now().year),
+        boundaries=boundaries,
+        rainfall=state_rainfall_history(),
+        support=TrainingSupport.load_or_build(),
+        plotlyjs=plotlyjs,
+    )
+
+
+def _figure_html(fig):
+    return fig.to_html(full_html=False, include_plotlyjs=False, config=FIGURE_CONFIG)
+
+
+def render_report(farm_id, inputs, row, prediction, model_version):
+    """Complete HTML page for one farm; ``inputs`` is its single-row model frame."""
+    state, crop, season = row["State"], row["Crop"], row["Season"]
+    area, rainfall = float(row["Area"]), float(row["Annual_Rainfall"])
+    fertilizer, pesticide = float(row["Fertilizer"]), float(row["Pesticide"])
+    weather = weather_data.get(state, {})
+    tavg = float(inputs["tavg"].iloc[0])
+
+    price = crop_prices[crop]
+    production = prediction * area
+    risk = simulate_revenue(_worker["model"].predict, inputs, area, price, _worker["rainfall"].get(state))
+    support_inputs = dict(Area=area, Annual_Rainfall=rainfall, Fertilizer=fertilizer, Pesticide=pesticide)
+    support_score, feature_support = _worker["support"].score_row(crop, **support_inputs)
+    outside = _worker["support"].out_of_range(crop, **support_inputs)
+    sparse = [f for f in flagged_features(feature_support) if f not in outside]
+    if outside or sparse:
+        notes = []
+        if outside:
+            notes.append(f"{html.escape(', '.join(outside))} outside the range the model was trained on "
+                         f"for {html.escape(crop)}")
+        if sparse:
+            notes.append(f"few similar training rows for {html.escape(', '.join(sparse))}")
+        support_text = f"🧭 <b>Training support: {support_score:.0%}</b> — {'; '.join(notes)}."
+    else:
+        support_text = f"🧭 <b>Training support: {support_score:.0%}</b> — all inputs lie within the training data."
+    category, category_color = yield_category(prediction)
+
+    trend = trend_figure(_worker["trends"], state, crop, season)
+    map_figure = geographic_figure(crop, state, prediction, weather.get("lat"), weather.get("lon"),
+                                   _worker["boundaries"], _worker["trends"]["history"])
+    return PAGE_TEMPLATE.substitute(
+        farm_id=html.escape(str(farm_id)),
+        plotlyjs=_worker["plotlyjs"],
+        prediction=f"{prediction:.2f}",
+        crop=html.escape(crop), state=html.escape(state), season=html.escape(season),
+        support_background="#FFF3E0" if outside or sparse else "#E3F2FD",
+        support_text=support_text,
+        production=f"{production:.1f}",
+        category=category, category_color=category_color,
+        revenue=f"₹{production * price:,.0f}", price=price,
+        map_figure=_figure_html(map_figure),
+        radar_figure=_figure_html(radar_figure(rainfall, tavg, fertilizer, area, pesticide)),
+        risk_figure=_figure_html(risk_figure(risk)),
+        risk_caption=html.escape(risk_caption(risk, production * price)),
+        trend_figure=_figure_html(trend) if trend is not None else
+        f"<p>Not enough historical data to forecast {html.escape(crop)} in {html.escape(state)} during {html.escape(season)}.</p>",
+        recommendations="".join(
+            recommendation_html(rec, i)
+            for i, rec in enumerate(recommendations(crop, season, rainfall, fertilizer, pesticide, prediction))
+        ),
+        model_version=model_version,
+        generated_at=datetime.datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def render_chunk(farms, out_dir):
+    """Worker: one batched predict for the chunk, then one report per farm."""
+    model = _worker["model"]
+    inputs = complete_input_frame(farms[FARM_COLUMNS + (["Crop_Year"] if "Crop_Year" in farms else [])],
+                                  weather_data, datetime.datetime.now().year)
+    try:
+        predictions = model.predict(inputs)
+    except Exception:
+        predictions = None  # e.g. an unknown crop: fall back to per-farm calls to isolate it
+    written, failures = 0, []
+    for i, (_, row) in enumerate(farms.iterrows()):
+        try:
+            farm_inputs = inputs.iloc[[i]].reset_index(drop=True)
+            prediction = predictions[i] if predictions is not None else model.predict(farm_inputs)[0]
+            page = render_report(row["Farm_ID"], farm_inputs, row, float(prediction), model.version)
+            _write_atomic(os.path.join(out_dir, f"{row['Farm_ID']}.html"), page)
+            written += 1
+        except Exception as exc:  # one bad farm must not lose the rest of the chunk
+            failures.append((row["Farm_ID"], f"{type(exc).__name__}: {exc}"))
+    return written, failures
+
+
+def load_farms(path):
+    farms = pd.read_csv(path)
+    missing = [c for c in FARM_COLUMNS if c not in farms]
+    if missing:
+        raise KeyError(f"Missing farm column(s): {', '.join(missing)}")
+    for column in ("State", "Crop", "Season"):
+        farms[column] = farms[column].astype(str).str.strip()
+    if "Farm_ID" not in farms:
+        farms["Farm_ID"] = [f"farm_{i:06d}" for i in range(len(farms))]
+    farms["Farm_ID"] = _unique_ids(farms["Farm_ID"].astype(str).str.replace(r"[^\w.-]", "_", regex=True))
+    return farms
+
+
+def _unique_ids(farm_ids):
+    """Suffixes repeats (``id_2``, ``id_3``...) so no two farms share a report file.
+
+    Compared case-insensitively, as report names may land on a case-insensitive filesystem.
+    """
+    taken, unique = set(), []
+    for farm_id in farm_ids:
+        candidate, n = farm_id, 1
+        while candidate.casefold() in taken:
+            n += 1
+            candidate = f"{farm_id}_{n}"
+        taken.add(candidate.casefold())
+        unique.append(candidate)
+    return unique
+
+
+def generate(farm_path, out_dir=DEFAULT_REPORT_DIR, model_path=DEFAULT_MODEL_PATH, workers=None,
+             chunk_size=50, force=False, inline_plotlyjs=None):
+    """Renders every pending report; returns ``(written, skipped, failures, seconds)``.
+
+    ``inline_plotlyjs=None`` embeds plotly.js only when at most ``INLINE_PLOTLYJS_MAX``
+    reports are pending and otherwise writes one shared ``plotly.min.js`` next to them.
+    """
+    import plotly.offline
+
+    farms = load_farms(farm_path)
+    os.makedirs(out_dir, exist_ok=True)
+    done = farms["Farm_ID"].map(lambda f: os.path.exists(os.path.join(out_dir, f"{f}.html")))
+    pending = farms if force else farms[~done]
+
+    if inline_plotlyjs is None:
+        inline_plotlyjs = len(pending) <= INLINE_PLOTLYJS_MAX
+    if inline_plotlyjs:
+        plotlyjs = f"<script>{plotly.offline.get_plotlyjs()}</script>"
+    else:
+        # One local copy next to the reports: smaller files, but they only work alongside it
+        js_path = os.path.join(out_dir, "plotly.min.js")
+        if not os.path.exists(js_path):
+            _write_atomic(js_path, plotly.offline.get_plotlyjs())
+        plotlyjs = '<script src="plotly.min.js"></script>'
+
+    written, failures = 0, []
+    start = time.perf_counter()
+    chunks = [pending.iloc[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, plotlyjs)) as pool:
+        futures = [pool.submit(render_chunk, chunk, out_dir) for chunk in chunks]
+        for future in as_completed(futures):
+            chunk_written, chunk_failures = future.result()
+            written += chunk_written
+            failures.extend(chunk_failures)
+            elapsed = time.perf_counter() - start
+            print(f"\r  {written + len(failures)}/{len(pending)} farms, "
+                  f"{written / elapsed:.1f} reports/s", end="", flush=True)
+    print()
+    if failures:
+        pd.DataFrame(failures, columns=["Farm_ID", "Error"]).to_csv(
+            os.path.join(out_dir, "failures.csv"), index=False
+        )
+    return written, len(farms) - len(pending), failures, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render one HTML report per farm")
+    parser.add_argument("farms", help="farm CSV")
+    parser.add_argument("--out", default=DEFAULT_REPORT_DIR)
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=50)
+    parser.add_argument("--force", action="store_true", help="re-render reports that already exist")
+    parser.add_argument("--plotlyjs", choices=["auto", "inline", "shared"], default="auto",
+                        help="embed plotly.js in each report (self-contained, ~4 MB each) or reference one "
+                             f"plotly.min.js next to them; auto embeds for up to {INLINE_PLOTLYJS_MAX} reports")
+    args = parser.parse_args()
+
+    written, skipped, failures, seconds = generate(
+        args.farms, args.out, args.model, args.workers, args.chunk_size, args.force,
+        {"auto": None, "inline": True, "shared": False}[args.plotlyjs]
+    )
+    print(f"Wrote {written} reports in {seconds:.1f}s ({written / max(seconds, 1e-9):.1f} reports/s), "
+          f"skipped {skipped} existing, {len(failures)} failed")
+    if failures:
+        print(f"  first failure: {failures[0][0]}: {failures[0][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Precomputed categorical encoding and input validation for the yield pipeline.
+
+The pickled pipeline re-validates and re-encodes State/Season/Crop strings on
+every ``predict`` call and fails deep inside sklearn on categories it never
+saw. ``FastEncoder`` reads the fitted encoders once, builds plain dictionaries
+from them and turns input rows straight into the numeric matrix the final
+estimator expects, so unknown values are rejected up front with a
+readable message.
+"""
+import difflib
+
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_FEATURES = ["State", "Season", "Crop"]
+NUMERIC_FEATURES = [
+    "Area", "Annual_Rainfall", "Fertilizer", "Pesticide",
+    "Crop_Year", "tavg", "prcp", "Production",
+]
+FEATURE_COLUMNS = CATEGORICAL_FEATURES + NUMERIC_FEATURES
+
+
+class UnknownCategoryError(ValueError):
+    """Raised when an input category was never seen by the fitted encoders."""
+
+    def __init__(self, column, value, known):
+        self.column = column
+        self.value = value
+        self.suggestions = difflib.get_close_matches(str(value), known, n=3, cutoff=0.6)
+        message = f"Unknown {column} '{value}': the model was not trained on it."
+        if self.suggestions:
+            message += " Did you mean: " + ", ".join(self.suggestions) + "?"
+        super().__init__(message)
+
+
+def normalize_category(value):
+    """Canonical lookup key: trims the padding in the training data ('Kharif     ')."""
+    return " ".join(str(value).split()).casefold()
+
+
+def build_input_frame(state, season, crop, area, rainfall, fertilizer, pesticide,
+                      crop_year, tavg, prcp):
+    """Single-row model input in the column layout used for training."""
+    return pd.DataFrame([{
+        "State": state,
+        "Season": season,
+        "Crop": crop,
+        "Area": area,
+        "Annual_Rainfall": rainfall,
+        "Fertilizer": fertilizer,
+        "Pesticide": pesticide,
+        "Crop_Year": crop_year,
+        "tavg": tavg,
+        "prcp": prcp,
+        "Production": 0  # Dummy value
+    }])
+
+
+def complete_input_frame(frame, weather_data, crop_year):
+    """Batch counterpart of ``build_input_frame`` for user-supplied rows.
+
+    ``frame`` needs State/Season/Crop/Area/Annual_Rainfall/Fertilizer/Pesticide;
+    Crop_Year, tavg and prcp are filled in when absent (weather by state, NaN
+    for states without station data) and Production gets the dummy 0.
+    """
+    frame = frame.copy()
+    if "Crop_Year" not in frame:
+        frame["Crop_Year"] = crop_year
+    for column in ("tavg", "prcp"):
+        if column not in frame:
+            lookup = {state: values[column] for state, values in weather_data.items()}
+            frame[column] = frame["State"].map(lookup).astype(float)
+    frame["Production"] = 0
+    missing = [c for c in FEATURE_COLUMNS if c not in frame]
+    if missing:
+        raise KeyError(f"Missing input column(s): {', '.join(missing)}")
+    return frame[FEATURE_COLUMNS].reset_index(drop=True)
+
+
+# ---------------- Fitted-encoder introspection -------------------
+def _resolve_columns(column_transformer, columns):
+    names = list(getattr(column_transformer, "feature_names_in_", []))
+    if isinstance(columns, slice) or np.ndim(columns) == 0:
+        columns = np.arange(len(names))[columns] if names else [columns]
+    resolved = []
+    for column in columns:
+        if isinstance(column, (int, np.integer)) and not isinstance(column, bool):
+            resolved.append(names[column])
+        else:
+            resolved.append(str(column))
+    return resolved
+
+
+def _is_identity(transformer):
+    """``'passthrough'`` as given, or as the fitted ``FunctionTransformer`` sklearn stores it as."""
+    if isinstance(transformer, str):
+        return transformer == "passthrough"
+    return (type(transformer).__name__ == "FunctionTransformer"
+            and transformer.func is None and getattr(transformer, "validate", False) is False)
+
+
+def _is_nan(value):
+    try:
+        return bool(np.isnan(value))
+    except TypeError:
+        return False
+
+
+def _leading_fill(transformer):
+    """``(fill values, rest)`` when ``transformer`` starts with a NaN ``SimpleImputer``.
+
+    ``rest`` is what follows the imputer (``'passthrough'`` for a bare one).
+    Imputers that add indicator columns, replace a marker other than NaN or
+    drop all-empty columns are not plain fills; those return ``(None, transformer)``.
+    """
+    steps = getattr(transformer, "steps", None)
+    if steps is None:
+        imputer, rest = transformer, "passthrough"
+    elif len(steps) == 1:
+        imputer, rest = steps[0][1], "passthrough"
+    elif len(steps) == 2:
+        imputer, rest = steps[0][1], steps[1][1]
+    else:
+        return None, transformer
+    if type(imputer).__name__ != "SimpleImputer" or imputer.add_indicator \
+            or not _is_nan(imputer.missing_values):
+        return None, transformer
+    try:
+        fill = np.asarray(imputer.statistics_, dtype=float)
+    except (TypeError, ValueError):
+        return None, transformer
+    if not np.isfinite(fill).all():
+        return None, transformer
+    return fill, rest
+
+
+def _unwrap_encoder(transformer):
+    """Returns the encoder at the end of a (SimpleImputer, encoder) sub-pipeline."""
+    steps = getattr(transformer, "steps", None)
+    if steps is None:
+        return transformer
+    for _, step in steps[:-1]:
+        if type(step).__name__ != "SimpleImputer":
+            return None
+    return steps[-1][1]
+
+
+class _Block:
+    """One horizontal slice of the preprocessed matrix."""
+
+    def __init__(self, kind, columns, width, transformer=None):
+        self.kind = kind
+        self.columns = columns
+        self.width = width
+        self.transformer = transformer
+        self.lookups = []
+        self.offsets = []
+        self.unknown_code = None
+        self.unknown_value = None
+        self.mean = None
+        self.scale = None
+        self.fill = None  # SimpleImputer statistics applied to NaNs before scaling
+
+
+class FastEncoder:
+    """Dictionary-based replacement for the pipeline's preprocessing steps.
+
+    Supports OneHotEncoder, OrdinalEncoder, StandardScaler and passthrough
+    blocks natively, including numeric blocks behind a SimpleImputer; any other fitted transformer is still applied, just
+    without the per-call category re-validation. Every categorical value is
+    checked against the fitted vocabulary, including encoders fitted with
+    ``handle_unknown='ignore'`` that would otherwise encode an unknown crop as
+    all zeros and still return a prediction.
+    """
+
+    def __init__(self, blocks, estimator, post_steps=()):
+        self.blocks = blocks
+        self.estimator = estimator
+        self.post_steps = list(post_steps)
+        self.vocabularies = {}
+        for block in blocks:
+            if block.kind in ("onehot", "ordinal"):
+                for column, lookup in zip(block.columns, block.lookups):
+                    self.vocabularies[column] = sorted(lookup["labels"].values())
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Builds the encoder from a fitted ``Pipeline(ColumnTransformer, ..., estimator)``."""
+        steps = getattr(pipeline, "steps", None)
+        if not steps or len(steps) < 2:
+            raise TypeError("Expected a fitted sklearn Pipeline with a preprocessing step")
+        column_transformer = steps[0][1]
+        if not hasattr(column_transformer, "transformers_"):
+            raise TypeError("First pipeline step is not a fitted ColumnTransformer")
+
+        blocks = []
+        for _, transformer, columns in column_transformer.transformers_:
+            if transformer == "drop":
+                continue
+            columns = _resolve_columns(column_transformer, columns)
+            if not columns:
+                continue
+            blocks.append(cls._build_block(transformer, columns))
+        post_steps = [step for _, step in steps[1:-1]]
+        return cls(blocks, steps[-1][1], post_steps)
+
+    @staticmethod
+    def _build_block(transformer, columns):
+        if _is_identity(transformer):  # fitted ColumnTransformers store passthrough as FunctionTransformer
+            return _Block("passthrough", columns, len(columns))
+
+        fill, rest = _leading_fill(transformer)
+        if fill is not None:
+            block = FastEncoder._build_block(rest, columns)
+            if block.kind in ("passthrough", "scale"):
+                block.fill = fill
+                return block
+
+        encoder = _unwrap_encoder(transformer)
+        kind = type(encoder).__name__ if encoder is not None else None
+
+        if kind == "OneHotEncoder" and getattr(encoder, "drop_idx_", None) is None:
+            block = _Block("onehot", columns, 0)
+            for categories in encoder.categories_:
+                block.offsets.append(block.width)
+                block.lookups.append(_category_lookup(categories))
+                block.width += len(categories)
+            if getattr(encoder, "handle_unknown", "error") != "error":
+                block.unknown_code = -1
+            return block
+
+        if kind == "OrdinalEncoder":
+            block = _Block("ordinal", columns, len(columns))
+            block.lookups = [_category_lookup(c) for c in encoder.categories_]
+            if getattr(encoder, "handle_unknown", "error") == "use_encoded_value":
+                block.unknown_code = -1
+                block.unknown_value = encoder.unknown_value
+            return block
+
+        if kind == "StandardScaler" and encoder is transformer:
+            block = _Block("scale", columns, len(columns))
+            block.mean = encoder.mean_ if encoder.with_mean else None
+            block.scale = encoder.scale_ if encoder.with_std else None
+            return block
+
+        # Anything else keeps its own transform; width is learned on first use.
+        return _Block("generic", columns, None, transformer)
+
+    # ---------------- Encoding -------------------
+    def category_codes(self, frame):
+        """Maps every categorical input column to integer codes, validating up front."""
+        codes = {}
+        for block in self.blocks:
+            if block.kind not in ("onehot", "ordinal"):
+                continue
+            for column, lookup in zip(block.columns, block.lookups):
+                if column not in frame:
+                    raise KeyError(f"Missing input column '{column}'")
+                codes[column] = _encode_column(column, frame[column], lookup)
+        return codes
+
+    def transform(self, frame):
+        """Pre-encoded float matrix for ``frame`` (a DataFrame or list of dicts)."""
+        if not isinstance(frame, pd.DataFrame):
+            frame = pd.DataFrame(list(frame))
+        codes = self.category_codes(frame)
+        n_rows = len(frame)
+
+        parts = []
+        for block in self.blocks:
+            if block.kind == "onehot":
+                part = np.zeros((n_rows, block.width))
+                rows = np.arange(n_rows)
+                for column, offset in zip(block.columns, block.offsets):
+                    part[rows, offset + codes[column]] = 1.0
+            elif block.kind == "ordinal":
+                part = np.column_stack([codes[c] for c in block.columns]).astype(float)
+            elif block.kind == "generic":
+                part = block.transformer.transform(frame[block.columns])
+                if hasattr(part, "toarray"):
+                    part = part.toarray()
+                part = np.asarray(part, dtype=float).reshape(n_rows, -1)
+                block.width = part.shape[1]
+            else:
+                part = _numeric_matrix(frame, block.columns)
+                if block.fill is not None:
+                    part = np.where(np.isnan(part), block.fill, part)
+                if block.kind == "scale":
+                    if block.mean is not None:
+                        part = part - block.mean
+                    if block.scale is not None:
+                        part = part / block.scale
+            parts.append(part)
+
+        matrix = np.hstack(parts) if len(parts) > 1 else parts[0]
+        for step in self.post_steps:
+            matrix = step.transform(matrix)
+        return matrix
+
+    def predict(self, frame):
+        """Same contract as ``pipeline.predict`` but on pre-encoded arrays."""
+        return self.estimator.predict(self.transform(frame))
+
+
+def _category_lookup(categories):
+    codes, labels = {}, {}
+    for code, category in enumerate(categories):
+        key = normalize_category(category)
+        # Keep the first spelling if two fitted categories normalize together.
+        if key not in codes:
+            codes[key] = code
+            labels[key] = str(category).strip()
+    return {"codes": codes, "labels": labels}
+
+
+def _encode_column(column, values, lookup):
+    # Factorize first so the Python-level dictionary work is O(unique values).
+    labels, uniques = pd.factorize(values, use_na_sentinel=True)
+    if (labels < 0).any():
+        raise ValueError(f"Missing value in input column '{column}'")
+    unique_codes = np.empty(len(uniques), dtype=np.int64)
+    for i, value in enumerate(uniques):
+        code = lookup["codes"].get(normalize_category(value))
+        if code is None:  # also under handle_unknown='ignore': no silent all-zero rows
+            raise UnknownCategoryError(column, value, list(lookup["labels"].values()))
+        unique_codes[i] = code
+    return unique_codes[labels]
+
+
+def _numeric_matrix(frame, columns):
+    missing = [c for c in columns if c not in frame]
+    if missing:
+        raise KeyError(f"Missing input column(s): {', '.join(missing)}")
+    try:
+        return frame[columns].to_numpy(dtype=float)
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Non-numeric value in {', '.join(columns)}: {exc}") from None
+
+
+def build_fast_predictor(model):
+    """``FastEncoder`` for ``model`` or ``None`` when its layout is not recognised."""
+    try:
+        return FastEncoder.from_pipeline(model)
+    except (TypeError, AttributeError, IndexError, KeyError):
+        return None
@@ -0,0 +1,224 @@
+"""
+Persistent prediction history backed by a local SQLite file.
+
+``record`` only enqueues; a daemon thread drains the queue and writes rows in
+batched transactions, so the Streamlit request path never waits on disk.
+``record_frame`` queues every row of a batched prediction (scenario
+comparison, crop ranking, bulk scoring) in one call.
+``page`` reads newest-first with keyset pagination on ``(created_at, id)``,
+which stays an index search no matter how deep the user pages. The filter
+dropdowns read a small ``filter_values`` table that the writer keeps up to
+date, instead of scanning the history for distinct values.
+"""
+import json
+import logging
+import math
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_HISTORY_PATH = "prediction_history.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    state TEXT NOT NULL,
+    crop TEXT NOT NULL,
+    season TEXT NOT NULL,
+    inputs TEXT NOT NULL,
+    prediction REAL NOT NULL,
+    model_version TEXT,
+    latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_state ON predictions (state, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_crop ON predictions (crop, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_season ON predictions (season, created_at);
+CREATE TABLE IF NOT EXISTS filter_values (
+    column_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (column_name, value)
+) WITHOUT ROWID;
+"""
+
+_INSERT = """
+INSERT INTO predictions
+    (created_at, state, crop, season, inputs, prediction, model_version, latency_ms)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_FILTER_VALUE = "INSERT OR IGNORE INTO filter_values (column_name, value) VALUES (?, ?)"
+
+_FILTER_COLUMNS = ("state", "crop", "season")
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionHistory:
+    """Write-behind prediction log with indexed, keyset-paginated reads."""
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, batch_size=256,
+                 flush_interval=0.5, max_pending=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.failed = 0
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = threading.Event()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            if conn.execute("SELECT 1 FROM filter_values LIMIT 1").fetchone() is None:
+                # One-time backfill for databases written before the lookup table existed
+                for column in _FILTER_COLUMNS:
+                    conn.execute(
+                        f"INSERT OR IGNORE INTO filter_values SELECT '{column}', {column} "
+                        f"FROM predictions GROUP BY {column}"
+                    )
+
+        self._writer = threading.Thread(target=self._drain, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------------- Writes -------------------
+    def record(self, state, crop, season, inputs, prediction,
+               model_version=None, latency_ms=None):
+        """Queues one prediction; never blocks (drops and counts when saturated)."""
+        self._put((
+            time.time(), state, crop, season,
+            json.dumps(inputs, default=float), float(prediction),
+            model_version, latency_ms,
+        ))
+
+    def record_many(self, rows):
+        """Queues ``(state, crop, season, inputs, prediction, model_version, latency_ms)`` tuples."""
+        for row in rows:
+            self.record(*row)
+
+    def record_frame(self, frame, predictions, model_version=None, latency_ms=None, timeout=0):
+        """Queues one row per input of a batched predict (``frame`` in the model input layout).
+
+        ``latency_ms`` is the latency of the whole batch. Rows without a finite
+        prediction are skipped. A positive ``timeout`` waits that long for queue
+        room before dropping, for background callers such as bulk scoring.
+        """
+        created_at = time.time()
+        inputs = frame.drop(columns=["State", "Crop", "Season"]).to_dict("records")
+        for state, crop, season, row_inputs, prediction in zip(
+                frame["State"], frame["Crop"], frame["Season"], inputs, predictions):
+            prediction = float(prediction)
+            if not math.isfinite(prediction):
+                continue
+            self._put((
+                created_at, state, crop, season,
+                json.dumps(row_inputs, default=float), prediction,
+                model_version, latency_ms,
+            ), timeout)
+
+    def _put(self, row, timeout=0):
+        try:
+            if timeout:
+                self._queue.put(row, timeout=timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self):
+        conn = self._connect()
+        try:
+            while not (self._closed.is_set() and self._queue.empty()):
+                try:
+                    batch = [self._queue.get(timeout=self.flush_interval)]
+                except queue.Empty:
+                    continue
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                try:
+                    with conn:
+                        conn.executemany(_INSERT, batch)
+                        conn.executemany(_INSERT_FILTER_VALUE, {
+                            (column, row[i]) for row in batch for i, column in enumerate(_FILTER_COLUMNS, 1)
+                        })
+                except sqlite3.Error as exc:
+                    # Lose this batch, not the writer: later rows and flush() keep working
+                    self.failed += len(batch)
+                    self.last_error = exc
+                    logger.exception("Dropped %d history rows", len(batch))
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            conn.close()
+
+    def flush(self):
+        """Blocks until every queued row is on disk."""
+        self._queue.join()
+
+    def close(self):
+        self._closed.set()
+        self._writer.join()
+
+    # ---------------- Reads -------------------
+    def page(self, limit=50, cursor=None, **filters):
+        """Returns ``(rows, next_cursor)`` newest-first.
+
+        ``cursor`` is the ``(created_at, id)`` of the last row of the previous
+        page; ``filters`` may contain ``state``, ``crop`` and ``season``.
+        """
+        clauses, params = [], []
+        for column in _FILTER_COLUMNS:
+            value = filters.get(column)
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if cursor is not None:
+            # Row-value comparison: SQLite seeks the index instead of scanning to the cursor
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend([cursor[0], cursor[1]])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (
+            "SELECT id, created_at, state, crop, season, inputs, prediction, "
+            f"model_version, latency_ms FROM predictions {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+        for row in rows:
+            row["inputs"] = json.loads(row["inputs"])
+        next_cursor = (rows[-1]["created_at"], rows[-1]["id"]) if len(rows) == limit else None
+        return rows, next_cursor
+
+    def distinct(self, column):
+        """Values seen for a filter column (from the ``filter_values`` lookup table)."""
+        if column not in _FILTER_COLUMNS:
+            raise ValueError(f"Cannot list distinct values of '{column}'")
+        conn = self._connect()
+        try:
+            return [row[0] for row in conn.execute(
+                "SELECT value FROM filter_values WHERE column_name = ? ORDER BY value", (column,)
+            )]
+        finally:
+            conn.close()
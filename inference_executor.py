@@ -0,0 +1,169 @@
+"""
+Shared, bounded inference executor with admission control.
+
+Session threads no longer call ``predict`` directly: they enqueue a job on a
+fixed pool of worker threads through a bounded queue. Each job carries a
+deadline; a worker skips jobs whose caller has given up or whose deadline
+has passed, so a burst never turns into minutes of stale work. When the
+queue is full the request is shed immediately, answered from a small cache
+of recent results when the same input was scored before. Native thread pools
+(BLAS/OpenMP via threadpoolctl, joblib ``n_jobs`` on the estimator) are
+capped so ``workers`` is the real CPU parallelism of inference. Queue depth,
+wait time and shed requests are exported through ``metrics``.
+"""
+import collections
+import concurrent.futures
+import hashlib
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+from metrics import INFERENCE_QUEUE_DEPTH, INFERENCE_REJECTED, INFERENCE_WAIT_SECONDS
+
+
+class Overloaded(RuntimeError):
+    """The inference queue is full and no cached result is available."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request waited past its deadline before or while being served."""
+
+
+def limit_model_threads(predictor, n_jobs=1):
+    """Sets ``n_jobs`` on the estimator behind ``predictor`` (FastEncoder, Pipeline or bare)."""
+    estimator = getattr(predictor, "estimator", None)
+    if estimator is None and hasattr(predictor, "steps"):
+        estimator = predictor.steps[-1][1]
+    estimator = estimator or predictor
+    if hasattr(estimator, "get_params") and "n_jobs" in estimator.get_params(deep=False):
+        estimator.set_params(n_jobs=n_jobs)
+
+
+def _frame_key(namespace, frame):
+    digest = hashlib.sha1(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return f"{namespace}:{len(frame)}:{digest.hexdigest()}"
+
+
+class _Job:
+    __slots__ = ("predict", "frame", "key", "future", "enqueued", "deadline")
+
+    def __init__(self, predict, frame, key, timeout):
+        self.predict = predict
+        self.frame = frame
+        self.key = key
+        self.future = concurrent.futures.Future()
+        self.enqueued = time.perf_counter()
+        self.deadline = self.enqueued + timeout
+
+
+class InferenceExecutor:
+    def __init__(self, workers=2, max_queue=32, timeout=10.0, native_threads=1, cache_size=256):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.served = 0
+        self.shed = 0
+        self.expired = 0
+        self.cache_hits = 0
+        # Process-wide cap on BLAS/OpenMP pools so N workers use ~N cores
+        self._native_limits = threadpool_limits(limits=native_threads)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._cache = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"inference-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    # ---------------- Workers -------------------
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            INFERENCE_QUEUE_DEPTH.set(self._queue.qsize())
+            started = time.perf_counter()
+            INFERENCE_WAIT_SECONDS.observe(started - job.enqueued)
+            if not job.future.set_running_or_notify_cancel():
+                continue  # the caller timed out and cancelled while the job was queued
+            if started > job.deadline:
+                self.expired += 1
+                INFERENCE_REJECTED.inc(reason="deadline")
+                job.future.set_exception(DeadlineExceeded("Request expired in the inference queue"))
+                continue
+            try:
+                result = np.asarray(job.predict(job.frame))
+            except BaseException as exc:
+                job.future.set_exception(exc)
+                continue
+            self.served += 1
+            self._remember(job.key, result)
+            job.future.set_result(result)
+
+    # ---------------- Result cache -------------------
+    def _remember(self, key, result):
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _cached(self, key):
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return result
+
+    # ---------------- Requests -------------------
+    def predict_with_status(self, predict, frame, namespace="", timeout=None):
+        """``(predictions, status)`` with status ``"ok"`` or ``"cached"`` (degraded).
+
+        ``namespace`` (e.g. the model version) keeps cached results of
+        different models apart. Raises ``Overloaded`` or ``DeadlineExceeded``
+        when the request can be neither served in time nor answered from cache.
+        """
+        key = _frame_key(namespace, frame)
+        job = _Job(predict, frame, key, self.timeout if timeout is None else timeout)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self.shed += 1
+            INFERENCE_REJECTED.inc(reason="queue_full")
+            cached = self._cached(key)
+            if cached is not None:
+                return cached.copy(), "cached"
+            raise Overloaded(f"Inference queue full ({self.max_queue} waiting)") from None
+        INFERENCE_QUEUE_DEPTH.set(self._queue.qsize())
+
+        try:
+            return job.future.result(timeout=max(0.0, job.deadline - time.perf_counter())), "ok"
+        except (concurrent.futures.TimeoutError, DeadlineExceeded):
+            if job.future.cancel():  # still queued: the worker will skip it
+                self.expired += 1
+                INFERENCE_REJECTED.inc(reason="deadline")
+            cached = self._cached(key)
+            if cached is not None:
+                return cached.copy(), "cached"
+            raise DeadlineExceeded(f"No result within {job.deadline - job.enqueued:.1f}s") from None
+
+    def predict(self, predict, frame, namespace="", timeout=None):
+        return self.predict_with_status(predict, frame, namespace, timeout)[0]
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._native_limits.restore_original_limits()
@@ -0,0 +1,254 @@
+"""
+Dependency-free instrumentation for the prediction path, exposed as OpenMetrics.
+
+Every replica keeps its own in-process counters and histograms and serves them
+at ``http://127.0.0.1:<port>/metrics`` from a daemon thread (and/or rewrites a
+text file for a node-exporter style textfile collector), so nothing external
+is needed to collect them.
+"""
+import http.server
+import os
+import threading
+import time
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self):
+        return [f"# TYPE {self.name} {self.kind}", f"# HELP {self.name} {self.documentation}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Info(_Metric):
+    """Single-sample info metric whose labels carry the value (e.g. model version)."""
+    kind = "info"
+
+    def set(self, **labels):
+        with self._lock:
+            self._values = {self._key(labels): 1}
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_info{_labels(self.labelnames, k)} 1" for k, _ in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def totals(self):
+        """``{label values: (count, sum)}`` for every observed label set."""
+        with self._lock:
+            return {k: (v[2], v[1]) for k, v in self._values.items() if v[2]}
+
+    def samples(self):
+        with self._lock:
+            items = [(k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = (("le", _number(float(bound))),)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {bucket_count}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """The whole registry in OpenMetrics text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+# ---------------- Prediction-path metrics -------------------
+REGISTRY = MetricsRegistry()
+
+PREDICTIONS = REGISTRY.register(Counter(
+    "agripredict_predictions", "Predictions served, by input category.",
+    ("state", "crop", "season", "source"),
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "agripredict_stage_seconds", "Wall time of each stage of a prediction rerun.", ("stage",),
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "agripredict_cache_lookups", "Cache lookups by cache and result (hit/miss).", ("cache", "result"),
+))
+MODEL = REGISTRY.register(Info(
+    "agripredict_model", "Model version currently serving predictions.", ("version",),
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    "agripredict_model_load_seconds", "Time taken to load and warm a model version.", ("version",),
+))
+INFERENCE_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "agripredict_inference_queue_depth", "Requests waiting for an inference worker.",
+))
+INFERENCE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "agripredict_inference_wait_seconds", "Time a request spent queued before a worker picked it up.",
+))
+INFERENCE_REJECTED = REGISTRY.register(Counter(
+    "agripredict_inference_rejected", "Requests shed by the inference executor, by reason.", ("reason",),
+))
+INFERENCE_DEGRADED = REGISTRY.register(Counter(
+    "agripredict_inference_degraded", "Shed requests answered from the recent-result cache.", ("source",),
+))
+
+
+# Callables ``(stage, seconds)`` notified of every stage timing (e.g. the rerun profiler)
+stage_hooks = []
+
+
+def observe_stage(stage, started):
+    """Records ``time.perf_counter() - started`` for ``stage``."""
+    seconds = time.perf_counter() - started
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    for hook in tuple(stage_hooks):  # hooks come and go from other threads
+        hook(stage, seconds)
+
+
+def record_predictions(frame, source="form"):
+    """Counts every row of a scored input frame by State/Crop/Season."""
+    counts = frame.groupby(["State", "Crop", "Season"], sort=False).size()
+    for (state, crop, season), count in counts.items():
+        PREDICTIONS.inc(int(count), state=state.strip(), crop=crop.strip(), season=season.strip(), source=source)
+
+
+def record_cache(cache, hit, count=1):
+    CACHE_LOOKUPS.inc(count, cache=cache, result="hit" if hit else "miss")
+
+
+def record_degraded(source):
+    INFERENCE_DEGRADED.inc(source=source)
+
+
+def record_model(version, load_seconds):
+    MODEL.set(version=version)
+    MODEL_LOAD_SECONDS.set(load_seconds, version=version)
+
+
+# ---------------- Exposition -------------------
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="127.0.0.1"):
+    """Starts the ``/metrics`` endpoint on a daemon thread; returns the server."""
+    server = http.server.ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def write_file(path):
+    """Atomically rewrites ``path`` with the current exposition."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as file:
+        file.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+def start_file_writer(path, interval=15.0):
+    def loop():
+        while True:
+            write_file(path)
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
@@ -0,0 +1,271 @@
+"""
+Versioned, hot-swappable model registry.
+
+Artifacts are the legacy ``crop_yield_pipeline.pkl`` plus any ``models/*.pkl``
+and memory-mapped tree artifacts (``models/*/manifest.json``, see
+``tree_artifact.py``); each is identified by a content hash. An exported
+tree artifact carries the hash of the pickle it came from, so the two count
+as one version and whichever is loaded first serves it. A daemon thread
+polls for new or changed files, loads and warms the candidate off the
+request path, runs a smoke /
+parity check against sample training rows and only then swaps it in. Readers
+take ``registry.current`` once per rerun, so a swap never blocks or changes a
+prediction already in flight. ``rollback`` re-activates an earlier version and
+pins it until the next new artifact appears.
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from crop_data import weather_data
+import tree_artifact
+from feature_encoding import FEATURE_COLUMNS, build_fast_predictor
+
+DEFAULT_MODEL_PATH = "crop_yield_pipeline.pkl"
+DEFAULT_MODELS_DIR = "models"
+
+
+class ModelLoadError(RuntimeError):
+    """An artifact exists but could not be unpickled or failed its smoke check."""
+
+
+class ModelVersion:
+    """One loaded artifact and everything needed to serve it."""
+
+    def __init__(self, version, path, model, load_seconds, smoke):
+        self.version = version
+        self.path = path
+        self.model = model
+        self.predictor = build_fast_predictor(model) or model
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.smoke = smoke
+
+    def predict(self, frame):
+        return self.predictor.predict(frame)
+
+
+def artifact_version(path, payload):
+    """Content-hash version of an artifact's bytes.
+
+    A tree artifact reports the version of the pickle it was exported from, so
+    the cube, backtest and PDP atlas built from that pickle stay current.
+    """
+    if path.endswith(tree_artifact.MANIFEST):
+        source_version = json.loads(payload).get("source_version")
+        if source_version:
+            return source_version
+    return hashlib.sha256(payload).hexdigest()[:12]
+
+
+def smoke_frame(data_path="merged_data.csv", n_rows=64, seed=0):
+    """Fixed sample of training rows in serving layout, used to warm and vet candidates."""
+    data = pd.read_csv(data_path)
+    rows = data.sample(n=min(n_rows, len(data)), random_state=seed).reset_index(drop=True)
+    rows["tavg"] = rows["State"].map({s: w["tavg"] for s, w in weather_data.items()}).astype(float)
+    rows["prcp"] = rows["State"].map({s: w["prcp"] for s, w in weather_data.items()}).astype(float)
+    rows["Production"] = 0
+    return rows[FEATURE_COLUMNS]
+
+
+class ModelRegistry:
+    def __init__(self, model_path=DEFAULT_MODEL_PATH, models_dir=DEFAULT_MODELS_DIR,
+                 poll_interval=5.0, max_parity_drift=None, smoke_rows=None, keep=3):
+        self.model_path = model_path
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+        self.max_parity_drift = max_parity_drift
+        self.smoke_rows = smoke_rows
+        self.keep = keep
+        self.current = None
+        self.last_error = None
+        self.history = []
+        self._loaded = {}
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    # ---------------- Discovery -------------------
+    def artifact_paths(self):
+        paths = glob.glob(os.path.join(self.models_dir, "*.pkl"))
+        paths += glob.glob(os.path.join(self.models_dir, "*", tree_artifact.MANIFEST))
+        if os.path.isdir(self.model_path):
+            paths.append(os.path.join(self.model_path, tree_artifact.MANIFEST))
+        elif os.path.exists(self.model_path):
+            paths.append(self.model_path)
+        stamped = []
+        for path in paths:
+            try:
+                stamped.append((os.stat(path).st_mtime_ns, path))
+            except FileNotFoundError:
+                continue  # removed between the glob and the stat
+        return [path for _, path in sorted(stamped)]
+
+    def _changed_artifacts(self):
+        changed = []
+        for path in self.artifact_paths():
+            try:
+                stamp = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if self._seen.get(path) != stamp:
+                self._seen[path] = stamp
+                changed.append(path)
+        return changed
+
+    # ---------------- Loading -------------------
+    def _smoke_rows(self):
+        if self.smoke_rows is None:
+            try:
+                self.smoke_rows = smoke_frame()
+            except (OSError, KeyError, ValueError):
+                self.smoke_rows = pd.DataFrame(columns=FEATURE_COLUMNS)
+        return self.smoke_rows
+
+    def load(self, path):
+        """Unpickles, warms and vets one artifact; raises on any problem."""
+        start = time.perf_counter()
+        try:
+            if path.endswith(tree_artifact.MANIFEST):
+                model, payload = tree_artifact.load(path)  # memory-mapped, nothing unpickled
+            else:
+                with open(path, "rb") as file:
+                    payload = file.read()
+                model = pickle.loads(payload)
+        except FileNotFoundError:
+            raise
+        except Exception as exc:
+            raise ModelLoadError(f"{path} is corrupt or incompatible: {exc}") from exc
+        version = artifact_version(path, payload)
+        if version in self._loaded:
+            return self._loaded[version]
+
+        candidate = ModelVersion(version, path, model, 0.0, {})
+        candidate.smoke = self._smoke_check(candidate)
+        candidate.load_seconds = time.perf_counter() - start
+        return candidate
+
+    def _smoke_check(self, candidate):
+        rows = self._smoke_rows()
+        if rows.empty:
+            return {"rows": 0}
+        try:
+            predictions = np.asarray(candidate.predict(rows), dtype=float)
+        except Exception as exc:
+            raise ModelLoadError(f"{candidate.path} failed its smoke test: {exc}") from exc
+        if predictions.shape != (len(rows),) or not np.isfinite(predictions).all():
+            raise ModelLoadError(f"{candidate.path} produced invalid predictions in its smoke test")
+
+        report = {"rows": len(rows)}
+        active = self.current
+        if active is not None and active.version != candidate.version:
+            try:
+                baseline = np.asarray(active.predict(rows), dtype=float)
+            except Exception as exc:  # the active model's failure says nothing about the candidate
+                report["parity_error"] = f"{type(exc).__name__}: {exc}"
+                return report
+            drift = np.abs(predictions - baseline) / np.maximum(np.abs(baseline), 1e-6)
+            report["parity_against"] = active.version
+            report["median_drift"] = float(np.median(drift))
+            report["max_drift"] = float(drift.max())
+            if self.max_parity_drift is not None and report["median_drift"] > self.max_parity_drift:
+                raise ModelLoadError(
+                    f"{candidate.path} drifts {report['median_drift']:.1%} from "
+                    f"{active.version} (limit {self.max_parity_drift:.1%})"
+                )
+        return report
+
+    def _activate(self, candidate):
+        with self._lock:
+            self._loaded[candidate.version] = candidate
+            if self.current is None or self.current.version != candidate.version:
+                self.history.append(candidate.version)
+            self.current = candidate  # single reference swap; readers keep their snapshot
+            # Keep a few earlier versions resident for instant rollback
+            for version in list(self._loaded):
+                if len(self._loaded) <= self.keep:
+                    break
+                if version != candidate.version:
+                    del self._loaded[version]
+
+    def load_initial(self):
+        """Synchronously activates the newest loadable artifact."""
+        for path in reversed(self._changed_artifacts()):
+            try:
+                self._activate(self.load(path))
+                self.last_error = None
+                return self.current
+            except (OSError, ModelLoadError) as exc:
+                self.last_error = exc
+        return self.current
+
+    def check_for_updates(self):
+        """Loads any new artifact and promotes the newest one that passes its checks."""
+        promoted = None
+        for path in self._changed_artifacts():
+            try:
+                candidate = self.load(path)
+            except (OSError, ModelLoadError) as exc:
+                self.last_error = exc
+                continue
+            if self.current is None or candidate.version not in self._loaded:
+                self._activate(candidate)
+                promoted = candidate
+                self.last_error = None
+        return promoted
+
+    # ---------------- Watcher -------------------
+    def start_watcher(self):
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="model-registry", daemon=True)
+        self._watcher.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check_for_updates()
+            except Exception as exc:  # one bad poll must not end hot-swapping for the process
+                self.last_error = exc
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------------- Rollback -------------------
+    def versions(self):
+        """Loaded versions, oldest first, with load metadata."""
+        with self._lock:
+            return [
+                {
+                    "version": v.version,
+                    "path": v.path,
+                    "loaded_at": v.loaded_at,
+                    "load_seconds": v.load_seconds,
+                    "active": self.current is v,
+                }
+                for v in self._loaded.values()
+            ]
+
+    def rollback(self, version=None):
+        """Re-activates ``version`` (default: the one before the current one)."""
+        with self._lock:
+            if version is None:
+                if self.current is None:
+                    raise ValueError("No model version is active, so there is nothing to roll back from")
+                earlier = [v for v in self.history if v != self.current.version]
+                if not earlier:
+                    raise ValueError("No earlier model version to roll back to")
+                version = earlier[-1]
+            if version not in self._loaded:
+                raise ValueError(f"Unknown model version '{version}'")
+            self.current = self._loaded[version]
+            self.history.append(version)
+        return self.current
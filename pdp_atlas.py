@@ -0,0 +1,392 @@
+"""
+Precomputed partial-dependence atlas: how yield responds to each input.
+
+For every crop (and, with ``--by-state``, every crop x state with enough
+history) a fixed-seed sample of ``merged_data.csv`` rows is the background;
+each input in ``PD_FEATURES`` is swept over a quantile grid of that crop's
+own values while everything else keeps its background value. One-way curves
+store the mean and the 10th/90th percentile of the individual (ICE) curves,
+two-way surfaces the mean over a coarser grid for every feature pair. Every
+sweep is one batched ``predict`` and keys are spread over a process pool.
+
+The atlas is one float32 matrix (``atlas-<hash>.npy``, one fixed-width row
+per key) plus ``index.json`` mapping keys to rows. Each key carries a
+fingerprint of the model version, the build settings and its source rows, so
+a rebuild only recomputes keys whose model or data changed. Keys outside a
+run's ``--crops`` / ``--by-state`` selection are carried over unchanged, so
+partial builds add to the atlas. The index is replaced last, so readers never
+see a half-written atlas.
+
+    python pdp_atlas.py build --model crop_yield_pipeline.pkl --by-state --workers 4
+    python pdp_atlas.py report
+"""
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from crop_data import weather_data
+from feature_encoding import complete_input_frame, normalize_category
+from model_registry import DEFAULT_MODEL_PATH, ModelRegistry, artifact_version
+import tree_artifact
+
+DEFAULT_ATLAS_DIR = os.path.join("artifacts", "pdp_atlas")
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+PD_FEATURES = ["Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+PD_PAIRS = list(itertools.combinations(PD_FEATURES, 2))
+ALL_STATES = "*"
+
+DEFAULT_SETTINGS = {
+    "grid_points": 20,      # one-way curve resolution
+    "surface_points": 10,   # two-way surface resolution per axis
+    "background": 200,      # sampled rows per key
+    "min_rows": 25,         # crop x state keys with less history are skipped
+    "low_q": 0.02,          # grid spans these quantiles of the crop's data
+    "high_q": 0.98,
+    "seed": 0,
+    # Crop_Year fed to every sweep. Pinned rather than taken from the clock:
+    # it is part of every fingerprint, so a moving year would invalidate the
+    # whole atlas each January. 2020 is the last year in merged_data.csv.
+    "crop_year": 2020,
+}
+
+
+def atlas_key(crop, state=None):
+    return f"{normalize_category(crop)}|{ALL_STATES if state is None else normalize_category(state)}"
+
+
+def row_layout(grid_points, surface_points):
+    """``{name: (offset, shape)}`` of the blocks in one atlas row, and the row width."""
+    n, m, f = grid_points, surface_points, len(PD_FEATURES)
+    shapes = [("grid", (f, n)), ("mean", (f, n)), ("p10", (f, n)), ("p90", (f, n)),
+              ("surface_grid", (f, m)), ("surface", (len(PD_PAIRS), m, m))]
+    layout, offset = {}, 0
+    for name, shape in shapes:
+        layout[name] = (offset, shape)
+        offset += int(np.prod(shape))
+    return layout, offset
+
+
+def model_version(model_path):
+    """The registry's content-hash version, without loading the model."""
+    if os.path.isdir(model_path):
+        model_path = os.path.join(model_path, tree_artifact.MANIFEST)
+    with open(model_path, "rb") as file:
+        return artifact_version(model_path, file.read()), model_path
+
+
+# ---------------- Planning -------------------
+def _source_digest(rows):
+    """Order-independent hash of a key's source rows."""
+    hashes = np.sort(pd.util.hash_pandas_object(rows, index=False).to_numpy())
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def _grid(values, points, low_q, high_q):
+    return np.quantile(values.astype(float), np.linspace(low_q, high_q, points))
+
+
+def plan(data, settings, version, by_state=False, crops=None):
+    """Every atlas key with its background frame, grids and fingerprint."""
+    data = data.dropna(subset=PD_FEATURES).copy()
+    for column in ("State", "Crop", "Season"):
+        data[column] = data[column].astype(str).str.strip()
+    wanted = None if crops is None else {normalize_category(c) for c in crops}
+    settings_digest = json.dumps(settings, sort_keys=True)
+    tasks = []
+    for crop, crop_rows in data.groupby("Crop"):
+        if wanted is not None and normalize_category(crop) not in wanted:
+            continue
+        scopes = [(None, crop_rows)]
+        if by_state:
+            scopes += [(state, rows) for state, rows in crop_rows.groupby("State")
+                       if len(rows) >= settings["min_rows"]]
+        for state, rows in scopes:
+            fingerprint = hashlib.sha1(
+                f"{version}|{settings_digest}|{_source_digest(rows)}".encode()
+            ).hexdigest()[:16]
+            sample = rows.sample(n=min(settings["background"], len(rows)), random_state=settings["seed"])
+            tasks.append({
+                "key": atlas_key(crop, state), "crop": crop, "state": state,
+                "fingerprint": fingerprint, "source_rows": int(len(rows)),
+                "background": sample,
+                "grid": np.stack([_grid(rows[f], settings["grid_points"], settings["low_q"], settings["high_q"])
+                                  for f in PD_FEATURES]),
+                "surface_grid": np.stack([
+                    _grid(rows[f], settings["surface_points"], settings["low_q"], settings["high_q"])
+                    for f in PD_FEATURES
+                ]),
+            })
+    return tasks
+
+
+# ---------------- Workers -------------------
+# Per-process state, filled in once by ``_init_worker``
+_worker = {}
+
+
+def _init_worker(model_path, crop_year):
+    from inference_executor import limit_model_threads
+
+    model = ModelRegistry(model_path).load(model_path)
+    limit_model_threads(model.predictor)  # parallelism is across keys
+    _worker.update(model=model, crop_year=crop_year)
+
+
+def _sweep(background, assignments):
+    """Predictions for ``background`` with each row of ``assignments`` swapped in, in one batch."""
+    n = len(background)
+    frame = background.loc[background.index.repeat(len(assignments))].reset_index(drop=True)
+    for column, values in assignments.items():
+        frame[column] = np.tile(np.asarray(values, dtype=float), n)
+    predictions = np.asarray(_worker["model"].predict(frame), dtype=float)
+    return predictions.reshape(n, len(assignments))  # (background rows, grid points)
+
+
+def compute_key(task, layout, width):
+    """Worker: one atlas row for one key."""
+    background = complete_input_frame(
+        task["background"][["State", "Season", "Crop"] + PD_FEATURES].reset_index(drop=True),
+        weather_data, _worker["crop_year"],
+    )
+    row = np.full(width, np.nan, dtype=np.float32)
+    blocks = {name: row[offset:offset + int(np.prod(shape))].reshape(shape)
+              for name, (offset, shape) in layout.items()}
+    blocks["grid"][:] = task["grid"]
+    blocks["surface_grid"][:] = task["surface_grid"]
+
+    for i, feature in enumerate(PD_FEATURES):
+        ice = _sweep(background, pd.DataFrame({feature: task["grid"][i]}))
+        blocks["mean"][i] = ice.mean(axis=0)
+        blocks["p10"][i], blocks["p90"][i] = np.percentile(ice, [10, 90], axis=0)
+
+    for p, (first, second) in enumerate(PD_PAIRS):
+        x = task["surface_grid"][PD_FEATURES.index(first)]
+        y = task["surface_grid"][PD_FEATURES.index(second)]
+        xx, yy = np.meshgrid(x, y, indexing="ij")
+        ice = _sweep(background, pd.DataFrame({first: xx.ravel(), second: yy.ravel()}))
+        blocks["surface"][p] = ice.mean(axis=0).reshape(len(x), len(y))
+    return task["key"], row
+
+
+# ---------------- Build -------------------
+def _read_index(out_dir):
+    try:
+        with open(os.path.join(out_dir, INDEX_FILE)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def build(model_path=DEFAULT_MODEL_PATH, data_path="merged_data.csv", out_dir=DEFAULT_ATLAS_DIR,
+          by_state=False, crops=None, workers=None, force=False, **overrides):
+    """Recomputes stale keys and rewrites the atlas; returns ``(index, recomputed, reused, carried)``.
+
+    ``force`` recomputes every selected key; keys outside the selection
+    (other crops, or crop x state keys when ``by_state`` is off) are kept.
+    """
+    settings = {**DEFAULT_SETTINGS, **overrides}
+    version, model_path = model_version(model_path)
+    tasks = plan(pd.read_csv(data_path), settings, version, by_state, crops)
+    layout, width = row_layout(settings["grid_points"], settings["surface_points"])
+
+    previous = _read_index(out_dir)
+    old_rows, old_matrix = {}, None
+    if previous is not None and previous.get("format") == FORMAT_VERSION and all(
+        previous["settings"].get(k) == settings[k] for k in ("grid_points", "surface_points")
+    ):
+        old_matrix = np.load(os.path.join(out_dir, previous["file"]), mmap_mode="r")
+        old_rows = {entry["key"]: entry for entry in previous["keys"]}
+    elif previous is not None:
+        print(f"  existing atlas has an incompatible layout; {len(previous['keys'])} keys not carried over")
+    stale = [t for t in tasks if force or old_rows.get(t["key"], {}).get("fingerprint") != t["fingerprint"]]
+    stale_keys = {task["key"] for task in stale}
+
+    # Previously built keys this run does not cover stay as they are
+    wanted = None if crops is None else {normalize_category(c) for c in crops}
+    planned = {task["key"] for task in tasks}
+    carried = [
+        entry for key, entry in old_rows.items()
+        if key not in planned and (
+            (wanted is not None and normalize_category(entry["crop"]) not in wanted)
+            or (entry["state"] is not None and not by_state)
+        )
+    ]
+
+    entries = [
+        {"key": t["key"], "crop": t["crop"], "state": t["state"], "model_version": version,
+         "fingerprint": t["fingerprint"], "source_rows": t["source_rows"],
+         "background_rows": int(len(t["background"]))}
+        for t in tasks
+    ]
+    entries += [{**entry, "model_version": entry.get("model_version", previous["model_version"])}
+                for entry in carried]
+    matrix = np.full((len(entries), width), np.nan, dtype=np.float32)
+    position = {}
+    for i, entry in enumerate(entries):
+        position[entry["key"]] = i
+        if entry["key"] not in stale_keys:
+            matrix[i] = old_matrix[old_rows[entry["key"]]["row"]]
+        entry["row"] = i
+
+    start = time.perf_counter()
+    if stale:
+        os.makedirs(out_dir, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_path, settings["crop_year"])) as pool:
+            futures = [pool.submit(compute_key, task, layout, width) for task in stale]
+            for done, future in enumerate(as_completed(futures), 1):
+                key, row = future.result()
+                matrix[position[key]] = row
+                print(f"\r  {done}/{len(stale)} keys, {done / (time.perf_counter() - start):.1f} keys/s",
+                      end="", flush=True)
+        print()
+
+    # Content-addressed matrix first, index last: readers switch over in one rename
+    os.makedirs(out_dir, exist_ok=True)
+    digest = hashlib.sha1(matrix.tobytes()).hexdigest()[:12]
+    file_name = f"atlas-{digest}.npy"
+    tmp_path = os.path.join(out_dir, f".{file_name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as file:
+        np.save(file, matrix)
+    os.replace(tmp_path, os.path.join(out_dir, file_name))
+    index = {
+        "format": FORMAT_VERSION,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "model_version": version,
+        "settings": settings,
+        "features": PD_FEATURES,
+        "pairs": [list(pair) for pair in PD_PAIRS],
+        "width": width,
+        "file": file_name,
+        "keys": entries,
+        "build_seconds": round(time.perf_counter() - start, 1),
+    }
+    tmp_index = os.path.join(out_dir, f".{INDEX_FILE}.{os.getpid()}.tmp")
+    with open(tmp_index, "w") as file:
+        json.dump(index, file, indent=1)
+    os.replace(tmp_index, os.path.join(out_dir, INDEX_FILE))
+    # Superseded matrices; processes still mapping one keep their pages until they close it
+    for name in os.listdir(out_dir):
+        if name.startswith("atlas-") and name.endswith(".npy") and name != file_name:
+            os.remove(os.path.join(out_dir, name))
+    return index, len(stale), len(tasks) - len(stale), len(carried)
+
+
+# ---------------- Serving -------------------
+class PartialDependenceAtlas:
+    """Read-only, memory-mapped view of a built atlas."""
+
+    def __init__(self, index, matrix):
+        self.index = index
+        self.matrix = matrix
+        self.model_version = index["model_version"]
+        self.created_at = index["created_at"]
+        self.layout, _ = row_layout(index["settings"]["grid_points"], index["settings"]["surface_points"])
+        self.rows = {entry["key"]: entry for entry in index["keys"]}
+
+    @classmethod
+    def load(cls, out_dir=DEFAULT_ATLAS_DIR):
+        """Raises ``FileNotFoundError`` if no atlas has been built."""
+        with open(os.path.join(out_dir, INDEX_FILE)) as file:
+            index = json.load(file)
+        if index.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported atlas format {index.get('format')}")
+        return cls(index, np.load(os.path.join(out_dir, index["file"]), mmap_mode="r", allow_pickle=False))
+
+    def entry(self, crop, state=None):
+        """Index entry for crop x state, falling back to the all-states curve; None if absent."""
+        if state is not None and atlas_key(crop, state) in self.rows:
+            return self.rows[atlas_key(crop, state)]
+        return self.rows.get(atlas_key(crop))
+
+    def _block(self, entry, name):
+        offset, shape = self.layout[name]
+        return np.asarray(self.matrix[entry["row"], offset:offset + int(np.prod(shape))]).reshape(shape)
+
+    def curves(self, crop, state=None):
+        """``{feature: DataFrame(Value, Mean, P10, P90)}`` plus the entry used, or ``(None, None)``."""
+        entry = self.entry(crop, state)
+        if entry is None:
+            return None, None
+        blocks = {name: self._block(entry, name) for name in ("grid", "mean", "p10", "p90")}
+        return {
+            feature: pd.DataFrame({"Value": blocks["grid"][i], "Mean": blocks["mean"][i],
+                                   "P10": blocks["p10"][i], "P90": blocks["p90"][i]})
+            for i, feature in enumerate(PD_FEATURES)
+        }, entry
+
+    def surface(self, crop, first, second, state=None):
+        """``(x, y, z)`` mean-yield surface over a feature pair (either order), or None."""
+        entry = self.entry(crop, state)
+        if entry is None:
+            return None
+        grids = self._block(entry, "surface_grid")
+        x, y = grids[PD_FEATURES.index(first)], grids[PD_FEATURES.index(second)]
+        if (first, second) in PD_PAIRS:
+            z = self._block(entry, "surface")[PD_PAIRS.index((first, second))]
+        else:
+            z = self._block(entry, "surface")[PD_PAIRS.index((second, first))].T
+        return x, y, z
+
+
+def report(out_dir=DEFAULT_ATLAS_DIR):
+    atlas = PartialDependenceAtlas.load(out_dir)
+    keys = atlas.index["keys"]
+    by_state = sum(entry["state"] is not None for entry in keys)
+    size = os.path.getsize(os.path.join(out_dir, atlas.index["file"]))
+    print(f"Atlas for model {atlas.model_version} built {atlas.created_at}: {len(keys) - by_state} crops, "
+          f"{by_state} crop x state keys, {size / 1e6:.1f} MB")
+    # Crops whose yield moves most across each input's range
+    swings = []
+    for entry in keys:
+        if entry["state"] is None:
+            mean = atlas._block(entry, "mean")
+            swings.append({"Crop": entry["crop"],
+                           **{f: float(np.ptp(mean[i])) for i, f in enumerate(PD_FEATURES)}})
+    table = pd.DataFrame(swings)
+    for feature in PD_FEATURES:
+        top = table.nlargest(3, feature)
+        print(f"  most sensitive to {feature}: " +
+              ", ".join(f"{r.Crop} ({getattr(r, feature):.2f})" for r in top.itertuples()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the partial-dependence atlas")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="recompute stale curves")
+    build_parser.add_argument("--model", default=DEFAULT_MODEL_PATH)
+    build_parser.add_argument("--data", default="merged_data.csv")
+    build_parser.add_argument("--out", default=DEFAULT_ATLAS_DIR)
+    build_parser.add_argument("--by-state", action="store_true", help="also build crop x state curves")
+    build_parser.add_argument("--crops", nargs="+", default=None, help="limit to these crops")
+    build_parser.add_argument("--workers", type=int, default=None)
+    build_parser.add_argument("--background", type=int, default=DEFAULT_SETTINGS["background"])
+    build_parser.add_argument("--crop-year", type=int, default=DEFAULT_SETTINGS["crop_year"],
+                              help="Crop_Year used for the sweeps (changing it recomputes every key)")
+    build_parser.add_argument("--force", action="store_true", help="recompute every key")
+    report_parser = commands.add_parser("report", help="summarize a built atlas")
+    report_parser.add_argument("--out", default=DEFAULT_ATLAS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.out)
+        return
+    index, recomputed, reused, carried = build(args.model, args.data, args.out, args.by_state, args.crops,
+                                      args.workers, args.force, background=args.background,
+                                      crop_year=args.crop_year)
+    print(f"Recomputed {recomputed} keys in {index['build_seconds']}s, reused {reused}, "
+          f"kept {carried} from earlier builds; "
+          f"model {index['model_version']} -> {os.path.join(args.out, index['file'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Offline-materialized prediction cube with multilinear interpolated serving.
+
+``build`` scores the model once over every State x Crop x Season group seen in
+training times a dense grid of Area/Rainfall/Fertilizer/Pesticide bins and
+stores the result as a float32 ``.npy`` plus a JSON manifest. ``PredictionCube``
+memory-maps that file and answers in-range queries by interpolating between
+the 16 surrounding grid points; ``CubePredictor`` falls back to the real model
+for everything else.
+
+    python prediction_cube.py build --model crop_yield_pipeline.pkl
+    python prediction_cube.py report --model crop_yield_pipeline.pkl
+"""
+import argparse
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from crop_data import weather_data
+from feature_encoding import FEATURE_COLUMNS, normalize_category
+
+DEFAULT_CUBE_DIR = os.path.join("artifacts", "prediction_cube")
+GRID_FEATURES = ["Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+
+# Default serving range per feature: (low, high, bins, log-spaced)
+DEFAULT_AXES = {
+    "Area": (0.1, 100.0, 12, True),
+    "Annual_Rainfall": (0.0, 3000.0, 16, False),
+    "Fertilizer": (0.0, 300.0, 13, False),
+    "Pesticide": (0.0, 50.0, 11, False),
+}
+
+
+def _group_key(state, crop, season):
+    return "|".join(normalize_category(v) for v in (state, crop, season))
+
+
+def make_axes(ranges=None):
+    """Grid coordinates for every ``GRID_FEATURES`` axis."""
+    axes = {}
+    for feature in GRID_FEATURES:
+        low, high, bins, log = (ranges or {}).get(feature, DEFAULT_AXES[feature])
+        if log:
+            points = np.geomspace(max(low, 1e-3), high, bins)
+        else:
+            points = np.linspace(low, high, bins)
+        axes[feature] = {"points": points.tolist(), "log": bool(log)}
+    return axes
+
+
+def ranges_from_history(history_path, low_q=0.01, high_q=0.99):
+    """Axis ranges covering the bulk of logged traffic in the prediction history."""
+    conn = sqlite3.connect(history_path)
+    try:
+        inputs = [json.loads(row[0]) for row in conn.execute("SELECT inputs FROM predictions")]
+    finally:
+        conn.close()
+    if not inputs:
+        return None
+    traffic = pd.DataFrame(inputs)
+    ranges = {}
+    for feature in GRID_FEATURES:
+        _, _, bins, log = DEFAULT_AXES[feature]
+        low, high = traffic[feature].quantile([low_q, high_q])
+        if high <= low:
+            high = low + 1.0
+        ranges[feature] = (float(low), float(high), bins, log)
+    return ranges
+
+
+def training_groups(data_path):
+    """Distinct (State, Crop, Season) triples, with their raw training labels."""
+    data = pd.read_csv(data_path, usecols=["State", "Crop", "Season"])[["State", "Crop", "Season"]]
+    return data.drop_duplicates().sort_values(["State", "Crop", "Season"]).to_numpy().tolist()
+
+
+# ---------------- Offline build -------------------
+def build(model, out_dir=DEFAULT_CUBE_DIR, data_path="merged_data.csv", crop_year=None,
+          ranges=None, groups_per_batch=32, model_version=None):
+    crop_year = crop_year or datetime.datetime.now().year
+    axes = make_axes(ranges)
+    groups = training_groups(data_path)
+    shape = tuple(len(axes[f]["points"]) for f in GRID_FEATURES)
+    os.makedirs(out_dir, exist_ok=True)
+
+    cube = np.lib.format.open_memmap(
+        os.path.join(out_dir, "cube.npy"), mode="w+", dtype=np.float32,
+        shape=(len(groups),) + shape,
+    )
+    mesh = np.stack(np.meshgrid(
+        *[np.asarray(axes[f]["points"]) for f in GRID_FEATURES], indexing="ij"
+    ), axis=-1).reshape(-1, len(GRID_FEATURES))
+    cells = len(mesh)
+
+    start = time.perf_counter()
+    for batch_start in range(0, len(groups), groups_per_batch):
+        batch = groups[batch_start:batch_start + groups_per_batch]
+        frame = pd.DataFrame(np.tile(mesh, (len(batch), 1)), columns=GRID_FEATURES)
+        frame["State"] = np.repeat([g[0] for g in batch], cells)
+        frame["Crop"] = np.repeat([g[1] for g in batch], cells)
+        frame["Season"] = np.repeat([g[2] for g in batch], cells)
+        frame["Crop_Year"] = crop_year
+        frame["tavg"] = frame["State"].map({s: w["tavg"] for s, w in weather_data.items()}).astype(float)
+        frame["prcp"] = frame["State"].map({s: w["prcp"] for s, w in weather_data.items()}).astype(float)
+        frame["Production"] = 0
+        predictions = np.asarray(model.predict(frame[FEATURE_COLUMNS]), dtype=np.float32)
+        cube[batch_start:batch_start + len(batch)] = predictions.reshape((len(batch),) + shape)
+        print(f"  {batch_start + len(batch)}/{len(groups)} groups")
+    cube.flush()
+    del cube
+
+    manifest = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "model_version": model_version,
+        "crop_year": crop_year,
+        "features": GRID_FEATURES,
+        "axes": axes,
+        "groups": [_group_key(*g) for g in groups],
+        "weather": {
+            _group_key(*g): [weather_data.get(g[0], {}).get("tavg"), weather_data.get(g[0], {}).get("prcp")]
+            for g in groups
+        },
+        "build_seconds": round(time.perf_counter() - start, 1),
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+# ---------------- Serving -------------------
+class PredictionCube:
+    """Read-only, memory-mapped view of a built cube."""
+
+    def __init__(self, cube_dir=DEFAULT_CUBE_DIR):
+        with open(os.path.join(cube_dir, "manifest.json")) as file:
+            self.manifest = json.load(file)
+        self.values = np.load(os.path.join(cube_dir, "cube.npy"), mmap_mode="r")
+        self.crop_year = self.manifest["crop_year"]
+        self.model_version = self.manifest.get("model_version")
+        self.group_index = {key: i for i, key in enumerate(self.manifest["groups"])}
+        self.axes = []
+        for feature in GRID_FEATURES:
+            axis = self.manifest["axes"][feature]
+            points = np.asarray(axis["points"], dtype=float)
+            self.axes.append((np.log(points) if axis["log"] else points, axis["log"]))
+        weather = [self.manifest["weather"][key] for key in self.manifest["groups"]]
+        self.group_weather = np.array(
+            [[np.nan if v is None else v for v in pair] for pair in weather], dtype=float
+        ).reshape(-1, 2)
+
+    def lookup(self, frame):
+        """Returns ``(values, hit)``; ``values`` is NaN wherever ``hit`` is False."""
+        n_rows = len(frame)
+        keys = [_group_key(s, c, z) for s, c, z in zip(frame["State"], frame["Crop"], frame["Season"])]
+        groups = np.array([self.group_index.get(k, -1) for k in keys], dtype=np.int64)
+        hit = groups >= 0
+        hit &= frame["Crop_Year"].to_numpy() == self.crop_year
+        weather = self.group_weather[np.maximum(groups, 0)]
+        for column, i in (("tavg", 0), ("prcp", 1)):
+            requested = frame[column].to_numpy(dtype=float)
+            hit &= np.isclose(requested, weather[:, i], equal_nan=True)
+
+        lower, fraction = [], []
+        for feature, (points, log) in zip(GRID_FEATURES, self.axes):
+            x = frame[feature].to_numpy(dtype=float)
+            if log:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    x = np.log(x)
+            inside = (x >= points[0]) & (x <= points[-1])
+            hit &= inside
+            i = np.clip(np.searchsorted(points, x, side="right") - 1, 0, len(points) - 2)
+            t = np.where(inside, (x - points[i]) / (points[i + 1] - points[i]), 0.0)
+            lower.append(i)
+            fraction.append(t)
+
+        values = np.full(n_rows, np.nan)
+        if not hit.any():
+            return values, hit
+        rows = np.flatnonzero(hit)
+        g = groups[rows]
+        result = np.zeros(len(rows))
+        for corner in itertools.product((0, 1), repeat=len(GRID_FEATURES)):
+            weight = np.ones(len(rows))
+            index = [g]
+            for step, i, t in zip(corner, lower, fraction):
+                weight *= t[rows] if step else 1.0 - t[rows]
+                index.append(i[rows] + step)
+            result += weight * self.values[tuple(index)]
+        values[rows] = result
+        return values, hit
+
+
+class CubePredictor:
+    """``predict`` that interpolates from the cube and only calls the model on misses."""
+
+    def __init__(self, cube, model):
+        self.cube = cube
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self.cache_listener = None
+
+    def predict(self, frame):
+        values, hit = self.cube.lookup(frame)
+        misses = ~hit
+        if misses.any():
+            values[misses] = self.model.predict(frame[misses])
+        n_hits, n_misses = int(hit.sum()), int(misses.sum())
+        self.hits += n_hits
+        self.misses += n_misses
+        if self.cache_listener is not None:
+            self.cache_listener("prediction_cube", True, n_hits)
+            self.cache_listener("prediction_cube", False, n_misses)
+        return values
+
+
+# ---------------- Accuracy report -------------------
+def error_report(model, cube, n_samples=5000, seed=0):
+    """Interpolated vs. exact predictions on random in-grid queries."""
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, len(cube.group_index), n_samples)
+    keys = cube.manifest["groups"]
+    raw = [k.split("|") for k in keys]
+    frame = pd.DataFrame({
+        "State": [raw[g][0] for g in groups],
+        "Season": [raw[g][2] for g in groups],
+        "Crop": [raw[g][1] for g in groups],
+    })
+    for feature, (points, log) in zip(GRID_FEATURES, cube.axes):
+        x = rng.uniform(points[0], points[-1], n_samples)
+        frame[feature] = np.exp(x) if log else x
+    frame["Crop_Year"] = cube.crop_year
+    frame["tavg"] = cube.group_weather[groups, 0]
+    frame["prcp"] = cube.group_weather[groups, 1]
+    frame["Production"] = 0
+
+    interpolated, hit = cube.lookup(frame)
+    # The model saw the padded training labels; map back to them for the exact call.
+    exact = np.asarray(model.predict(_with_training_labels(frame[FEATURE_COLUMNS])), dtype=float)
+    error = np.abs(interpolated - exact)
+    relative = error / np.maximum(np.abs(exact), 1e-6)
+    per_crop = (
+        pd.DataFrame({"Crop": frame["Crop"], "abs_error": error})
+        .groupby("Crop")["abs_error"].mean().sort_values(ascending=False)
+    )
+    return {
+        "samples": n_samples,
+        "hit_rate": float(hit.mean()),
+        "mae": float(np.nanmean(error)),
+        "max_abs_error": float(np.nanmax(error)),
+        "relative_error_p50": float(np.nanpercentile(relative, 50)),
+        "relative_error_p95": float(np.nanpercentile(relative, 95)),
+        "worst_crops_mae": per_crop.head(10).round(4).to_dict(),
+    }
+
+
+_TRAINING_LABELS = {}
+
+
+def _with_training_labels(frame, data_path="merged_data.csv"):
+    if not _TRAINING_LABELS:
+        data = pd.read_csv(data_path, usecols=["State", "Crop", "Season"])
+        for column in ("State", "Crop", "Season"):
+            _TRAINING_LABELS[column] = {normalize_category(v): v for v in data[column].unique()}
+    frame = frame.copy()
+    for column, labels in _TRAINING_LABELS.items():
+        frame[column] = frame[column].map(lambda v: labels.get(normalize_category(v), v))
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the prediction cube")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--model", default="crop_yield_pipeline.pkl")
+    parser.add_argument("--data", default="merged_data.csv")
+    parser.add_argument("--out", default=DEFAULT_CUBE_DIR)
+    parser.add_argument("--crop-year", type=int, default=None)
+    parser.add_argument("--history", default=None, help="size the grid from logged traffic in this history DB")
+    parser.add_argument("--samples", type=int, default=5000)
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as file:
+        payload = file.read()
+    model = pickle.loads(payload)
+
+    if args.command == "build":
+        ranges = ranges_from_history(args.history) if args.history else None
+        version = hashlib.sha256(payload).hexdigest()[:12]
+        manifest = build(model, args.out, args.data, args.crop_year, ranges, model_version=version)
+        size_mb = os.path.getsize(os.path.join(args.out, "cube.npy")) / 1e6
+        print(f"Built {len(manifest['groups'])} groups in {manifest['build_seconds']}s ({size_mb:.1f} MB)")
+    else:
+        report = error_report(model, PredictionCube(args.out), args.samples)
+        with open(os.path.join(args.out, "error_report.json"), "w") as file:
+            json.dump(report, file, indent=2)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Opt-in cProfile capture of individual app reruns.
+
+Enabled for every session with ``AGRIPREDICT_PROFILE=1`` or for one session
+with ``?profile=1`` in the URL. Each full script run and each fragment rerun
+is then profiled on its own and saved as ``<timestamp>_<label>.prof`` (open
+with ``snakeviz`` or ``pstats``) plus a ``.txt`` summary: wall time per app
+stage (the same stages ``metrics.observe_stage`` records: CSS injection,
+model load, predict, charts, recommendations, ...) and the top functions by
+cumulative and own time. The stage hook is registered with ``metrics`` only
+while at least one profile is running, so when profiling is off the cost is
+the enabled check plus iterating an empty hook list in ``observe_stage``.
+A script profile cut short by ``st.stop()`` or a dead script thread is
+reaped the next time any profile starts, so the hook cannot stay behind.
+
+On Python 3.12+ ``cProfile`` is built on ``sys.monitoring``, which is
+interpreter-wide: only one profile can run at a time (others are skipped)
+and it also records calls made by other sessions' threads and the inference
+workers while it runs. Its summary says so; profile with a single session
+when the numbers must be for one rerun only.
+"""
+import cProfile
+import datetime
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+import metrics
+
+PROFILE_ENV = "AGRIPREDICT_PROFILE"
+PROFILE_QUERY_PARAM = "profile"
+DEFAULT_PROFILE_DIR = os.path.join("artifacts", "profiles")
+TRUTHY = ("1", "true", "yes", "on")
+
+_local = threading.local()
+_hook_lock = threading.Lock()
+_active = {}  # thread ident -> (thread, profiler) for every profile in progress
+
+
+def profiling_requested(query_params=None):
+    """True if the environment or this session's URL asks for profiling."""
+    if os.environ.get(PROFILE_ENV, "").lower() in TRUTHY:
+        return True
+    return query_params is not None and str(query_params.get(PROFILE_QUERY_PARAM, "")).lower() in TRUTHY
+
+
+class RerunProfiler:
+    def __init__(self, label, out_dir=None):
+        self.label = label
+        self.out_dir = out_dir or os.environ.get("AGRIPREDICT_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        self.profile = cProfile.Profile()
+        self.stages = []
+        self.started = None
+
+    def start(self):
+        self.profile.enable()
+        self.started = time.perf_counter()
+        return self
+
+    def stop(self):
+        """Saves the profile and summary; returns the summary path."""
+        self.profile.disable()
+        wall = time.perf_counter() - self.started
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        base = os.path.join(self.out_dir, f"{stamp}_{self.label}_{os.getpid()}")
+        self.profile.dump_stats(f"{base}.prof")
+        with open(f"{base}.txt", "w") as file:
+            file.write(self.summary(wall))
+        return f"{base}.txt"
+
+    def summary(self, wall, top=15):
+        lines = [f"{self.label}: {wall * 1000:.1f} ms wall"]
+        if sys.version_info >= (3, 12):
+            lines.append("(Python 3.12+: function times include every thread active during the rerun)")
+        lines += ["", "Stages:"]
+        for stage, seconds in self.stages:
+            lines.append(f"  {stage:<24} {seconds * 1000:9.1f} ms")
+        for sort_key, title in (("cumulative", "cumulative time"), ("tottime", "own time")):
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).strip_dirs().sort_stats(sort_key).print_stats(top)
+            body = stream.getvalue()
+            # Drop the pstats preamble, keep the table
+            table = body[body.find("   ncalls"):] if "   ncalls" in body else body
+            lines.extend(["", f"Top {top} by {title}:", table.rstrip()])
+        return "\n".join(lines) + "\n"
+
+
+def _record_stage(stage, seconds):
+    active = getattr(_local, "active", None)
+    if active is not None:
+        active.stages.append((stage, seconds))
+
+
+def _activate(profiler):
+    thread = threading.current_thread()
+    _local.active = profiler
+    with _hook_lock:
+        if not _active:
+            metrics.stage_hooks.append(_record_stage)
+        _active[thread.ident] = (thread, profiler)
+
+
+def _deactivate(ident=None):
+    if ident is None:
+        ident = threading.get_ident()
+        _local.active = None
+    with _hook_lock:
+        if _active.pop(ident, None) is not None and not _active:
+            metrics.stage_hooks.remove(_record_stage)
+
+
+def _reap_abandoned():
+    """Stops profiles whose script thread ended without reaching ``finish`` (``st.stop()``, a crash)."""
+    with _hook_lock:
+        abandoned = [(ident, profiler) for ident, (thread, profiler) in _active.items() if not thread.is_alive()]
+    for ident, profiler in abandoned:
+        try:
+            profiler.profile.disable()  # on 3.12+ this frees the interpreter-wide monitoring slot
+        finally:
+            _deactivate(ident)
+
+
+def start(label, enabled, replace=False):
+    """Starts profiling this thread's rerun if ``enabled`` and none is running; else None.
+
+    ``replace`` discards a profile left running by a rerun that was cut short
+    (``st.rerun()``/``st.stop()`` skip the end of the script); pass it at the
+    top of the script.
+    """
+    _reap_abandoned()
+    leftover = getattr(_local, "active", None)
+    if replace and leftover is not None:
+        try:
+            leftover.profile.disable()
+        finally:
+            _deactivate()
+        leftover = None
+    if not enabled or leftover is not None:
+        return None
+    profiler = RerunProfiler(label)
+    try:
+        profiler.start()
+    except ValueError:
+        return None  # another session's profile owns the interpreter-wide profiler hook
+    _activate(profiler)
+    return profiler
+
+
+def finish(profiler):
+    """Stops and saves ``profiler`` (no-op for None); returns the summary path."""
+    if profiler is None:
+        return None
+    try:
+        return profiler.stop()
+    finally:
+        _deactivate()
+
+
+def profiled(label, enabled):
+    """Decorator for fragments: profiles standalone fragment reruns when ``enabled()``.
+
+    During a full script run the script profile is already active and
+    captures the fragment, so nothing extra happens.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = start(label, getattr(_local, "active", None) is None and enabled())
+            try:
+                return function(*args, **kwargs)
+            finally:
+                finish(profiler)
+        return wrapper
+    return decorator
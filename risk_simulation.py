@@ -0,0 +1,69 @@
+"""
+Vectorized Monte Carlo revenue risk for a single farm configuration.
+
+Rainfall is drawn from the state's own annual history (smoothed bootstrap)
+and price from a mean-preserving lognormal around the crop's market price.
+All rainfall draws are scored in one batched ``predict`` call, so a few
+thousand samples stay within the interactive latency budget; a fixed seed
+makes every run reproducible.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_SAMPLES = 2000
+DEFAULT_PRICE_VOLATILITY = 0.15
+DEFAULT_SEED = 42
+
+
+def state_rainfall_history(data_path="merged_data.csv"):
+    """State -> array of annual rainfall, one value per recorded year."""
+    data = pd.read_csv(data_path, usecols=["State", "Crop_Year", "Annual_Rainfall"])
+    yearly = data.groupby(["State", "Crop_Year"])["Annual_Rainfall"].mean()
+    return {state: values.to_numpy() for state, values in yearly.groupby(level=0)}
+
+
+def sample_rainfall(rng, history, fallback, n_samples):
+    if history is None or len(history) < 3:
+        # No usable history: +/-20% around the entered rainfall
+        return np.clip(rng.normal(fallback, 0.2 * fallback, n_samples), 0, None)
+    bandwidth = 0.25 * history.std()
+    draws = rng.choice(history, n_samples) + rng.normal(0, bandwidth, n_samples)
+    return np.clip(draws, 0, None)
+
+
+def simulate_revenue(predict, input_df, area, price, rainfall_history=None,
+                     n_samples=DEFAULT_SAMPLES, price_volatility=DEFAULT_PRICE_VOLATILITY,
+                     seed=DEFAULT_SEED):
+    """Revenue distribution for the single-row ``input_df``.
+
+    ``predict`` is any batched ``DataFrame -> yields`` callable. Returns the
+    samples plus summary statistics (mean, percentiles, downside measures).
+    """
+    rng = np.random.default_rng(seed)
+    base_rainfall = float(input_df["Annual_Rainfall"].iloc[0])
+    rainfall = sample_rainfall(rng, rainfall_history, base_rainfall, n_samples)
+    sigma = price_volatility
+    prices = price * rng.lognormal(-0.5 * sigma ** 2, sigma, n_samples)
+
+    frame = input_df.loc[input_df.index.repeat(n_samples)].reset_index(drop=True)
+    frame["Annual_Rainfall"] = rainfall
+    yields = np.asarray(predict(frame), dtype=float)
+    revenue = yields * area * prices
+
+    percentiles = np.percentile(revenue, [5, 10, 25, 50, 75, 90, 95])
+    mean = float(revenue.mean())
+    tail = revenue[revenue <= percentiles[0]]
+    return {
+        "revenue": revenue,
+        "rainfall": rainfall,
+        "mean": mean,
+        "percentiles": dict(zip(["p5", "p10", "p25", "p50", "p75", "p90", "p95"], percentiles.tolist())),
+        "value_at_risk_95": mean - float(percentiles[0]),
+        "expected_shortfall_95": mean - float(tail.mean()) if len(tail) else 0.0,
+        "n_samples": n_samples,
+        "seed": seed,
+    }
+
+
+def probability_below(simulation, threshold):
+    return float((simulation["revenue"] < threshold).mean())
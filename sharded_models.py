@@ -0,0 +1,203 @@
+"""
+Per-crop sharded models loaded lazily behind the usual ``predict`` interface.
+
+A session only ever asks about one crop, so instead of one monolithic
+pipeline a shard directory holds one compact pipeline per crop (or per crop
+group) plus ``manifest.json``. ``ShardedModel`` loads a shard the first time
+one of its crops is requested and keeps shards in an LRU bounded by total
+on-disk size (a close proxy for the unpickled size of tree ensembles).
+
+    python sharded_models.py train --base-model crop_yield_pipeline.pkl
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from feature_encoding import FEATURE_COLUMNS, UnknownCategoryError, build_fast_predictor, normalize_category
+
+DEFAULT_SHARD_DIR = os.path.join("artifacts", "crop_shards")
+
+
+class ShardedModel:
+    """Routes rows to per-crop shards; same ``predict`` contract as the pipeline."""
+
+    def __init__(self, shard_dir=DEFAULT_SHARD_DIR, max_bytes=512 * 1024 * 1024):
+        start = time.perf_counter()
+        manifest_path = os.path.join(shard_dir, "manifest.json")
+        with open(manifest_path, "rb") as file:
+            payload = file.read()
+        self.manifest = json.loads(payload)
+        self.shard_dir = shard_dir
+        self.path = shard_dir
+        self.version = hashlib.sha256(payload).hexdigest()[:12]
+        self.max_bytes = max_bytes
+        self.crop_to_shard = {
+            normalize_category(crop): shard for crop, shard in self.manifest["crops"].items()
+        }
+        self.crops = sorted(self.manifest["crops"])
+        self.resident_bytes = 0
+        self.hits = 0
+        self.loads = 0
+        self.cache_listener = None
+        self.evictions = 0
+        self._shards = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.load_seconds = time.perf_counter() - start
+
+    # Same attributes the app reads from a registry ``ModelVersion``
+    @property
+    def model(self):
+        return self
+
+    @property
+    def predictor(self):
+        return self
+
+    def _shard(self, name):
+        with self._lock:
+            if name in self._shards:
+                self._shards.move_to_end(name)
+                self.hits += 1
+                if self.cache_listener is not None:
+                    self.cache_listener("crop_shards", True)
+                return self._shards[name][0]
+        if self.cache_listener is not None:
+            self.cache_listener("crop_shards", False)
+        info = self.manifest["shards"][name]
+        path = os.path.join(self.shard_dir, info["file"])
+        with open(path, "rb") as file:
+            pipeline = pickle.load(file)
+        predictor = build_fast_predictor(pipeline) or pipeline
+        size = os.path.getsize(path)
+        with self._lock:
+            if name not in self._shards:
+                self._shards[name] = (predictor, size)
+                self.resident_bytes += size
+                self.loads += 1
+                while self.resident_bytes > self.max_bytes and len(self._shards) > 1:
+                    _, (_, evicted_size) = self._shards.popitem(last=False)
+                    self.resident_bytes -= evicted_size
+                    self.evictions += 1
+            return self._shards[name][0]
+
+    def predict(self, frame):
+        keys = frame["Crop"].map(normalize_category)
+        shard_names = keys.map(self.crop_to_shard)
+        unknown = shard_names.isna()
+        if unknown.any():
+            raise UnknownCategoryError("Crop", frame["Crop"][unknown].iloc[0], self.crops)
+        names = shard_names.to_numpy()
+        predictions = np.empty(len(frame))
+        for name in pd.unique(names):
+            rows = np.flatnonzero(names == name)
+            predictions[rows] = self._shard(name).predict(frame.iloc[rows])
+        return predictions
+
+    def loaded_shards(self):
+        with self._lock:
+            return list(self._shards)
+
+
+# ---------------- Offline training -------------------
+def training_frame(data_path):
+    """Training rows in the serving layout (Production is always 0 at request time)."""
+    data = pd.read_csv(data_path)
+    data = data.dropna(subset=["Yield"])
+    data["Production"] = 0
+    return data
+
+
+def shard_groups(data, min_rows=200, groups=None):
+    """Crop -> shard name; rare crops share an ``other`` shard unless grouped explicitly."""
+    counts = data["Crop"].value_counts()
+    mapping = {}
+    for crop, count in counts.items():
+        if groups and crop.strip() in groups:
+            mapping[crop] = groups[crop.strip()]
+        elif count >= min_rows:
+            mapping[crop] = normalize_category(crop).replace(" ", "_").replace("/", "_")
+        else:
+            mapping[crop] = "other"
+    return mapping
+
+
+def train(base_model, data_path="merged_data.csv", out_dir=DEFAULT_SHARD_DIR, min_rows=200,
+          groups=None, n_estimators=None, holdout=0.2, seed=0):
+    """Fits one clone of ``base_model`` per shard; returns the manifest."""
+    from sklearn.base import clone
+
+    data = training_frame(data_path)
+    rng = np.random.default_rng(seed)
+    is_test = rng.random(len(data)) < holdout
+    data["holdout"] = is_test
+    mapping = shard_groups(data, min_rows, groups)
+    data["shard"] = data["Crop"].map(mapping)
+    os.makedirs(out_dir, exist_ok=True)
+
+    shards = {}
+    for name, rows in data[~data["holdout"]].groupby("shard"):
+        pipeline = clone(base_model)
+        if n_estimators is not None:
+            estimator_param = f"{pipeline.steps[-1][0]}__n_estimators"
+            if estimator_param in pipeline.get_params():
+                pipeline.set_params(**{estimator_param: n_estimators})
+        start = time.perf_counter()
+        pipeline.fit(rows[FEATURE_COLUMNS], rows["Yield"])
+        file_name = f"{name}.pkl"
+        with open(os.path.join(out_dir, file_name), "wb") as file:
+            pickle.dump(pipeline, file, protocol=pickle.HIGHEST_PROTOCOL)
+        shards[name] = {
+            "file": file_name,
+            "rows": len(rows),
+            "bytes": os.path.getsize(os.path.join(out_dir, file_name)),
+            "fit_seconds": round(time.perf_counter() - start, 2),
+        }
+        print(f"  {name}: {len(rows)} rows, {shards[name]['bytes'] / 1e6:.1f} MB")
+
+    manifest = {
+        "crops": {crop.strip(): shard for crop, shard in mapping.items()},
+        "shards": shards,
+        "holdout_fraction": holdout,
+        "seed": seed,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    data.loc[data["holdout"], FEATURE_COLUMNS + ["Yield"]].to_csv(
+        os.path.join(out_dir, "holdout.csv"), index=False
+    )
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train per-crop model shards")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--base-model", default="crop_yield_pipeline.pkl",
+                        help="pipeline whose (unfitted) structure each shard clones")
+    parser.add_argument("--data", default="merged_data.csv")
+    parser.add_argument("--out", default=DEFAULT_SHARD_DIR)
+    parser.add_argument("--min-rows", type=int, default=200)
+    parser.add_argument("--groups", default=None, help="JSON file mapping crop -> shard group")
+    parser.add_argument("--n-estimators", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.base_model, "rb") as file:
+        base_model = pickle.load(file)
+    groups = None
+    if args.groups:
+        with open(args.groups) as file:
+            groups = json.load(file)
+    manifest = train(base_model, args.data, args.out, args.min_rows, groups, args.n_estimators)
+    total = sum(s["bytes"] for s in manifest["shards"].values())
+    print(f"Wrote {len(manifest['shards'])} shards ({total / 1e6:.1f} MB) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Offline India state-boundary layer for the Geographic Intelligence map.
+
+``build`` takes any state-level GeoJSON (e.g. a Datameet or Natural Earth
+admin-1 export), simplifies every exterior ring with Douglas-Peucker at a few
+tolerances and stores each level TopoJSON-style: coordinates quantized to an
+integer grid, delta-encoded per ring and saved as a compressed ``.npz`` next
+to a small JSON manifest. Serving never touches the network; the map is drawn
+as filled polygons on plain axes, so no tile server or plotly.js topojson
+fetch is involved. A built layer ships in ``data/state_boundaries`` (see its
+``SOURCE.md``); rebuild it from a different GeoJSON to replace it.
+
+    python state_boundaries.py build india_states.geojson
+    python state_boundaries.py report
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import plotly.colors
+import plotly.graph_objects as go
+
+# Committed with the code (~60 KB), so a fresh offline checkout draws the map without tiles
+DEFAULT_BOUNDARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "state_boundaries")
+# Douglas-Peucker tolerance in degrees: ~5 km, ~2 km and ~500 m
+LEVELS = {"coarse": 0.05, "medium": 0.02, "fine": 0.005}
+QUANTIZATION = 100_000  # grid steps across the bounding box per axis
+
+# Boundary-file spellings -> names used in merged_data.csv
+STATE_ALIASES = {
+    "Orissa": "Odisha",
+    "Uttaranchal": "Uttarakhand",
+    "Pondicherry": "Puducherry",
+    "Jammu & Kashmir": "Jammu and Kashmir",
+    "NCT of Delhi": "Delhi",
+    "Nct Of Delhi": "Delhi",
+    "Arunanchal Pradesh": "Arunachal Pradesh",
+    "Telengana": "Telangana",
+}
+NAME_FIELDS = ("ST_NM", "st_nm", "NAME_1", "name", "STATE", "State")
+
+
+def _state_name(properties, name_field=None):
+    fields = [name_field] if name_field else NAME_FIELDS
+    for field in fields:
+        if properties.get(field):
+            name = " ".join(str(properties[field]).split())
+            return STATE_ALIASES.get(name, name)
+    raise KeyError(f"No state name among {fields} in {sorted(properties)}")
+
+
+def _exterior_rings(geometry):
+    if geometry["type"] == "Polygon":
+        return [geometry["coordinates"][0]]
+    if geometry["type"] == "MultiPolygon":
+        return [polygon[0] for polygon in geometry["coordinates"]]
+    return []
+
+
+def simplify_ring(points, tolerance):
+    """Douglas-Peucker on an (n, 2) closed ring; keeps both endpoints."""
+    n = len(points)
+    if n <= 4:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = points[last] - points[first]
+        offsets = points[first + 1:last] - points[first]
+        length = np.hypot(*segment)
+        if length == 0:
+            distance = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distance = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        i = int(np.argmax(distance))
+        if distance[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+def build(source_path, out_dir=DEFAULT_BOUNDARY_DIR, levels=LEVELS, name_field=None, min_area=0.0):
+    """Writes one quantized ``<level>.npz`` per tolerance plus ``manifest.json``."""
+    with open(source_path) as file:
+        features = json.load(file)["features"]
+
+    names, rings = [], []
+    for feature in features:
+        name = _state_name(feature.get("properties") or {}, name_field)
+        if name not in names:
+            names.append(name)
+        for ring in _exterior_rings(feature["geometry"]):
+            rings.append((names.index(name), np.asarray(ring, dtype=float)[:, :2]))
+
+    stacked = np.concatenate([r for _, r in rings])
+    low = stacked.min(axis=0)
+    scale = (stacked.max(axis=0) - low) / (QUANTIZATION - 1)
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {"names": names, "translate": low.tolist(), "scale": scale.tolist(), "levels": {}}
+    for level, tolerance in levels.items():
+        deltas, offsets, owners = [], [0], []
+        for owner, ring in rings:
+            simplified = simplify_ring(ring, tolerance)
+            x, y = simplified[:, 0], simplified[:, 1]
+            area = 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+            if len(simplified) < 4 or area < min_area:
+                continue  # ring collapsed at this tolerance (small islands)
+            quantized = np.round((simplified - low) / scale).astype(np.int64)
+            deltas.append(np.diff(quantized, axis=0, prepend=[[0, 0]]).astype(np.int32))
+            offsets.append(offsets[-1] + len(quantized))
+            owners.append(owner)
+        path = os.path.join(out_dir, f"{level}.npz")
+        np.savez_compressed(
+            path,
+            deltas=np.concatenate(deltas),
+            ring_offsets=np.asarray(offsets, dtype=np.int32),
+            ring_state=np.asarray(owners, dtype=np.int16),
+        )
+        manifest["levels"][level] = {
+            "tolerance": tolerance,
+            "rings": len(owners),
+            "vertices": int(offsets[-1]),
+            "bytes": os.path.getsize(path),
+        }
+    manifest["source_vertices"] = int(len(stacked))
+    manifest["source_bytes"] = os.path.getsize(source_path)
+    with open(os.path.join(out_dir, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+class BoundaryLayer:
+    """State outlines for one simplification level, decoded once at load."""
+
+    def __init__(self, names, rings, level):
+        self.names = names
+        self.rings = rings    # state name -> list of (n, 2) lon/lat arrays
+        self.level = level
+
+    @classmethod
+    def load(cls, level="medium", boundary_dir=DEFAULT_BOUNDARY_DIR):
+        with open(os.path.join(boundary_dir, "manifest.json")) as file:
+            manifest = json.load(file)
+        arrays = np.load(os.path.join(boundary_dir, f"{level}.npz"))
+        points = np.cumsum(arrays["deltas"].astype(np.int64), axis=0)
+        offsets = arrays["ring_offsets"]
+        translate, scale = np.asarray(manifest["translate"]), np.asarray(manifest["scale"])
+        names = manifest["names"]
+        rings = {name: [] for name in names}
+        for i, owner in enumerate(arrays["ring_state"]):
+            # Deltas restart from zero at every ring, so undo the running sum
+            start, end = offsets[i], offsets[i + 1]
+            base = points[start - 1] if start else 0
+            rings[names[owner]].append((points[start:end] - base) * scale + translate)
+        return cls(names, rings, level)
+
+    def outline(self, state):
+        """``(lon, lat)`` lists with ``None`` between rings, ready for a filled trace."""
+        lon, lat = [], []
+        for ring in self.rings.get(state, []):
+            lon.extend(ring[:, 0].tolist() + [None])
+            lat.extend(ring[:, 1].tolist() + [None])
+        return lon, lat
+
+
+def choropleth_figure(layer, values, highlight=None, colorscale="Greens", value_label="Yield",
+                      hover_suffix=None, height=400):
+    """Offline choropleth: one filled trace per state coloured by ``values[state]``."""
+    known = [v for v in values.values() if v is not None and np.isfinite(v)]
+    low, high = (min(known), max(known)) if known else (0.0, 1.0)
+    span = (high - low) or 1.0
+    hover_suffix = hover_suffix or {}
+
+    fig = go.Figure()
+    for state in layer.names:
+        value = values.get(state)
+        has_value = value is not None and np.isfinite(value)
+        color = (
+            plotly.colors.sample_colorscale(colorscale, [(value - low) / span])[0]
+            if has_value else "#EEEEEE"
+        )
+        lon, lat = layer.outline(state)
+        text = f"{state}: {value:.2f}" if has_value else f"{state}: no data"
+        fig.add_trace(go.Scatter(
+            x=lon, y=lat, mode="lines", fill="toself", fillcolor=color,
+            line=dict(color="#2E7D32" if state == highlight else "#FFFFFF",
+                      width=2.5 if state == highlight else 0.6),
+            hoveron="fills", hoverinfo="text",
+            text=text + hover_suffix.get(state, ""), name=state, showlegend=False,
+        ))
+    # Invisible marker trace that carries the colour bar
+    fig.add_trace(go.Scatter(
+        x=[None], y=[None], mode="markers", showlegend=False, hoverinfo="skip",
+        marker=dict(colorscale=colorscale, cmin=low, cmax=high, color=[low], showscale=True,
+                    colorbar=dict(title=value_label, thickness=12)),
+    ))
+    fig.update_xaxes(visible=False)
+    fig.update_yaxes(visible=False, scaleanchor="x", scaleratio=1)
+    fig.update_layout(
+        height=height, margin={"r": 0, "t": 0, "l": 0, "b": 0},
+        plot_bgcolor="rgba(0,0,0,0)", paper_bgcolor="rgba(0,0,0,0)",
+    )
+    return fig
+
+
+def report(boundary_dir=DEFAULT_BOUNDARY_DIR):
+    with open(os.path.join(boundary_dir, "manifest.json")) as file:
+        manifest = json.load(file)
+    print(f"{len(manifest['names'])} states, source {manifest['source_vertices']:,} vertices "
+          f"/ {manifest['source_bytes'] / 1024:,.1f} KiB GeoJSON")
+    print(f"{'level':<8} {'tolerance':>10} {'rings':>7} {'vertices':>10} {'payload':>11}")
+    for level, info in manifest["levels"].items():
+        print(f"{level:<8} {info['tolerance']:>10.3f} {info['rings']:>7} "
+              f"{info['vertices']:>10,} {info['bytes'] / 1024:>8.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle simplified India state boundaries")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="simplify and quantize a state GeoJSON")
+    build_parser.add_argument("source", help="state-level GeoJSON")
+    build_parser.add_argument("--out", default=DEFAULT_BOUNDARY_DIR)
+    build_parser.add_argument("--name-field", default=None, help="property holding the state name")
+    build_parser.add_argument("--min-area", type=float, default=0.0005,
+                              help="drop rings smaller than this (square degrees)")
+    report_parser = commands.add_parser("report", help="payload size per simplification level")
+    report_parser.add_argument("--dir", default=DEFAULT_BOUNDARY_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args.source, args.out, name_field=args.name_field, min_area=args.min_area)
+        report(args.out)
+    else:
+        report(args.dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Exported tree artifacts must predict exactly what the pickled pipeline predicts."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+import tree_artifact
+from feature_encoding import CATEGORICAL_FEATURES, FEATURE_COLUMNS, NUMERIC_FEATURES
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "merged_data.csv")
+
+NUMERIC_BLOCKS = {
+    "imputer": lambda: SimpleImputer(strategy="median"),
+    "imputer_scaler": lambda: make_pipeline(SimpleImputer(), StandardScaler()),
+    "passthrough": lambda: "passthrough",
+}
+
+
+@pytest.fixture(scope="module")
+def data():
+    frame = pd.read_csv(DATA_PATH).sample(3000, random_state=0)
+    # tavg/prcp are missing for most rows, which is what the fill and NaN routing must reproduce
+    assert frame[["tavg", "prcp"]].isna().any().all()
+    return frame[FEATURE_COLUMNS], frame["Yield"]
+
+
+@pytest.mark.parametrize("numeric", sorted(NUMERIC_BLOCKS))
+def test_artifact_matches_pipeline(numeric, data, tmp_path):
+    X, y = data
+    preprocessor = ColumnTransformer([
+        ("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), CATEGORICAL_FEATURES),
+        ("num", NUMERIC_BLOCKS[numeric](), NUMERIC_FEATURES),
+    ])
+    pipeline = Pipeline([
+        ("preprocessor", preprocessor),
+        ("model", RandomForestRegressor(n_estimators=10, max_depth=10, random_state=0)),
+    ]).fit(X, y)
+
+    tree_artifact.export(pipeline, str(tmp_path / "tree_model"), source_version="test")
+    mapped, _ = tree_artifact.load(str(tmp_path / "tree_model"))
+
+    np.testing.assert_allclose(mapped.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-9)
+
+
+def test_remainder_passthrough_matches_pipeline(data, tmp_path):
+    X, y = data
+    preprocessor = ColumnTransformer(
+        [("cat", OneHotEncoder(handle_unknown="ignore", sparse_output=False), CATEGORICAL_FEATURES)],
+        remainder="passthrough",
+    )
+    pipeline = Pipeline([
+        ("preprocessor", preprocessor),
+        ("model", RandomForestRegressor(n_estimators=10, max_depth=10, random_state=0)),
+    ]).fit(X, y)
+
+    tree_artifact.export(pipeline, str(tmp_path / "tree_model"))
+    mapped, _ = tree_artifact.load(str(tmp_path / "tree_model"))
+
+    np.testing.assert_allclose(mapped.predict(X), pipeline.predict(X), rtol=1e-9, atol=1e-9)
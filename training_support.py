@@ -0,0 +1,161 @@
+"""
+Out-of-distribution checks against precomputed training histograms.
+
+For every numeric model input the profile stores a cumulative histogram over
+fixed-width bins in ``log1p`` space, globally and per crop. Scoring a value is
+an O(1) bin computation plus one table read: its percentile rank ``p`` gives
+a per-feature support of ``2 * min(p, 1 - p)`` (1 at the training median, 0 at
+or beyond the observed extremes). A row's "within training support" score is
+the weakest of its features. Batches are scored with array indexing only.
+A low score means either a value outside the observed range or one in a
+sparse tail with few similar training rows; ``out_of_range`` tells them apart.
+
+    python training_support.py --data merged_data.csv
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_encoding import normalize_category
+
+DEFAULT_SUPPORT_PATH = os.path.join("artifacts", "training_support.json")
+SUPPORT_FEATURES = ["Area", "Annual_Rainfall", "Fertilizer", "Pesticide"]
+LOW_SUPPORT = 0.05  # below this a feature has few similar training rows (sparse tail or out of range)
+GLOBAL_PROFILE = "__all__"
+
+
+class TrainingSupport:
+    def __init__(self, profiles, low, width, cdf):
+        self.profiles = profiles              # profile name -> row in the tables
+        self.low = low                        # feature -> (n_profiles,) lower edge, log1p space
+        self.width = width                    # feature -> (n_profiles,) bin width
+        self.cdf = cdf                        # feature -> (n_profiles, bins + 1) cumulative share
+        self.bins = next(iter(cdf.values())).shape[1] - 1
+        self.global_index = profiles[GLOBAL_PROFILE]
+
+    @classmethod
+    def from_data(cls, data_path="merged_data.csv", bins=64, min_rows=30):
+        data = pd.read_csv(data_path)
+        groups = [(GLOBAL_PROFILE, data)]
+        for crop, rows in data.groupby(data["Crop"].map(normalize_category)):
+            if len(rows) >= min_rows:
+                groups.append((crop, rows))
+
+        profiles = {name: i for i, (name, _) in enumerate(groups)}
+        low, width, cdf = {}, {}, {}
+        for feature in SUPPORT_FEATURES:
+            low[feature] = np.empty(len(groups))
+            width[feature] = np.empty(len(groups))
+            cdf[feature] = np.empty((len(groups), bins + 1))
+            for i, (_, rows) in enumerate(groups):
+                values = np.log1p(np.clip(rows[feature].dropna().to_numpy(dtype=float), 0, None))
+                lo, hi = values.min(), values.max()
+                step = max((hi - lo) / bins, 1e-9)
+                counts, _ = np.histogram(values, bins=bins, range=(lo, lo + step * bins))
+                low[feature][i] = lo
+                width[feature][i] = step
+                cdf[feature][i] = np.concatenate([[0.0], np.cumsum(counts) / counts.sum()])
+        return cls(profiles, low, width, cdf)
+
+    # ---------------- Persistence -------------------
+    def save(self, path=DEFAULT_SUPPORT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "profiles": self.profiles,
+            "features": {
+                f: {"low": self.low[f].tolist(), "width": self.width[f].tolist(), "cdf": self.cdf[f].round(6).tolist()}
+                for f in SUPPORT_FEATURES
+            },
+        }
+        with open(path, "w") as file:
+            json.dump(payload, file)
+
+    @classmethod
+    def load(cls, path=DEFAULT_SUPPORT_PATH):
+        with open(path) as file:
+            payload = json.load(file)
+        features = payload["features"]
+        return cls(
+            payload["profiles"],
+            {f: np.asarray(v["low"]) for f, v in features.items()},
+            {f: np.asarray(v["width"]) for f, v in features.items()},
+            {f: np.asarray(v["cdf"]) for f, v in features.items()},
+        )
+
+    @classmethod
+    def load_or_build(cls, path=DEFAULT_SUPPORT_PATH, data_path="merged_data.csv"):
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls.from_data(data_path)
+
+    # ---------------- Scoring -------------------
+    def _position(self, feature, profile, x):
+        """Bin position in log1p space; NaN inputs are placed outside every profile (-1)."""
+        position = (np.log1p(np.clip(x, 0, None)) - self.low[feature][profile]) / self.width[feature][profile]
+        return np.where(np.isnan(position), -1.0, position)  # before the int cast below
+
+    def _feature_support(self, feature, profile, x):
+        position = self._position(feature, profile, x)
+        inside = (position >= 0) & (position <= self.bins)
+        i = np.clip(np.floor(position).astype(np.int64), 0, self.bins - 1)
+        fraction = np.clip(position - i, 0.0, 1.0)
+        table = self.cdf[feature]
+        rank = table[profile, i] + fraction * (table[profile, i + 1] - table[profile, i])
+        return np.where(inside, 2.0 * np.minimum(rank, 1.0 - rank), 0.0)
+
+    def score_frame(self, frame):
+        """Per-feature and overall support for every row (vectorized)."""
+        profile = (
+            frame["Crop"].map(normalize_category).map(self.profiles)
+            .fillna(self.global_index).to_numpy(dtype=np.int64)
+        )
+        scores = pd.DataFrame(index=frame.index)
+        for feature in SUPPORT_FEATURES:
+            scores[f"support_{feature}"] = self._feature_support(
+                feature, profile, frame[feature].to_numpy(dtype=float)
+            )
+        scores["support_score"] = scores.min(axis=1)
+        return scores
+
+    def score_row(self, crop, **values):
+        """``(score, {feature: support})`` for one input, O(1) per feature."""
+        profile = self.profiles.get(normalize_category(crop), self.global_index)
+        per_feature = {
+            feature: float(self._feature_support(feature, profile, np.float64(values[feature])))
+            for feature in SUPPORT_FEATURES
+        }
+        return min(per_feature.values()), per_feature
+
+
+    def out_of_range(self, crop, **values):
+        """Features of one input outside the observed training range for ``crop`` (or missing)."""
+        profile = self.profiles.get(normalize_category(crop), self.global_index)
+        return [
+            feature for feature in SUPPORT_FEATURES
+            if not 0 <= self._position(feature, profile, np.float64(values[feature])) <= self.bins
+        ]
+
+
+def flagged_features(per_feature, threshold=LOW_SUPPORT):
+    """Feature names whose support falls below ``threshold``, weakest first."""
+    return [f for f, s in sorted(per_feature.items(), key=lambda kv: kv[1]) if s < threshold]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the training-support profile")
+    parser.add_argument("--data", default="merged_data.csv")
+    parser.add_argument("--out", default=DEFAULT_SUPPORT_PATH)
+    parser.add_argument("--bins", type=int, default=64)
+    parser.add_argument("--min-rows", type=int, default=30, help="minimum rows for a per-crop profile")
+    args = parser.parse_args()
+
+    support = TrainingSupport.from_data(args.data, args.bins, args.min_rows)
+    support.save(args.out)
+    print(f"Wrote {len(support.profiles)} profiles x {len(SUPPORT_FEATURES)} features to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
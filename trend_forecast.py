@@ -0,0 +1,128 @@
+"""
+Batched yield-trend forecasting for every State x Crop x Season series at once.
+
+The history is pivoted into one (groups x years) matrix with NaN gaps and a
+robust linear trend is fitted to all rows simultaneously: closed-form
+weighted least squares on per-row sums, re-weighted a few times with Huber
+weights (IRLS). There is no per-group Python loop, so the ~1,700 series fit in
+well under a second. Forecasts carry a normal prediction interval based on
+each series' residual spread and its distance from the fitted years.
+
+    python trend_forecast.py --horizon 5 --out artifacts/yield_trends.csv
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+GROUP_COLUMNS = ["State", "Crop", "Season"]
+
+
+def yield_panel(data):
+    """``(keys, years, Y)``: group labels, the year axis and a (groups x years) yield matrix."""
+    data = data.assign(**{c: data[c].str.strip() for c in GROUP_COLUMNS})
+    panel = data.pivot_table(index=GROUP_COLUMNS, columns="Crop_Year", values="Yield", aggfunc="mean")
+    keys = panel.index.to_frame(index=False)
+    return keys, panel.columns.to_numpy(dtype=float), panel.to_numpy(dtype=float)
+
+
+def fit_trends(years, Y, iterations=5, huber_k=1.345):
+    """Robust linear trend per row of ``Y``; returns a dict of (groups,) arrays."""
+    mask = ~np.isnan(Y)
+    Y0 = np.where(mask, Y, 0.0)
+    t = years - years.mean()
+    weights = mask.astype(float)
+
+    for _ in range(iterations + 1):
+        s0 = weights.sum(axis=1)
+        s1 = weights @ t
+        s2 = weights @ (t * t)
+        sy = (weights * Y0).sum(axis=1)
+        sty = (weights * Y0) @ t
+        with np.errstate(divide="ignore", invalid="ignore"):
+            det = s0 * s2 - s1 * s1
+            slope = np.where(det > 0, (s0 * sty - s1 * sy) / det, 0.0)
+            intercept = (sy - slope * s1) / s0
+        residual = np.where(mask, Y0 - (intercept[:, None] + slope[:, None] * t), np.nan)
+        # Robust scale (MAD) per series, then Huber weights for the next pass
+        scale = 1.4826 * np.nanmedian(np.abs(residual), axis=1)
+        scale = np.where(scale > 0, scale, 1e-9)
+        u = np.abs(residual) / (huber_k * scale[:, None])
+        weights = np.where(mask, np.where(u <= 1, 1.0, 1.0 / np.maximum(u, 1e-12)), 0.0)
+
+    n = mask.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma = np.sqrt(np.nansum(residual ** 2, axis=1) / (n - 2))
+        t_bar = (mask * t).sum(axis=1) / n
+    sxx = (mask * (t[None, :] - t_bar[:, None]) ** 2).sum(axis=1)
+    return {
+        "intercept": intercept, "slope": slope, "sigma": sigma,
+        "n": n, "t_bar": t_bar, "sxx": sxx, "t_offset": years.mean(),
+        "last_year": np.where(mask, years, -np.inf).max(axis=1),
+    }
+
+
+def forecast_trends(fit, years_ahead, level=0.9, min_points=3):
+    """(groups x horizon) point forecasts and interval bounds for ``years_ahead``."""
+    z = statistics.NormalDist().inv_cdf(0.5 + level / 2)
+    t = np.asarray(years_ahead, dtype=float) - fit["t_offset"]
+    point = fit["intercept"][:, None] + fit["slope"][:, None] * t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spread = fit["sigma"][:, None] * np.sqrt(
+            1 + 1 / fit["n"][:, None] + (t - fit["t_bar"][:, None]) ** 2 / fit["sxx"][:, None]
+        )
+    usable = (fit["n"] >= min_points)[:, None]
+    point = np.where(usable, np.maximum(point, 0.0), np.nan)
+    lower = np.where(usable, np.maximum(point - z * spread, 0.0), np.nan)
+    upper = np.where(usable, point + z * spread, np.nan)
+    return point, lower, upper
+
+
+def forecast_all(data_path="merged_data.csv", horizon=5, through_year=None, level=0.9):
+    """Long-format history and forecasts for every group."""
+    data = pd.read_csv(data_path)
+    keys, years, Y = yield_panel(data)
+    fit = fit_trends(years, Y)
+    last = int(years.max())
+    end = max(last + horizon, through_year or 0)
+    years_ahead = np.arange(last + 1, end + 1)
+    point, lower, upper = forecast_trends(fit, years_ahead, level)
+
+    groups = len(keys)
+    forecast = pd.DataFrame({
+        "Crop_Year": np.tile(years_ahead, groups),
+        "Forecast": point.ravel(),
+        "Lower": lower.ravel(),
+        "Upper": upper.ravel(),
+    })
+    forecast = pd.concat([keys.loc[keys.index.repeat(len(years_ahead))].reset_index(drop=True), forecast], axis=1)
+
+    history = pd.DataFrame(Y, columns=years.astype(int))
+    history = pd.concat([keys, history], axis=1).melt(
+        id_vars=GROUP_COLUMNS, var_name="Crop_Year", value_name="Yield"
+    ).dropna(subset=["Yield"])
+    trend = keys.assign(Slope_per_year=fit["slope"], Sigma=fit["sigma"], Points=fit["n"])
+    return {"history": history, "forecast": forecast.dropna(subset=["Forecast"]), "trend": trend}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast yield trends for every State x Crop x Season")
+    parser.add_argument("--data", default="merged_data.csv")
+    parser.add_argument("--horizon", type=int, default=5)
+    parser.add_argument("--level", type=float, default=0.9)
+    parser.add_argument("--out", default=None, help="optional CSV for the forecasts")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = forecast_all(args.data, args.horizon, level=args.level)
+    elapsed = time.perf_counter() - start
+    groups = result["forecast"][GROUP_COLUMNS].drop_duplicates()
+    print(f"Forecast {len(groups)} series x {args.horizon} years in {elapsed:.2f}s")
+    if args.out:
+        result["forecast"].to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()